@@ -0,0 +1,394 @@
+"""
+Registre des ressources créées par l'outil et ramasse-miettes (commande `gc`).
+
+Chaque ressource créée est ajoutée à `.vm_create/artifacts.jsonl` : fichiers
+(disques, .vmx, avec leur inode), interfaces TAP et conteneurs (avec leur
+identifiant). `collect_garbage` confronte ce registre à l'état réel
+(VMs VirtualBox, fichiers .vmx, `docker ps -a`, interfaces utilisées par des
+processus, journaux d'étapes) puis supprime en parallèle les orphelins :
+
+  - fichiers d'une création abandonnée, simulée ou inachevée
+  - fichiers d'une VM supprimée de l'hyperviseur
+  - disques QCOW2 intermédiaires d'une VM VirtualBox/VMware déjà convertie
+  - VMs VirtualBox d'une création inachevée
+  - interfaces TAP qu'aucun processus n'utilise
+  - conteneurs arrêtés
+
+Les fichiers d'une VM QEMU en cours d'exécution (quel que soit l'état de son
+journal, qui reste "en cours" tant que QEMU tourne au premier plan) et ceux qui
+servent d'image de base (backing file) à un disque existant ne sont jamais
+supprimés.
+
+Seules les ressources du registre (ou d'un journal d'étapes) sont concernées :
+un fichier recréé depuis par autre chose (inode différent) ou un conteneur
+remplacé (identifiant différent) n'est jamais supprimé.
+"""
+import asyncio
+import collections
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+import struct
+
+import psutil
+from colorama import Fore, Style
+
+from async_engine import AsyncExecutor, command_resources
+from settings import state_path
+
+REGISTRY_FILE = "artifacts.jsonl"
+# Une ressource plus récente peut appartenir à une création en cours
+DEFAULT_MIN_AGE = 3600
+STOPPED_CONTAINER_STATES = ("created", "exited", "dead")
+INCOMPLETE_STATUSES = ("new", "in_progress", "failed")
+
+Orphan = collections.namedtuple("Orphan", ["kind", "name", "size", "reason", "hypervisor"])
+
+_lock = threading.Lock()
+
+
+# ------------------------------------------------------------------ registre
+def register(kind, name, hypervisor=None, owner=None, **identity):
+    """Ajoute une ressource créée par l'outil au registre."""
+    entry = {"kind": kind, "name": name, "hypervisor": hypervisor, "owner": owner, "ts": time.time(), **identity}
+    with _lock, open(state_path(REGISTRY_FILE), "a") as file:
+        file.write(json.dumps(entry) + "\n")
+
+
+def register_file(path, hypervisor=None, owner=None):
+    """Enregistre un fichier créé par l'outil, identifié par son inode."""
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return
+    register("file", path, hypervisor, owner, dev=stat.st_dev, ino=stat.st_ino)
+
+
+def load_registry():
+    """Retourne les entrées du registre (la plus récente pour chaque ressource)."""
+    path = state_path(REGISTRY_FILE)
+    entries = {}
+    if os.path.exists(path):
+        with _lock, open(path, "r") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entries[(entry["kind"], entry["name"])] = entry
+    return list(entries.values())
+
+
+def _save_registry(entries):
+    path = state_path(REGISTRY_FILE)
+    tmp_path = f"{path}.tmp"
+    with _lock:
+        with open(tmp_path, "w") as file:
+            for entry in entries:
+                file.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, path)
+
+
+# ---------------------------------------------------------------- état réel
+def _journals():
+    """Journaux d'étapes : {(hyperviseur, vm): {"status", "path", "mtime", "registered", "disk_ready"}}."""
+    journals = {}
+    for path in glob.glob(os.path.join(os.path.dirname(state_path("checkpoints", "_")), "*.json")):
+        try:
+            with open(path, "r") as file:
+                state = json.load(file)
+            mtime = os.path.getmtime(path)
+        except (OSError, ValueError):
+            continue
+        steps = state.get("steps", {})
+        registered = steps.get("cmd-00", {}).get("status") == "done"
+        disk_ready = "disk" in steps and all(steps[step].get("status") == "done" for step in ("disk", "convert")
+                                             if step in steps)
+        journals[(state.get("hypervisor"), state.get("vm"))] = {
+            "status": state.get("status"), "path": path, "mtime": mtime, "registered": registered,
+            "disk_ready": disk_ready,
+        }
+    return journals
+
+
+def _interfaces():
+    """Interfaces existantes et interfaces TAP utilisées par un processus (QEMU)."""
+    from monitor import tap_interface
+
+    in_use = set()
+    for process in psutil.process_iter(["cmdline"]):
+        tap = tap_interface(process.info["cmdline"] or [])
+        if tap:
+            in_use.add(tap)
+    return set(psutil.net_if_stats()), in_use
+
+
+def _qemu_files(cmdline, cwd):
+    """Fichiers ouverts par une ligne de commande QEMU (disques, CD), en chemins absolus."""
+    files = set()
+    for index, arg in enumerate(cmdline[:-1]):
+        value = cmdline[index + 1]
+        if arg in ("-hda", "-hdb", "-hdc", "-hdd", "-cdrom"):
+            files.add(value)
+        elif arg == "-drive":
+            files.update(option[len("file="):] for option in value.split(",") if option.startswith("file="))
+    return {os.path.normpath(os.path.join(cwd, path)) for path in files}
+
+
+def _qemu_vms():
+    """VMs QEMU en cours d'exécution (fichier PID + ligne de commande) : {nom: fichiers utilisés}."""
+    from monitor import qemu_processes
+
+    vms = {}
+    for name, (pid, cmdline) in qemu_processes().items():
+        try:
+            cwd = psutil.Process(pid).cwd()
+        except psutil.Error:
+            cwd = "/"
+        vms[name] = _qemu_files(cmdline, cwd)
+    return vms
+
+
+def backing_chain(path):
+    """Images de base (backing files) d'un disque QCOW2, de la plus proche à la plus lointaine."""
+    chain = []
+    while path and path not in chain:
+        try:
+            with open(path, "rb") as file:
+                header = file.read(20)
+                if len(header) < 20 or header[:4] != b"QFI\xfb":
+                    break
+                offset, size = struct.unpack(">QI", header[8:20])
+                if not offset or not size:
+                    break
+                file.seek(offset)
+                backing = file.read(size).decode("utf-8", "replace")
+        except OSError:
+            break
+        path = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(path)), backing))
+        chain.append(path)
+    return chain
+
+
+async def _containers(engine):
+    """Conteneurs Docker {nom: (identifiant, état)}, ou None si Docker est indisponible."""
+    try:
+        result = await engine.run(
+            ["docker", "ps", "-a", "--no-trunc", "--format", "{{.ID}} {{.Names}} {{.State}}"], resources=["docker"]
+        )
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    containers = {}
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) == 3:
+            containers[parts[1]] = (parts[0], parts[2])
+    return containers
+
+
+def _saved_state_files():
+    """Fichiers des états QEMU sauvegardés (fichier d'état et disque figé)."""
+    from qmp import list_states
+
+    return {
+        os.path.abspath(path)
+        for manifest in list_states().values()
+        for path in (manifest.get("state"), manifest.get("base")) if path
+    }
+
+
+async def live_state(paths, engine):
+    """Relève en parallèle l'état réel : VMs VirtualBox et QEMU, conteneurs, interfaces, journaux, états sauvegardés."""
+    from utils import list_vms
+
+    async def virtualbox_vms():
+        if "VirtualBox" not in paths:
+            return None
+        return set(await engine.call(list_vms, "VirtualBox", paths, resources=command_resources([paths["VirtualBox"]])))
+
+    vbox_vms, qemu_vms, containers, interfaces, journals, states = await asyncio.gather(
+        virtualbox_vms(), engine.call(_qemu_vms), _containers(engine), engine.call(_interfaces),
+        engine.call(_journals), engine.call(_saved_state_files),
+    )
+    return {"virtualbox": vbox_vms, "qemu": qemu_vms, "containers": containers, "interfaces": interfaces,
+            "journals": journals, "states": states}
+
+
+# -------------------------------------------------------------- orphelins
+def _allocated(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 0
+    # Taille réellement occupée (les disques sont souvent creux)
+    return stat.st_blocks * 512 if hasattr(stat, "st_blocks") else stat.st_size
+
+
+def _vm_gone(hypervisor, owner, state, vmx_files):
+    if hypervisor == "VirtualBox":
+        return state["virtualbox"] is not None and owner not in state["virtualbox"]
+    if hypervisor == "VMware":
+        return not any(os.path.exists(path) for path in vmx_files.get(owner, ()))
+    return False
+
+
+def _incomplete(hypervisor, journal):
+    """
+    Création inachevée : journal en cours ou en échec. Une VM QEMU dont les disques
+    sont prêts n'en est pas une : son lancement (`cmd-00`) est la VM elle-même, et
+    un arrêt brutal de l'invité ne dit rien du système installé sur le disque.
+    """
+    return journal["status"] in INCOMPLETE_STATUSES and not (hypervisor == "QEMU" and journal.get("disk_ready"))
+
+
+def find_orphans(entries, state, min_age=DEFAULT_MIN_AGE, now=None, stopped_containers=False):
+    """
+    Confronte le registre à l'état réel.
+
+    Les conteneurs arrêtés ne sont des orphelins qu'avec `stopped_containers`
+    (l'utilisateur peut les avoir arrêtés volontairement).
+
+    Retourne (orphelins, entrées obsolètes) : les entrées obsolètes désignent des
+    ressources déjà disparues ou remplacées, simplement retirées du registre.
+    """
+    now = now or time.time()
+    journals = state["journals"]
+    interfaces, in_use = state["interfaces"]
+    vmx_files = collections.defaultdict(list)
+    for entry in entries:
+        if entry["kind"] == "file" and entry["name"].endswith(".vmx"):
+            vmx_files[entry["owner"]].append(entry["name"])
+
+    # Fichiers d'une VM QEMU en cours d'exécution ou d'un état sauvegardé, et images
+    # de base de tout disque encore présent
+    running_qemu = state.get("qemu") or {}
+    files_in_use = set().union(*running_qemu.values(), state.get("states") or ())
+    for path in list(files_in_use) + [entry["name"] for entry in entries if entry["kind"] == "file"]:
+        files_in_use.update(backing_chain(path))
+
+    orphans, stale = [], []
+    gone_vms = set()
+    for entry in entries:
+        kind, name, hypervisor, owner = entry["kind"], entry["name"], entry.get("hypervisor"), entry.get("owner")
+        old_enough = now - entry["ts"] >= min_age
+
+        if kind == "file":
+            try:
+                stat = os.stat(name)
+            except OSError:
+                stale.append(entry)
+                continue
+            if (stat.st_dev, stat.st_ino) != (entry.get("dev"), entry.get("ino")):
+                stale.append(entry)  # fichier recréé par autre chose : il ne nous appartient plus
+                continue
+            if not old_enough or name in files_in_use or (hypervisor == "QEMU" and owner in running_qemu):
+                continue
+            journal = journals.get((hypervisor, owner))
+            if journal is None:
+                reason = "création abandonnée ou simulée"
+            elif _incomplete(hypervisor, journal):
+                reason = "création inachevée"
+            elif _vm_gone(hypervisor, owner, state, vmx_files):
+                reason = "VM supprimée de l'hyperviseur"
+                gone_vms.add((hypervisor, owner))
+            elif hypervisor in ("VirtualBox", "VMware") and name.endswith(".qcow2"):
+                reason = "disque intermédiaire déjà converti"
+            else:
+                continue
+            orphans.append(Orphan("file", name, _allocated(name), reason, hypervisor))
+
+        elif kind == "tap":
+            if name not in interfaces:
+                stale.append(entry)
+            elif old_enough and name not in in_use:
+                orphans.append(Orphan("tap", name, 0, "interface TAP inutilisée", None))
+
+        elif kind == "container":
+            containers = state["containers"]
+            if containers is None:
+                continue  # Docker indisponible : rien n'est décidé
+            known = containers.get(name)
+            if known is None or (entry.get("id") and known[0] != entry["id"]):
+                stale.append(entry)
+            elif stopped_containers and old_enough and known[1] in STOPPED_CONTAINER_STATES:
+                orphans.append(Orphan("container", name, 0, f"conteneur arrêté ({known[1]})", None))
+
+    for (hypervisor, vm), journal in journals.items():
+        if now - journal["mtime"] < min_age or (hypervisor == "QEMU" and vm in running_qemu):
+            continue
+        incomplete = _incomplete(hypervisor, journal)
+        if incomplete and hypervisor == "VirtualBox" and journal["registered"] \
+                and state["virtualbox"] is not None and vm in state["virtualbox"]:
+            orphans.append(Orphan("vm", vm, 0, "création inachevée", hypervisor))
+        if incomplete or (hypervisor, vm) in gone_vms:
+            orphans.append(Orphan("checkpoint", journal["path"], _allocated(journal["path"]),
+                                  f"journal de '{vm}' ({hypervisor})", hypervisor))
+    return orphans, stale
+
+
+# ------------------------------------------------------------- suppression
+async def _delete(orphan, paths, engine):
+    if orphan.kind in ("file", "checkpoint"):
+        try:
+            await engine.call(os.remove, orphan.name, resources=[f"disk:{orphan.name}"])
+        except FileNotFoundError:
+            pass  # déjà supprimé avec sa VM (unregistervm --delete)
+    elif orphan.kind == "tap":
+        await engine.run(["sudo", "ip", "tuntap", "del", "dev", orphan.name, "mode", "tap"],
+                         resources=["network"], check=True)
+    elif orphan.kind == "container":
+        await engine.run(["docker", "rm", orphan.name], resources=["docker"], check=True)
+    elif orphan.kind == "vm":
+        cmd = [paths["VirtualBox"], "unregistervm", orphan.name, "--delete"]
+        await engine.run(cmd, resources=command_resources(cmd), check=True)
+
+
+async def collect_garbage_async(paths, dry_run=False, min_age=DEFAULT_MIN_AGE, engine=None, stopped_containers=False):
+    """
+    Supprime en parallèle les ressources orphelines créées par l'outil
+    (conteneurs arrêtés compris avec `stopped_containers`).
+
+    Les VMs, conteneurs et interfaces sont supprimés d'abord, puis les fichiers.
+    Retourne {"orphans", "deleted", "failed", "reclaimed"} (`reclaimed` en octets).
+    """
+    engine = engine or AsyncExecutor(on_output=None)
+    entries = load_registry()
+    state = await live_state(paths, engine)
+    orphans, stale = find_orphans(entries, state, min_age, stopped_containers=stopped_containers)
+
+    for orphan in orphans:
+        size = f" ({orphan.size / 1024 ** 2:.1f} Mo)" if orphan.size else ""
+        print(f"  🗑 {orphan.kind:10s} {orphan.name}{size} — {orphan.reason}")
+
+    deleted, failed = [], []
+    if not dry_run:
+        for phase in (("vm", "container", "tap"), ("file", "checkpoint")):
+            batch = [orphan for orphan in orphans if orphan.kind in phase]
+            results = await asyncio.gather(*(_delete(orphan, paths, engine) for orphan in batch),
+                                           return_exceptions=True)
+            for orphan, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logging.warning(f"⚠️ Suppression impossible de {orphan.name} : {result}")
+                    failed.append(orphan)
+                else:
+                    deleted.append(orphan)
+
+        removed = {(orphan.kind, orphan.name) for orphan in deleted}
+        dropped = {(entry["kind"], entry["name"]) for entry in stale}
+        _save_registry([entry for entry in load_registry()
+                        if (entry["kind"], entry["name"]) not in removed | dropped])
+
+    reclaimed = sum(orphan.size for orphan in (orphans if dry_run else deleted))
+    verb = "récupérables" if dry_run else "récupérés"
+    color = Fore.YELLOW if failed else Fore.GREEN
+    print(f"{color}{'🔎 [Dry-run] ' if dry_run else '✅ '}{len(orphans)} orphelin(s), "
+          f"{reclaimed / 1024 ** 2:.1f} Mo {verb}"
+          f"{f', {len(failed)} échec(s)' if failed else ''}.{Style.RESET_ALL}")
+    return {"orphans": orphans, "deleted": deleted, "failed": failed, "reclaimed": reclaimed}
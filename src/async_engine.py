@@ -0,0 +1,158 @@
+"""
+Moteur d'exécution asyncio pour les commandes d'hyperviseurs et de Docker.
+
+Les commandes sont lancées avec `asyncio.create_subprocess_exec`, leurs sorties
+stdout/stderr sont diffusées ligne par ligne pendant l'exécution (fin de ligne
+`\n` ou `\r`, comme les barres de progression de `qemu-img`), et des sémaphores
+par ressource limitent la concurrence (ex : une conversion à la fois par
+disque, un nombre borné d'appels `VBoxManage` simultanés).
+"""
+import asyncio
+import logging
+import re
+import subprocess
+import time
+
+import executor
+
+# Limites de concurrence par catégorie de ressource. Une ressource s'écrit
+# "catégorie" ou "catégorie:instance" (ex : "disk:MaVM.qcow2") ; chaque instance
+# possède son propre sémaphore, dimensionné par la limite de sa catégorie.
+DEFAULT_LIMITS = {
+    "VBoxManage": 1,
+    "vmrun": 2,
+    "qemu-img": 4,
+    "disk": 1,
+    "docker": 4,
+}
+DEFAULT_LIMIT = 4
+READ_CHUNK = 64 * 1024  # lecture par blocs : aucune limite sur la longueur d'une ligne
+_LINE_END = re.compile(rb"\r\n|\r|\n")
+
+
+def _print_line(label, stream, line):
+    prefix = f"[{label}] " if label else ""
+    if stream == "stderr":
+        logging.warning(f"{prefix}{line}")
+    else:
+        print(f"{prefix}{line}")
+
+
+class AsyncExecutor:
+    """Exécute des commandes en parallèle en respectant les limites par ressource."""
+
+    def __init__(self, limits=None, on_output=_print_line):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.on_output = on_output
+        self._semaphores = {}
+
+    def semaphore(self, resource):
+        """Retourne (en le créant si besoin) le sémaphore associé à une ressource."""
+        if resource not in self._semaphores:
+            category = resource.split(":", 1)[0]
+            self._semaphores[resource] = asyncio.Semaphore(self.limits.get(category, DEFAULT_LIMIT))
+        return self._semaphores[resource]
+
+    async def _acquire(self, resources):
+        # Ordre stable pour éviter les interblocages entre tâches concurrentes.
+        acquired = []
+        try:
+            for resource in sorted(set(resources)):
+                semaphore = self.semaphore(resource)
+                await semaphore.acquire()
+                acquired.append(semaphore)
+        except BaseException:
+            self._release(acquired)
+            raise
+        return acquired
+
+    @staticmethod
+    def _release(acquired):
+        for semaphore in reversed(acquired):
+            semaphore.release()
+
+    def _emit(self, raw, name, label, lines):
+        line = raw.decode("utf-8", "replace")
+        lines.append(line)
+        if self.on_output:
+            self.on_output(label, name, line)
+
+    async def _pump(self, stream, name, label, lines):
+        pending = b""
+        while True:
+            chunk = await stream.read(READ_CHUNK)
+            if not chunk:
+                break
+            data = pending + chunk
+            # Un `\r` final peut être suivi d'un `\n` dans le bloc suivant : il reste en attente
+            cut = len(data) - 1 if data.endswith(b"\r") else len(data)
+            *complete, pending = _LINE_END.split(data[:cut])
+            pending += data[cut:]
+            for raw in complete:
+                self._emit(raw, name, label, lines)
+        if pending:
+            self._emit(pending.rstrip(b"\r"), name, label, lines)
+
+    async def run(self, cmd, resources=(), check=False, label=None):
+        """
+        Exécute une commande de manière asynchrone et diffuse ses sorties.
+
+        - resources : ressources à réserver pendant l'exécution (ex : ["VBoxManage"])
+        - check : lève CalledProcessError si le code retour est non nul
+        - label : préfixe affiché devant chaque ligne de sortie
+
+        Retourne un `subprocess.CompletedProcess` (sorties texte).
+        """
+        acquired = await self._acquire(resources)
+        try:
+            if executor.replay_enabled():
+                return await asyncio.to_thread(executor.run, cmd, capture_output=True, text=True, check=check)
+
+            start = time.perf_counter()
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+                )
+            except OSError as e:
+                executor.record(cmd, time.perf_counter() - start, error=type(e).__name__)
+                raise
+
+            stdout_lines, stderr_lines = [], []
+            try:
+                await asyncio.gather(
+                    self._pump(process.stdout, "stdout", label, stdout_lines),
+                    self._pump(process.stderr, "stderr", label, stderr_lines),
+                )
+                returncode = await process.wait()
+            except asyncio.CancelledError:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                raise
+
+            stdout = "\n".join(stdout_lines)
+            stderr = "\n".join(stderr_lines)
+            executor.record(cmd, time.perf_counter() - start, returncode, stdout, stderr)
+        finally:
+            self._release(acquired)
+
+        if check and returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd, stdout, stderr)
+        return subprocess.CompletedProcess(cmd, returncode, stdout, stderr)
+
+    async def call(self, func, *args, resources=(), **kwargs):
+        """Exécute une fonction bloquante dans un thread en réservant des ressources."""
+        acquired = await self._acquire(resources)
+        try:
+            return await asyncio.to_thread(func, *args, **kwargs)
+        finally:
+            self._release(acquired)
+
+
+def command_resources(cmd):
+    """Déduit les ressources à réserver pour une commande d'hyperviseur ou Docker."""
+    program = str(cmd[0]).replace("\\", "/").rsplit("/", 1)[-1]
+    for category in ("VBoxManage", "vmrun", "qemu-img", "docker"):
+        if program.startswith(category):
+            return [category]
+    return []
@@ -0,0 +1,267 @@
+"""
+Journal d'étapes de provisionnement, pour reprendre une création interrompue.
+
+Chaque VM possède un fichier d'état (`.vm_create/checkpoints/<hyperviseur>-<nom>.json`)
+qui liste les étapes terminées avec leurs artefacts et sommes de contrôle. Une
+nouvelle exécution saute les étapes déjà faites (artefacts intacts) et reprend
+à l'étape en échec ; toutes les étapes suivantes sont alors rejouées.
+"""
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import time
+
+import psutil
+from colorama import Fore, Style
+
+import executor
+from artifacts import register_file
+from monitor import pid_file, qemu_processes
+from settings import state_path
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _same_file(path, other):
+    if os.path.abspath(path) == os.path.abspath(other):
+        return True
+    try:
+        return os.path.samefile(path, other)
+    except OSError:
+        return False
+
+
+def file_checksum(path):
+    """Retourne le SHA-256 d'un fichier, ou None s'il n'existe pas."""
+    if not path or not os.path.isfile(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StepJournal:
+    """Journal des étapes terminées pour une VM donnée."""
+
+    def __init__(self, hypervisor, name):
+        self.hypervisor = hypervisor
+        self.name = name
+        self.path = state_path("checkpoints", f"{hypervisor}-{name}.json")
+        self._replaying = False
+        self.state = self._load()
+
+    def _empty(self):
+        return {"hypervisor": self.hypervisor, "vm": self.name, "status": "new", "failed": None, "steps": {}}
+
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as file:
+                    return json.load(file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"⚠️ Journal d'étapes illisible ({self.path}) : {e}")
+        return self._empty()
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.state, file, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def steps(self):
+        return self.state["steps"]
+
+    def resumable(self):
+        """Indique si une création précédente s'est arrêtée en cours de route."""
+        return self.state["status"] in ("in_progress", "failed") and bool(self.steps)
+
+    def reset(self):
+        """Repart d'un journal vide pour une nouvelle création."""
+        self.state = self._empty()
+        self._replaying = False
+        self._save()
+
+    def _step_valid(self, step, fingerprint):
+        record = self.steps.get(step)
+        if not record or record.get("status") != "done":
+            return False
+        if fingerprint is not None and record.get("fingerprint") != fingerprint:
+            return False
+        return all(file_checksum(path) == checksum for path, checksum in record.get("artifacts", {}).items())
+
+    def should_run(self, step, fingerprint=None):
+        """
+        Indique si une étape doit être (re)jouée.
+
+        Une étape est sautée si elle est terminée, avec la même empreinte et des
+        artefacts inchangés, et qu'aucune étape précédente n'a été rejouée.
+        """
+        if self._replaying or not self._step_valid(step, fingerprint):
+            self._replaying = True
+            return True
+        return False
+
+    def result(self, step):
+        return self.steps.get(step, {}).get("result")
+
+    def complete(self, step, result=None, artifacts=(), fingerprint=None):
+        """Marque une étape comme terminée avec ses artefacts."""
+        self.steps[step] = {
+            "status": "done",
+            "result": result if isinstance(result, (str, int, float, bool)) or result is None else True,
+            "artifacts": {path: file_checksum(path) for path in artifacts if path},
+            "fingerprint": fingerprint,
+            "ts": time.time(),
+        }
+        self.state["status"] = "in_progress"
+        self.state["failed"] = None
+        self._save()
+        for path in artifacts:
+            if path:
+                register_file(path, self.hypervisor, self.name)
+
+    def fail(self, step, error):
+        """Enregistre l'étape en échec."""
+        self.steps[step] = {"status": "failed", "error": str(error), "ts": time.time()}
+        self.state["status"] = "failed"
+        self.state["failed"] = step
+        self._save()
+
+    def finish(self):
+        """Marque la création comme terminée."""
+        self.state["status"] = "completed"
+        self._save()
+
+    def clear(self):
+        """Supprime le journal."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.state = self._empty()
+
+    def replace_artifact(self, path, new_path=None):
+        """
+        Retire un artefact du journal (il change de propriétaire : le rollback ne
+        le supprime plus), remplacé par `new_path` dans la même étape s'il est donné.
+        Retourne True si l'artefact était dans le journal.
+        """
+        for record in self.steps.values():
+            artifacts = record.get("artifacts", {})
+            for known in list(artifacts):
+                if _same_file(known, path):
+                    del artifacts[known]
+                    if new_path:
+                        artifacts[new_path] = file_checksum(new_path)
+                    self._save()
+                    return True
+        return False
+
+    def artifacts(self):
+        """Liste tous les artefacts enregistrés, dans l'ordre des étapes."""
+        paths = []
+        for record in self.steps.values():
+            for path in record.get("artifacts", {}):
+                if path not in paths:
+                    paths.append(path)
+        return paths
+
+    def _skip(self, step):
+        print(f"{Fore.CYAN}⏭️ [{self.name}] Étape '{step}' déjà effectuée, reprise après.{Style.RESET_ALL}")
+        return self.result(step)
+
+    def _done(self, step, result, artifact, fingerprint):
+        if result is None or result is False:
+            self.fail(step, "échec")
+            return None
+        self.complete(step, result, [result] if artifact else (), fingerprint)
+        return result
+
+    def run(self, step, func, *args, artifact=False, fingerprint=None):
+        """
+        Exécute une étape si nécessaire et l'enregistre.
+
+        - artifact : le résultat de `func` est un fichier à vérifier lors des reprises
+        - fingerprint : empreinte des paramètres de l'étape (ex : argv de la commande)
+
+        Retourne le résultat de l'étape (celui enregistré si elle est sautée),
+        ou None si elle a échoué.
+        """
+        if not self.should_run(step, fingerprint):
+            return self._skip(step)
+        try:
+            result = func(*args)
+        except Exception as e:
+            self.fail(step, e)
+            raise
+        return self._done(step, result, artifact, fingerprint)
+
+    async def arun(self, step, func, *args, artifact=False, fingerprint=None):
+        """Variante asynchrone de `run` (`func` est une coroutine)."""
+        if not self.should_run(step, fingerprint):
+            return self._skip(step)
+        try:
+            result = await func(*args)
+        except Exception as e:
+            self.fail(step, e)
+            raise
+        return self._done(step, result, artifact, fingerprint)
+
+
+def _stop_qemu(name, timeout=10):
+    """Arrête le processus QEMU d'une VM (fichier PID), pour libérer ses fichiers avant suppression."""
+    running = qemu_processes().get(name)
+    if running:
+        print(f"{Fore.RED}⏹️ Arrêt de la VM QEMU '{name}' (PID {running[0]})...{Style.RESET_ALL}")
+        try:
+            process = psutil.Process(running[0])
+            process.terminate()
+            try:
+                process.wait(timeout)
+            except psutil.TimeoutExpired:
+                process.kill()
+                process.wait(timeout)
+        except psutil.Error as e:
+            logging.warning(f"⚠️ Arrêt de '{name}' impossible : {e}")
+    if os.path.exists(pid_file(name)):
+        os.remove(pid_file(name))
+
+
+def rollback(hypervisor, name, paths):
+    """
+    Annule une création (réussie ou partielle) : désenregistre la VM,
+    supprime les artefacts enregistrés puis le journal d'étapes.
+    """
+    journal = StepJournal(hypervisor, name)
+    if not journal.steps:
+        print(f"{Fore.YELLOW}⚠️ Aucun journal d'étapes pour '{name}' ({hypervisor}).{Style.RESET_ALL}")
+        return False
+
+    registered = any(
+        record.get("status") == "done" and step.startswith("cmd-")
+        for step, record in journal.steps.items()
+    )
+    if hypervisor == "QEMU":
+        _stop_qemu(name)
+    elif registered and hypervisor in paths:
+        print(f"{Fore.RED}🗑 Désenregistrement de la VM '{name}'...{Style.RESET_ALL}")
+        try:
+            if hypervisor == "VirtualBox":
+                executor.run([paths["VirtualBox"], "unregistervm", name, "--delete"], check=True)
+            elif hypervisor == "VMware":
+                executor.run([paths["VMware"], "-T", "ws", "stop", f"{name}.vmx", "hard"])
+                executor.run([paths["VMware"], "-T", "ws", "deleteVM", f"{name}.vmx"], check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logging.warning(f"⚠️ Désenregistrement impossible : {e}")
+
+    for path in reversed(journal.artifacts() + ([f"{name}.vmx"] if hypervisor == "VMware" else [])):
+        if os.path.exists(path):
+            os.remove(path)
+            print(f"🗑 Artefact supprimé : {path}")
+
+    journal.clear()
+    print(f"{Fore.GREEN}✅ Rollback de '{name}' terminé.{Style.RESET_ALL}")
+    return True
@@ -0,0 +1,184 @@
+"""
+Génération locale d'une image seed cloud-init (source NoCloud).
+
+L'image est un ISO9660 avec extension Joliet, de label `cidata`, contenant
+`user-data`, `meta-data` et éventuellement `network-config`. Elle est écrite en
+Python pur (aucun outil externe comme genisoimage) et mise en cache par
+empreinte de son contenu : une même configuration n'est construite qu'une fois.
+"""
+import hashlib
+import json
+import os
+import struct
+
+from settings import state_path
+
+SECTOR = 2048
+VOLUME_LABEL = "cidata"
+SEED_FILES = ("user-data", "meta-data", "network-config")
+
+# Emplacements fixes : 16 secteurs réservés, puis les descripteurs de volume.
+PVD_SECTOR = 16
+JOLIET_SECTOR = 17
+TERMINATOR_SECTOR = 18
+PATH_TABLES_SECTOR = 19  # L et M primaires, puis L et M Joliet (19 à 22)
+ROOT_SECTOR = 23
+JOLIET_ROOT_SECTOR = 24
+DATA_SECTOR = 25
+
+# Date "non renseignée" : garde l'image identique d'une génération à l'autre.
+NO_DATE = b"0" * 16 + b"\x00"
+
+
+def _both16(value):
+    return struct.pack("<H", value) + struct.pack(">H", value)
+
+
+def _both32(value):
+    return struct.pack("<I", value) + struct.pack(">I", value)
+
+
+def _sectors(size):
+    return (size + SECTOR - 1) // SECTOR
+
+
+def _text(value, length, joliet=False):
+    if joliet:
+        data = value.encode("utf-16-be")[:length - length % 2]
+        padding = " ".encode("utf-16-be") * ((length - len(data)) // 2)
+        return (data + padding).ljust(length, b"\x00")
+    return value.encode("ascii")[:length].ljust(length, b" ")
+
+
+def _dir_record(identifier, sector, size, is_dir=False):
+    length = 33 + len(identifier) + (1 - len(identifier) % 2)
+    record = struct.pack("<BB", length, 0) + _both32(sector) + _both32(size)
+    record += b"\x00" * 7  # date d'enregistrement non renseignée
+    record += struct.pack("<BBB", 2 if is_dir else 0, 0, 0) + _both16(1)
+    record += struct.pack("<B", len(identifier)) + identifier
+    return record.ljust(length, b"\x00")
+
+
+def _iso_name(name):
+    """Nom ISO9660 niveau 1 (8.3 en majuscules) ; les noms réels sont dans l'arbre Joliet."""
+    base = "".join(c for c in name.upper() if c.isalnum())[:8]
+    return f"{base}.;1".encode("ascii")
+
+
+def _volume_descriptor(kind, total_sectors, path_table_sector, root_sector, joliet=False):
+    descriptor = bytearray(SECTOR)
+    descriptor[0] = kind
+    descriptor[1:6] = b"CD001"
+    descriptor[6] = 1
+    descriptor[8:40] = _text("LINUX", 32, joliet)
+    descriptor[40:72] = _text(VOLUME_LABEL, 32, joliet)
+    descriptor[80:88] = _both32(total_sectors)
+    if joliet:
+        descriptor[88:91] = b"%/E"  # UCS-2 niveau 3
+    descriptor[120:124] = _both16(1)
+    descriptor[124:128] = _both16(1)
+    descriptor[128:132] = _both16(SECTOR)
+    descriptor[132:140] = _both32(10)
+    descriptor[140:144] = struct.pack("<I", path_table_sector)
+    descriptor[148:152] = struct.pack(">I", path_table_sector + 1)
+    descriptor[156:190] = _dir_record(b"\x00", root_sector, SECTOR, is_dir=True)
+    for start, length in ((190, 128), (318, 128), (446, 128), (574, 128), (702, 37), (739, 37), (776, 37)):
+        descriptor[start:start + length] = _text("", length, joliet)
+    for start in (813, 830, 847, 864):
+        descriptor[start:start + 17] = NO_DATE
+    descriptor[881] = 1
+    return bytes(descriptor)
+
+
+def _path_table(root_sector, big_endian):
+    return struct.pack(">BBIH" if big_endian else "<BBIH", 1, 0, root_sector, 1) + b"\x00\x00"
+
+
+def build_iso(files):
+    """
+    Construit une image ISO9660 + Joliet à partir d'un dictionnaire {nom: contenu (bytes)}.
+
+    Tous les fichiers sont placés à la racine ; le label de volume est `cidata`.
+    """
+    layout = []
+    sector = DATA_SECTOR
+    for name in sorted(files):
+        data = files[name]
+        layout.append((name, data, sector if data else 0))
+        sector += _sectors(len(data))
+    total_sectors = sector
+
+    def root_directory(root_sector, joliet):
+        entries = [_dir_record(b"\x00", root_sector, SECTOR, True), _dir_record(b"\x01", root_sector, SECTOR, True)]
+        named = [
+            ((name.encode("utf-16-be") if joliet else _iso_name(name)), data, start)
+            for name, data, start in layout
+        ]
+        for identifier, data, start in sorted(named):
+            entries.append(_dir_record(identifier, start, len(data)))
+        directory = b"".join(entries)
+        if len(directory) > SECTOR:
+            raise ValueError("Trop de fichiers pour une image seed")
+        return directory.ljust(SECTOR, b"\x00")
+
+    image = bytearray(SECTOR * PVD_SECTOR)
+    image += _volume_descriptor(1, total_sectors, PATH_TABLES_SECTOR, ROOT_SECTOR)
+    image += _volume_descriptor(2, total_sectors, PATH_TABLES_SECTOR + 2, JOLIET_ROOT_SECTOR, joliet=True)
+    image += (b"\xffCD001\x01").ljust(SECTOR, b"\x00")
+    for root_sector in (ROOT_SECTOR, JOLIET_ROOT_SECTOR):
+        image += _path_table(root_sector, False).ljust(SECTOR, b"\x00")
+        image += _path_table(root_sector, True).ljust(SECTOR, b"\x00")
+    image += root_directory(ROOT_SECTOR, False)
+    image += root_directory(JOLIET_ROOT_SECTOR, True)
+    for _, data, _ in layout:
+        image += data.ljust(_sectors(len(data)) * SECTOR, b"\x00")
+    return bytes(image)
+
+
+def render_seed_files(name, user_data=None, meta_data=None, network_config=None):
+    """
+    Prépare le contenu des fichiers seed.
+
+    Les valeurs peuvent être des chaînes (YAML déjà écrit) ou des dictionnaires,
+    sérialisés en JSON (un sous-ensemble du YAML accepté par cloud-init).
+    """
+    if user_data is None:
+        user_data = {}
+    if isinstance(user_data, dict):
+        user_data = "#cloud-config\n" + json.dumps(user_data, indent=2, sort_keys=True)
+    if meta_data is None:
+        meta_data = {"instance-id": name, "local-hostname": name}
+    if isinstance(meta_data, dict):
+        meta_data = json.dumps(meta_data, indent=2, sort_keys=True)
+
+    files = {"user-data": user_data.encode("utf-8"), "meta-data": meta_data.encode("utf-8")}
+    if network_config is not None:
+        if isinstance(network_config, dict):
+            network_config = json.dumps(network_config, indent=2, sort_keys=True)
+        files["network-config"] = network_config.encode("utf-8")
+    return files
+
+
+def seed_digest(files):
+    """Empreinte SHA-256 du contenu des fichiers seed."""
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        digest.update(name.encode("utf-8") + b"\x00" + struct.pack("<Q", len(files[name])) + files[name])
+    return digest.hexdigest()
+
+
+def create_seed_image(name, user_data=None, meta_data=None, network_config=None):
+    """
+    Retourne le chemin d'une image seed NoCloud pour la configuration donnée.
+
+    L'image est mise en cache dans `.vm_create/seeds/<empreinte>.iso` ; une
+    configuration identique réutilise l'image existante sans la reconstruire.
+    """
+    files = render_seed_files(name, user_data, meta_data, network_config)
+    path = state_path("seeds", f"{seed_digest(files)}.iso")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as seed:
+            seed.write(build_iso(files))
+        os.replace(tmp_path, path)
+    return os.path.abspath(path)
@@ -0,0 +1,397 @@
+"""
+Démon de provisionnement et client associé.
+
+Le démon garde en mémoire l'état coûteux à obtenir (hyperviseurs détectés,
+inventaire des VMs existantes) et reçoit des travaux de création via une API
+HTTP locale sur socket Unix. Les travaux passent par une file à priorité par
+hyperviseur : un worker ne prend un travail que si son hyperviseur a encore de
+la capacité, si bien qu'un hyperviseur saturé ne bloque pas les autres.
+
+Points d'entrée de l'API :
+  GET  /health              état du démon
+  GET  /jobs                liste des travaux
+  POST /jobs                soumission d'un travail ou d'une liste {"jobs": [...]}
+  GET  /jobs/<id>           état d'un travail
+  POST /jobs/<id>/cancel    annulation (DELETE /jobs/<id> est équivalent)
+"""
+import asyncio
+import heapq
+import http.client
+import itertools
+import json
+import logging
+import os
+import socket
+import time
+
+from colorama import Fore, Style
+
+from async_engine import AsyncExecutor
+from settings import state_path
+
+DEFAULT_SOCKET = "daemon.sock"
+DEFAULT_WORKERS = 8
+DEFAULT_HYPERVISOR_LIMITS = {"VirtualBox": 2, "VMware": 2, "QEMU": 4, "Hyper-V": 1, "docker": 8}
+
+JOB_STATES = ("queued", "running", "succeeded", "failed", "cancelled")
+
+
+def default_socket_path():
+    """Retourne le chemin par défaut du socket du démon."""
+    return state_path(DEFAULT_SOCKET)
+
+
+class Job:
+    """Travail de provisionnement soumis au démon."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, spec, priority=100):
+        self.id = str(next(self._ids))
+        self.spec = spec
+        self.kind = spec.get("kind", "vm")
+        self.priority = priority
+        self.status = "queued"
+        self.error = None
+        self.result = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.task = None
+
+    @property
+    def resource(self):
+        """Clé de limite de concurrence : l'hyperviseur, ou 'docker'."""
+        return "docker" if self.kind == "docker" else self.spec.get("hypervisor", "QEMU")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "spec": self.spec,
+            "priority": self.priority,
+            "status": self.status,
+            "error": self.error,
+            "result": self.result,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class ProvisioningDaemon:
+    """Démon de provisionnement : file à priorité, workers et API HTTP sur socket Unix."""
+
+    def __init__(self, socket_path=None, paths=None, workers=DEFAULT_WORKERS, limits=None, runner=None, engine=None):
+        self.socket_path = socket_path or default_socket_path()
+        self.paths = paths
+        self.workers = workers
+        self.limits = {**DEFAULT_HYPERVISOR_LIMITS, **(limits or {})}
+        self.runner = runner or self._run_job
+        self.engine = engine
+        self.jobs = {}
+        self.inventory = {}
+        self._pending = {}
+        self._running = {}
+        self._changed = None
+        self._seq = itertools.count()
+        self._server = None
+        self._worker_tasks = []
+        self._stopped = None
+
+    # ------------------------------------------------------------------ état
+    def warm_up(self):
+        """Détecte les hyperviseurs et charge l'inventaire une seule fois au démarrage."""
+        from os_detection import find_hypervisors
+        from utils import list_vms
+
+        if self.paths is None:
+            _, self.paths = find_hypervisors()
+        for hypervisor in self.paths:
+            self.inventory[hypervisor] = set(list_vms(hypervisor, self.paths))
+
+    def _has_capacity(self, resource):
+        return self._running.get(resource, 0) < self.limits.get(resource, 1)
+
+    # ---------------------------------------------------------------- travaux
+    def submit(self, spec):
+        """Ajoute un travail dans la file et le retourne."""
+        priority = int(spec.pop("priority", 100))
+        job = Job(spec, priority)
+        self.jobs[job.id] = job
+        heapq.heappush(self._pending.setdefault(job.resource, []), (job.priority, next(self._seq), job.id))
+        self._changed.set()
+        return job
+
+    def cancel(self, job_id):
+        """Annule un travail en attente ou en cours ; retourne le travail ou None."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if job.status == "queued":
+            job.status = "cancelled"
+            job.finished = time.time()
+        elif job.status == "running" and job.task is not None:
+            job.task.cancel()
+        return job
+
+    async def _run_job(self, job):
+        from utils import create_docker_container_async
+        from vm_manager import create_vm_async
+
+        spec = job.spec
+        if job.kind == "docker":
+            result = await create_docker_container_async(
+                spec.get("container_name", "mon-conteneur"),
+                spec.get("image_name", "ubuntu:latest"),
+                spec.get("volume_name", ""),
+                spec.get("ports", {}),
+                spec.get("env_vars", {}),
+                spec.get("command", "bash"),
+                engine=self.engine,
+            )
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip() or "docker run a échoué")
+            return spec.get("container_name", "mon-conteneur")
+
+        hypervisor = spec.get("hypervisor", "QEMU")
+        name = spec.get("vm_name", "MaVM")
+        if hypervisor not in self.paths:
+            raise RuntimeError(f"Hyperviseur '{hypervisor}' non disponible")
+        if name in self.inventory.get(hypervisor, set()):
+            raise RuntimeError(f"La VM '{name}' existe déjà")
+
+        # L'inventaire en mémoire remplace la vérification d'existence par commande.
+        self.inventory.setdefault(hypervisor, set()).add(name)
+        try:
+            created = await create_vm_async(
+                hypervisor, name, spec.get("arch", "x86_64"), spec.get("ram", 2048),
+                spec.get("iso_path", "isos/ubuntu.iso"), self.paths,
+                dry_run=spec.get("dry_run", False), bridge_interface=spec.get("bridge"),
+                engine=self.engine, interactive=False, check_exists=False,
+                template=spec.get("template"), cloud_init=spec.get("cloud_init"),
+                tuning=spec.get("tuning"), cpus=spec.get("cpus"), disk_profile=spec.get("disk_profile"),
+            )
+        except BaseException:
+            self.inventory[hypervisor].discard(name)
+            raise
+        if created is None:
+            self.inventory[hypervisor].discard(name)
+            raise RuntimeError(f"Échec de la création de la VM '{name}'")
+        return created
+
+    def _pop_ready(self):
+        """Retire le travail le plus prioritaire parmi les hyperviseurs ayant de la capacité, ou None."""
+        best = None
+        for resource, pending in self._pending.items():
+            while pending and self.jobs[pending[0][2]].status != "queued":
+                heapq.heappop(pending)
+            if pending and self._has_capacity(resource) and (best is None or pending[0] < best[0]):
+                best = (pending[0], resource)
+        if best is None:
+            return None
+        _, resource = best
+        job = self.jobs[heapq.heappop(self._pending[resource])[2]]
+        self._running[resource] = self._running.get(resource, 0) + 1
+        # Retiré de la file : une annulation vise désormais la tâche, plus l'entrée en attente
+        job.status = "running"
+        job.started = time.time()
+        return job
+
+    async def _execute(self, job):
+        try:
+            job.result = await self.runner(job)
+            job.status = "succeeded"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logging.error(f"❌ Travail {job.id} en échec : {e}")
+        finally:
+            job.finished = time.time()
+
+    async def _worker(self):
+        while True:
+            job = self._pop_ready()
+            if job is None:
+                # Réveil à chaque soumission ou fin de travail (capacité libérée)
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+            try:
+                job.task = asyncio.create_task(self._execute(job))
+                await job.task
+            except asyncio.CancelledError:
+                # Tâche du travail annulée avant son démarrage : le worker continue, sauf s'il est lui-même arrêté
+                if asyncio.current_task().cancelling():
+                    raise
+            finally:
+                if job.status == "running":
+                    job.status = "cancelled"
+                    job.finished = time.time()
+                job.task = None
+                self._running[job.resource] -= 1
+                self._changed.set()
+
+    # ------------------------------------------------------------------- HTTP
+    def _route(self, method, path, body):
+        parts = [part for part in path.split("?", 1)[0].split("/") if part]
+
+        if parts == ["health"] and method == "GET":
+            counts = {state: 0 for state in JOB_STATES}
+            for job in self.jobs.values():
+                counts[job.status] += 1
+            return 200, {"status": "ok", "hypervisors": sorted(self.paths or {}), "jobs": counts}
+
+        if parts == ["jobs"]:
+            if method == "GET":
+                return 200, {"jobs": [job.to_dict() for job in self.jobs.values()]}
+            if method == "POST":
+                specs = body.get("jobs") if isinstance(body, dict) and "jobs" in body else [body]
+                if not all(isinstance(spec, dict) for spec in specs):
+                    return 400, {"error": "Chaque travail doit être un objet JSON"}
+                return 202, {"jobs": [self.submit(dict(spec)).to_dict() for spec in specs]}
+
+        if len(parts) >= 2 and parts[0] == "jobs":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                return 404, {"error": f"Travail inconnu : {parts[1]}"}
+            if len(parts) == 2 and method == "GET":
+                return 200, job.to_dict()
+            if (len(parts) == 3 and parts[2] == "cancel" and method == "POST") or (len(parts) == 2 and method == "DELETE"):
+                return 200, self.cancel(job.id).to_dict()
+
+        return 404, {"error": f"Route inconnue : {method} {path}"}
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                return
+            method, path, _ = request_line.split(" ", 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            length = int(headers.get("content-length", 0))
+            raw_body = await reader.readexactly(length) if length else b""
+            try:
+                body = json.loads(raw_body) if raw_body else {}
+                status, payload = self._route(method.upper(), path, body)
+            except (ValueError, TypeError) as e:
+                status, payload = 400, {"error": f"Requête invalide : {e}"}
+
+            data = json.dumps(payload).encode("utf-8")
+            reason = http.client.responses.get(status, "")
+            writer.write(
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    # -------------------------------------------------------------- cycle vie
+    async def start(self):
+        """Démarre le serveur et les workers (l'état doit déjà être chargé)."""
+        self._changed = asyncio.Event()
+        self._stopped = asyncio.Event()
+        if self.engine is None:
+            self.engine = AsyncExecutor()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logging.info(f"🛰️ Démon à l'écoute sur {self.socket_path}")
+
+    async def stop(self):
+        """Arrête le serveur, annule les travaux en cours et supprime le socket."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for job in self.jobs.values():
+            if job.status == "running" and job.task is not None:
+                job.task.cancel()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._stopped.set()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._stopped.wait()
+        finally:
+            if not self._stopped.is_set():
+                await self.stop()
+
+
+def run_daemon(socket_path=None, workers=DEFAULT_WORKERS, limits=None):
+    """Point d'entrée CLI : charge l'état puis sert les requêtes jusqu'à interruption."""
+    daemon = ProvisioningDaemon(socket_path, workers=workers, limits=limits)
+    daemon.warm_up()
+    print(f"{Fore.GREEN}🛰️ Démon prêt sur {daemon.socket_path} (Ctrl+C pour arrêter){Style.RESET_ALL}")
+    try:
+        asyncio.run(daemon.serve_forever())
+    except KeyboardInterrupt:
+        print(f"{Fore.YELLOW}🛑 Démon arrêté.{Style.RESET_ALL}")
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=30):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class DaemonClient:
+    """Client léger de l'API du démon."""
+
+    def __init__(self, socket_path=None, timeout=30):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+
+    def request(self, method, path, payload=None):
+        connection = _UnixHTTPConnection(self.socket_path, self.timeout)
+        try:
+            body = json.dumps(payload) if payload is not None else None
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = json.loads(response.read() or b"{}")
+        finally:
+            connection.close()
+        if response.status >= 400:
+            raise RuntimeError(data.get("error", f"Erreur HTTP {response.status}"))
+        return data
+
+    def health(self):
+        return self.request("GET", "/health")
+
+    def submit(self, specs):
+        """Soumet un travail (dict) ou une liste de travaux ; retourne les travaux créés."""
+        if isinstance(specs, dict):
+            specs = [specs]
+        return self.request("POST", "/jobs", {"jobs": list(specs)})["jobs"]
+
+    def status(self, job_id):
+        return self.request("GET", f"/jobs/{job_id}")
+
+    def list(self):
+        return self.request("GET", "/jobs")["jobs"]
+
+    def cancel(self, job_id):
+        return self.request("POST", f"/jobs/{job_id}/cancel")
@@ -0,0 +1,214 @@
+"""
+Cache des disques convertis, indexé par empreinte du disque source.
+
+`convert_disk_format` consulte ce cache avant de lancer `qemu-img convert` : si
+le même disque source (même SHA-256) a déjà été converti dans le format
+demandé, le résultat est cloné (reflink, ou copie creuse) au lieu d'être reconverti. Le cache est borné
+en taille (éviction LRU) et tient des statistiques de succès/échecs.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from disk_clone import clone_file
+from settings import state_path
+
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+CHUNK_SIZE = 1024 * 1024
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+# Verrou partagé : plusieurs conversions peuvent tourner en parallèle (threads du moteur asyncio).
+_lock = threading.Lock()
+
+
+def parse_size(value):
+    """Convertit une taille ('512M', '20G', 1024...) en octets."""
+    if isinstance(value, int):
+        return value
+    value = str(value).strip().upper().removesuffix("B").removesuffix("I")
+    unit = value[-1] if value and value[-1] in SIZE_UNITS else ""
+    number = value[:-1] if unit else value
+    return int(float(number) * SIZE_UNITS[unit])
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_disk(source, target):
+    """Recopie un disque (reflink si possible) et retourne la méthode utilisée."""
+    return clone_file(source, target).method
+
+
+class ConversionCache:
+    """Cache LRU de disques convertis, borné en taille."""
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root or os.path.dirname(state_path("disk_cache", "index.json"))
+        os.makedirs(self.root, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.root, "index.json")
+        self._lock = _lock
+
+    # ---------------------------------------------------------------- index
+    def _load(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r") as file:
+                    return json.load(file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"⚠️ Index du cache de disques illisible : {e}")
+        return {"entries": {}, "digests": {}, "stats": {"hits": 0, "misses": 0, "evictions": 0, "stores": 0}}
+
+    def _save(self, index):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(index, file, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def digest(self, path):
+        """
+        Retourne le SHA-256 d'un disque source.
+
+        L'empreinte est mémorisée par (chemin, inode, taille, mtime) pour ne pas
+        relire un disque inchangé à chaque conversion.
+        """
+        stat = os.stat(path)
+        signature = f"{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+        key = os.path.abspath(path)
+        with self._lock:
+            known = self._load()["digests"].get(key)
+        if known and known["signature"] == signature:
+            return known["sha256"]
+
+        sha256 = _sha256(path)
+        with self._lock:
+            index = self._load()
+            index["digests"][key] = {"signature": signature, "sha256": sha256}
+            self._save(index)
+        return sha256
+
+    @staticmethod
+    def key(digest, disk_format):
+        return f"{digest}.{disk_format}"
+
+    # ---------------------------------------------------------- opérations
+    def fetch(self, source, disk_format, target):
+        """
+        Produit `target` depuis le cache si la conversion est connue.
+
+        Retourne True en cas de succès (hit), False sinon (miss).
+        """
+        if not os.path.isfile(source):
+            return False
+        key = self.key(self.digest(source), disk_format)
+        cached = os.path.join(self.root, key)
+
+        with self._lock:
+            index = self._load()
+            hit = key in index["entries"] and os.path.isfile(cached)
+            if not hit:
+                index["entries"].pop(key, None)
+                index["stats"]["misses"] += 1
+                self._save(index)
+                return False
+
+        # La copie se fait hors verrou : un fichier évincé entre-temps reste lisible une fois ouvert.
+        try:
+            method = copy_disk(cached, target)
+        except OSError as e:
+            logging.warning(f"⚠️ Lecture du cache impossible ({e}), conversion classique.")
+            return False
+
+        with self._lock:
+            index = self._load()
+            entry = index["entries"].get(key)
+            if entry is not None:
+                entry["last_access"] = time.time()
+                entry["hits"] = entry.get("hits", 0) + 1
+            index["stats"]["hits"] += 1
+            self._save(index)
+        logging.info(f"♻️ Disque {target} servi par le cache ({method}).")
+        return True
+
+    def store(self, source, disk_format, converted):
+        """Ajoute un disque converti au cache puis applique l'éviction LRU."""
+        if not (os.path.isfile(source) and os.path.isfile(converted)):
+            return False
+        size = os.path.getsize(converted)
+        if size > self.max_bytes:
+            return False
+        key = self.key(self.digest(source), disk_format)
+        tmp_path = os.path.join(self.root, f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        copy_disk(converted, tmp_path)
+
+        with self._lock:
+            os.replace(tmp_path, os.path.join(self.root, key))
+            index = self._load()
+            index["entries"][key] = {"format": disk_format, "size": size, "last_access": time.time(), "hits": 0}
+            index["stats"]["stores"] += 1
+            self._evict(index)
+            self._save(index)
+        return True
+
+    def _evict(self, index):
+        entries = index["entries"]
+        total = sum(entry["size"] for entry in entries.values())
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            path = os.path.join(self.root, key)
+            if os.path.exists(path):
+                os.remove(path)
+            total -= entry["size"]
+            del entries[key]
+            index["stats"]["evictions"] += 1
+
+    def stats(self):
+        """Retourne les statistiques du cache (succès, échecs, taille occupée...)."""
+        with self._lock:
+            index = self._load()
+        entries = index["entries"].values()
+        stats = dict(index["stats"])
+        lookups = stats["hits"] + stats["misses"]
+        stats.update({
+            "entries": len(index["entries"]),
+            "size": sum(entry["size"] for entry in entries),
+            "max_size": self.max_bytes,
+            "hit_ratio": stats["hits"] / lookups if lookups else 0.0,
+        })
+        return stats
+
+    def clear(self):
+        """Vide le cache (fichiers, index et statistiques)."""
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            os.makedirs(self.root, exist_ok=True)
+
+
+_max_bytes = DEFAULT_MAX_BYTES
+_enabled = True
+
+
+def configure_cache(max_bytes=None, enabled=True):
+    """Configure le cache global utilisé par `convert_disk_format`."""
+    global _max_bytes, _enabled
+    _enabled = enabled
+    if max_bytes is not None:
+        _max_bytes = max_bytes
+
+
+def get_cache():
+    """Retourne le cache des conversions (dans le dossier d'état courant), ou None s'il est désactivé."""
+    if not _enabled:
+        return None
+    return ConversionCache(max_bytes=_max_bytes)
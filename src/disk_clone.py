@@ -0,0 +1,144 @@
+"""
+Clonage rapide de fichiers disque.
+
+`clone_file` essaie d'abord un reflink (ioctl FICLONE, btrfs/XFS) qui partage
+les blocs sans rien copier. Sinon, seules les zones de données sont copiées
+(SEEK_DATA/SEEK_HOLE) avec `os.copy_file_range`, puis `os.sendfile`, puis
+lecture/écriture classique : les trous du fichier source restent des trous.
+"""
+import collections
+import errno
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# _IOW(0x94, 9, int) : partage des extents d'un fichier vers un autre (Linux).
+FICLONE = 0x40049409
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# Erreurs indiquant que la méthode n'est pas disponible ici (FS, noyau, périphériques différents...).
+_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF, errno.EPERM}
+
+CloneResult = collections.namedtuple("CloneResult", ["method", "bytes_copied", "size"])
+
+
+def _reflink(src_fd, dst_fd):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError as e:
+        if e.errno in _UNSUPPORTED:
+            return False
+        raise
+
+
+def data_extents(fd, size):
+    """
+    Liste les zones de données (offset, longueur) d'un fichier creux.
+
+    Sans support de SEEK_DATA/SEEK_HOLE, le fichier entier est une seule zone.
+    """
+    if not hasattr(os, "SEEK_DATA"):
+        return [(0, size)] if size else []
+
+    extents = []
+    offset = 0
+    try:
+        while offset < size:
+            try:
+                start = os.lseek(fd, offset, os.SEEK_DATA)
+            except OSError as e:
+                if e.errno == errno.ENXIO:  # plus de données jusqu'à la fin
+                    break
+                raise
+            end = os.lseek(fd, start, os.SEEK_HOLE)
+            extents.append((start, end - start))
+            offset = end
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED:
+            raise
+        return [(0, size)] if size else []
+    return extents
+
+
+def _copy_file_range(src_fd, dst_fd, offset, length):
+    copied = 0
+    while copied < length:
+        count = os.copy_file_range(src_fd, dst_fd, min(CHUNK_SIZE, length - copied), offset + copied, offset + copied)
+        if count == 0:
+            break
+        copied += count
+    return copied
+
+
+def _sendfile(src_fd, dst_fd, offset, length):
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    copied = 0
+    while copied < length:
+        count = os.sendfile(dst_fd, src_fd, offset + copied, min(CHUNK_SIZE, length - copied))
+        if count == 0:
+            break
+        copied += count
+    return copied
+
+
+def _read_write(src_fd, dst_fd, offset, length):
+    copied = 0
+    while copied < length:
+        chunk = os.pread(src_fd, min(CHUNK_SIZE, length - copied), offset + copied)
+        if not chunk:
+            break
+        os.pwrite(dst_fd, chunk, offset + copied)
+        copied += len(chunk)
+    return copied
+
+
+_COPY_METHODS = [
+    ("copy_file_range", _copy_file_range, hasattr(os, "copy_file_range")),
+    ("sendfile", _sendfile, hasattr(os, "sendfile")),
+    ("read-write", _read_write, True),
+]
+
+
+def clone_file(source, target):
+    """
+    Clone `source` vers `target` par la méthode la plus rapide disponible.
+
+    Retourne un `CloneResult(method, bytes_copied, size)` : `method` vaut
+    "reflink", "copy_file_range", "sendfile" ou "read-write", et
+    `bytes_copied` le volume réellement copié (0 pour un reflink, seulement
+    les zones de données pour un fichier creux).
+    """
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        src_fd, dst_fd = src.fileno(), dst.fileno()
+        size = os.fstat(src_fd).st_size
+
+        if _reflink(src_fd, dst_fd):
+            result = CloneResult("reflink", 0, size)
+        else:
+            extents = data_extents(src_fd, size)
+            methods = [(name, func) for name, func, available in _COPY_METHODS if available]
+            copied = 0
+            for offset, length in extents:
+                while True:
+                    _, func = methods[0]
+                    try:
+                        copied += func(src_fd, dst_fd, offset, length)
+                        break
+                    except OSError as e:
+                        if e.errno not in _UNSUPPORTED or len(methods) == 1:
+                            raise
+                        # Méthode indisponible : on passe à la suivante pour toute la suite.
+                        methods.pop(0)
+            # Les trous de fin de fichier sont recréés par la taille finale.
+            os.ftruncate(dst_fd, size)
+            result = CloneResult(methods[0][0], copied, size)
+
+    logging.info(f"🧬 Clone {source} → {target} : {result.method}, {result.bytes_copied} octets copiés sur {result.size}.")
+    return result
@@ -0,0 +1,202 @@
+"""
+Profils de création des disques QCOW2 et micro-benchmark de stockage.
+
+Un profil regroupe les options de `qemu-img create -o` :
+
+  - cluster_size   : taille d'un cluster (64 Kio par défaut) ; de grands
+                     clusters réduisent les métadonnées mais allouent plus gros
+  - preallocation  : off, metadata, falloc ou full
+  - lazy_refcounts : différer la mise à jour des compteurs de références
+                     (moins d'écritures de métadonnées ; `qemu-img check -r all`
+                     nécessaire après un arrêt brutal)
+  - extended_l2    : 32 sous-clusters par cluster, pour allouer finement avec
+                     de grands clusters (QEMU >= 5.2)
+
+et la taille du cache des tables L2 passée au lancement de QEMU
+(`l2_cache_size`) : "auto" couvre tout le disque virtuel, si bien qu'aucune
+lecture aléatoire ne relit une table L2 sur le disque.
+
+Sans profil, `qemu-img` garde ses valeurs par défaut (comportement historique).
+"""
+import os
+import shutil
+import struct
+import tempfile
+import time
+
+from colorama import Fore, Style
+
+import executor
+from disk_cache import parse_size
+
+DEFAULT_DISK_SIZE = "10G"
+DEFAULT_CLUSTER_SIZE = 64 * 1024
+PREALLOCATION_MODES = ("off", "metadata", "falloc", "full")
+BENCH_WRITE_SIZE = 64 * 1024 ** 2
+
+PROFILES = {
+    "default": {},
+    "thin": {"preallocation": "off", "lazy_refcounts": True, "l2_cache_size": "auto"},
+    "metadata": {"preallocation": "metadata", "lazy_refcounts": True, "l2_cache_size": "auto"},
+    "performance": {
+        "cluster_size": "128K", "extended_l2": True, "preallocation": "falloc", "lazy_refcounts": True,
+        "l2_cache_size": "auto",
+    },
+    "full": {"cluster_size": "2M", "preallocation": "full", "l2_cache_size": "auto"},
+}
+
+
+def _cluster_bytes(value):
+    size = parse_size(value)
+    if size < 512 or size > 2 * 1024 ** 2 or size & (size - 1):
+        raise ValueError(f"cluster_size invalide : {value} (puissance de 2 entre 512 et 2M)")
+    return size
+
+
+def get_profile(profile=None):
+    """
+    Retourne les options d'un profil de disque (nom d'un profil prédéfini ou
+    dictionnaire d'options), ou None sans profil. Lève ValueError si invalide.
+    """
+    if profile is None:
+        return None
+    if isinstance(profile, str):
+        if profile not in PROFILES:
+            raise ValueError(f"Profil de disque inconnu : {profile} ({', '.join(PROFILES)})")
+        profile = PROFILES[profile]
+
+    unknown = set(profile) - {"cluster_size", "preallocation", "lazy_refcounts", "extended_l2", "l2_cache_size"}
+    if unknown:
+        raise ValueError(f"Options de disque inconnues : {', '.join(sorted(unknown))}")
+    if profile.get("preallocation", "off") not in PREALLOCATION_MODES:
+        raise ValueError(f"preallocation invalide : {profile['preallocation']} ({', '.join(PREALLOCATION_MODES)})")
+    cluster_size = _cluster_bytes(profile.get("cluster_size", DEFAULT_CLUSTER_SIZE))
+    if profile.get("extended_l2") and cluster_size < 16 * 1024:
+        raise ValueError("extended_l2 demande des clusters d'au moins 16K")
+    if profile.get("l2_cache_size", "auto") != "auto":
+        parse_size(profile["l2_cache_size"])
+    return dict(profile)
+
+
+def qemu_img_options(profile=None):
+    """Arguments `-o ...` de `qemu-img create` pour un profil ([] sans option)."""
+    options = get_profile(profile) or {}
+    rendered = []
+    if "cluster_size" in options:
+        rendered.append(f"cluster_size={_cluster_bytes(options['cluster_size'])}")
+    if "preallocation" in options:
+        rendered.append(f"preallocation={options['preallocation']}")
+    for flag in ("lazy_refcounts", "extended_l2"):
+        if flag in options:
+            rendered.append(f"{flag}={'on' if options[flag] else 'off'}")
+    return ["-o", ",".join(rendered)] if rendered else []
+
+
+def read_qcow2_geometry(path):
+    """Retourne (taille virtuelle, taille de cluster) lues dans l'en-tête QCOW2, ou None."""
+    try:
+        with open(path, "rb") as file:
+            header = file.read(32)
+    except OSError:
+        return None
+    if len(header) < 32 or header[:4] != b"QFI\xfb":
+        return None
+    cluster_bits, size = struct.unpack(">IQ", header[20:32])
+    return size, 1 << cluster_bits
+
+
+def l2_cache_size(profile, disk_path=None, disk_size=DEFAULT_DISK_SIZE):
+    """
+    Taille du cache L2 (octets) à donner à QEMU pour un disque, ou None sans réglage.
+
+    En "auto", le cache couvre tout le disque virtuel : une entrée L2 (8 octets,
+    16 avec extended_l2) par cluster. La géométrie est lue dans l'en-tête du
+    disque s'il existe, sinon déduite du profil et de `disk_size`.
+    """
+    options = get_profile(profile)
+    if not options or "l2_cache_size" not in options:
+        return None
+    if options["l2_cache_size"] != "auto":
+        return parse_size(options["l2_cache_size"])
+
+    geometry = read_qcow2_geometry(disk_path) if disk_path else None
+    size, cluster_size = geometry or (
+        parse_size(disk_size), _cluster_bytes(options.get("cluster_size", DEFAULT_CLUSTER_SIZE))
+    )
+    entry_size = 16 if options.get("extended_l2") else 8
+    needed = -(-size // cluster_size) * entry_size
+    # QEMU arrondit le cache à un nombre entier de clusters (une table L2 = un cluster)
+    return max(cluster_size, -(-needed // cluster_size) * cluster_size)
+
+
+def drive_options(profile, disk_path=None):
+    """Options à ajouter au `-drive` QEMU du disque (",l2-cache-size=..." ou "")."""
+    cache = l2_cache_size(profile, disk_path)
+    return f",l2-cache-size={cache}" if cache else ""
+
+
+def _allocated(path):
+    stat = os.stat(path)
+    return stat.st_size, getattr(stat, "st_blocks", 0) * 512
+
+
+def _human(size):
+    for unit in ("o", "Kio", "Mio", "Gio"):
+        if size < 1024 or unit == "Gio":
+            return f"{size:.0f} {unit}" if unit == "o" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def benchmark_profiles(profiles=None, size="1G", runs=3, directory="."):
+    """
+    Crée des images de test avec chaque profil et mesure le coût de création et l'allocation du fichier.
+
+    Si `qemu-io` est disponible, on mesure aussi l'écriture de 64 Mio au début de
+    l'image et la place occupée ensuite. Les images sont créées dans `directory`
+    (le stockage à évaluer) puis supprimées.
+    Retourne {profil: {"create": [durées], "apparent", "allocated", "write", "allocated_after_write"}}.
+    """
+    from utils import create_qcow2_disk
+
+    profiles = list(profiles or PROFILES)
+    for name in profiles:
+        get_profile(name)
+    write_size = min(BENCH_WRITE_SIZE, parse_size(size))
+    qemu_io = shutil.which("qemu-io")
+    workdir = tempfile.mkdtemp(prefix=".bench-disk-", dir=directory)
+    results = {}
+    try:
+        for name in profiles:
+            result = results[name] = {"create": [], "apparent": None, "allocated": None,
+                                      "write": None, "allocated_after_write": None}
+            for run in range(runs):
+                base = os.path.join(workdir, f"{name}-{run}")
+                start = time.perf_counter()
+                disk = create_qcow2_disk(base, size, profile=name)
+                result["create"].append(time.perf_counter() - start)
+                if not disk:
+                    break
+                result["apparent"], result["allocated"] = _allocated(disk)
+                if qemu_io and run == 0:
+                    start = time.perf_counter()
+                    executor.run([qemu_io, "-f", "qcow2", "-c", f"write 0 {write_size}", disk],
+                                 check=True, capture_output=True)
+                    result["write"] = time.perf_counter() - start
+                    result["allocated_after_write"] = _allocated(disk)[1]
+                os.remove(disk)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n⏱️ Création d'images QCOW2 de {size} ({runs} passage(s)) :")
+    for name, result in results.items():
+        timings = result["create"]
+        if not timings or result["allocated"] is None:
+            print(f"  {Fore.RED}{name:12s} échec de la création{Style.RESET_ALL}")
+            continue
+        line = (f"  {name:12s} moyenne {sum(timings) / len(timings):7.3f} s  min {min(timings):7.3f} s  "
+                f"fichier {_human(result['apparent']):>10s}  alloué {_human(result['allocated']):>10s}")
+        if result["write"] is not None:
+            line += (f"  écriture {_human(write_size)} {result['write']:6.3f} s"
+                     f" -> alloué {_human(result['allocated_after_write'])}")
+        print(line)
+    return results
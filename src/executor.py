@@ -0,0 +1,229 @@
+"""
+Exécuteur centralisé des commandes externes.
+
+Toutes les commandes (VBoxManage, vmrun, qemu-img, docker, ip...) passent par
+`run()`, qui délègue à `subprocess.run` et ajoute une entrée au journal
+(argv, durée, code retour, taille des sorties). Le journal est un fichier
+JSON Lines en ajout seul, exploitable avec `summarize()` ou rejoué avec
+`enable_replay()` pour des tests de performance hors ligne.
+"""
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from settings import state_path
+
+JOURNAL_FILE = "journal.jsonl"
+
+_lock = threading.Lock()
+_journal_path = None
+_replay = None
+_replay_speed = 0.0
+
+
+_REPLAY_ERRORS = {
+    "FileNotFoundError": FileNotFoundError,
+    "PermissionError": PermissionError,
+}
+
+
+class ReplayMissError(LookupError):
+    """Levée quand une commande n'a pas d'enregistrement dans le journal rejoué."""
+
+
+def configure(journal_path=None):
+    """Définit le fichier journal (par défaut : <dossier d'état>/journal.jsonl)."""
+    global _journal_path
+    _journal_path = journal_path
+
+
+def journal_path():
+    """Retourne le chemin du journal actif."""
+    return _journal_path or state_path(JOURNAL_FILE)
+
+
+def _output_size(output):
+    if isinstance(output, (str, bytes)):
+        return len(output)
+    return 0
+
+
+def _serialize_output(output):
+    if isinstance(output, bytes):
+        return {"data": output.decode("latin-1"), "binary": True}
+    if isinstance(output, str):
+        return {"data": output, "binary": False}
+    return None
+
+
+def record(cmd, duration, returncode=None, stdout=None, stderr=None, error=None):
+    """Ajoute une entrée au journal des commandes."""
+    entry = {
+        "ts": time.time(),
+        "argv": [str(arg) for arg in cmd],
+        "duration": round(duration, 6),
+        "returncode": returncode if isinstance(returncode, int) else None,
+        "stdout_bytes": _output_size(stdout),
+        "stderr_bytes": _output_size(stderr),
+        "stdout": _serialize_output(stdout),
+        "stderr": _serialize_output(stderr),
+    }
+    if error:
+        entry["error"] = error
+
+    line = json.dumps(entry, ensure_ascii=False)
+    with _lock:
+        try:
+            with open(journal_path(), "a", encoding="utf-8") as journal:
+                journal.write(line + "\n")
+        except OSError as e:
+            logging.warning(f"⚠️ Impossible d'écrire dans le journal des commandes : {e}")
+
+
+def run(cmd, **kwargs):
+    """
+    Exécute une commande externe via `subprocess.run` et l'enregistre dans le journal.
+
+    Les arguments nommés sont transmis tels quels à `subprocess.run`.
+    En mode rejeu, la sortie enregistrée est renvoyée sans exécuter la commande.
+    """
+    if _replay is not None:
+        return _replay_run(cmd, kwargs)
+
+    start = time.perf_counter()
+    try:
+        result = subprocess.run(cmd, **kwargs)
+    except subprocess.CalledProcessError as e:
+        record(cmd, time.perf_counter() - start, e.returncode, e.stdout, e.stderr)
+        raise
+    except (OSError, subprocess.TimeoutExpired) as e:
+        record(cmd, time.perf_counter() - start, error=type(e).__name__)
+        raise
+
+    record(cmd, time.perf_counter() - start, result.returncode, result.stdout, result.stderr)
+    return result
+
+
+def read_journal(path=None):
+    """Itère sur les entrées d'un journal."""
+    path = path or journal_path()
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as journal:
+        for line in journal:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def summarize(path=None, top=10):
+    """
+    Résume un journal : commandes les plus lentes et les plus répétées.
+
+    Retourne un dictionnaire avec le nombre total de commandes, la durée cumulée,
+    les `top` exécutions les plus lentes et les `top` commandes les plus fréquentes.
+    """
+    total = 0
+    total_duration = 0.0
+    slowest = []
+    counts = Counter()
+    durations = defaultdict(float)
+
+    for entry in read_journal(path):
+        total += 1
+        total_duration += entry["duration"]
+        key = " ".join(entry["argv"])
+        counts[key] += 1
+        durations[key] += entry["duration"]
+        slowest.append((entry["duration"], key, entry.get("returncode")))
+
+    slowest.sort(key=lambda item: item[0], reverse=True)
+    return {
+        "total": total,
+        "total_duration": total_duration,
+        "slowest": slowest[:top],
+        "most_repeated": [(count, durations[key], key) for key, count in counts.most_common(top)],
+    }
+
+
+def print_summary(path=None, top=10):
+    """Affiche le résumé d'un journal de commandes."""
+    summary = summarize(path, top)
+    print(f"\n📒 {summary['total']} commandes, {summary['total_duration']:.2f} s au total")
+
+    print("\n🐢 Commandes les plus lentes :")
+    for duration, cmd, returncode in summary["slowest"]:
+        print(f"  {duration:8.3f} s  [rc={returncode}]  {cmd}")
+
+    print("\n🔁 Commandes les plus répétées :")
+    for count, duration, cmd in summary["most_repeated"]:
+        print(f"  {count:5d} x  {duration:8.3f} s  {cmd}")
+    return summary
+
+
+def enable_replay(path, speed=0.0):
+    """
+    Active le mode rejeu : les commandes renvoient les sorties enregistrées.
+
+    - path : journal à rejouer
+    - speed : facteur appliqué aux durées enregistrées (0 = instantané, 1 = temps réel)
+    """
+    global _replay, _replay_speed
+    entries = defaultdict(deque)
+    for entry in read_journal(path):
+        entries[tuple(entry["argv"])].append(entry)
+    _replay = entries
+    _replay_speed = speed
+    logging.info(f"⏪ Mode rejeu activé depuis {path}")
+
+
+def disable_replay():
+    """Désactive le mode rejeu."""
+    global _replay
+    _replay = None
+
+
+def replay_enabled():
+    """Indique si le mode rejeu est actif."""
+    return _replay is not None
+
+
+def _deserialize_output(output, kwargs):
+    if output is None:
+        return None
+    wants_text = kwargs.get("text") or kwargs.get("universal_newlines") or kwargs.get("encoding")
+    data = output["data"]
+    if wants_text:
+        return data.encode("latin-1").decode("utf-8", "replace") if output["binary"] else data
+    return data.encode("latin-1") if output["binary"] else data.encode("utf-8")
+
+
+def _replay_run(cmd, kwargs):
+    key = tuple(str(arg) for arg in cmd)
+    recorded = _replay.get(key)
+    if not recorded:
+        raise ReplayMissError(f"Aucun enregistrement pour : {' '.join(key)}")
+
+    # Rotation : les appels répétés reprennent les enregistrements dans l'ordre.
+    entry = recorded.popleft()
+    recorded.append(entry)
+
+    if _replay_speed:
+        time.sleep(entry["duration"] * _replay_speed)
+
+    error = entry.get("error")
+    if error == "TimeoutExpired":
+        raise subprocess.TimeoutExpired(list(key), kwargs.get("timeout"))
+    if error:
+        raise _REPLAY_ERRORS.get(error, OSError)(key[0])
+
+    stdout = _deserialize_output(entry.get("stdout"), kwargs)
+    stderr = _deserialize_output(entry.get("stderr"), kwargs)
+    returncode = entry.get("returncode") or 0
+    if kwargs.get("check") and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, list(key), stdout, stderr)
+    return subprocess.CompletedProcess(list(key), returncode, stdout, stderr)
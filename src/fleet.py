@@ -0,0 +1,462 @@
+"""
+Configuration de flotte : générateurs, profils et inclusions.
+
+En plus des sections historiques (`hypervisors` : une VM par hyperviseur,
+`docker` : un conteneur), un fichier de configuration peut décrire une flotte :
+
+    {
+      "include": ["profiles.json"],
+      "profiles": {
+        "small": {"ram": 1024},
+        "web": {"profile": "small", "cloud_init": {...}}
+      },
+      "fleet": [
+        {"hypervisor": "QEMU", "vm_name": "web-{index:02d}", "count": 50, "start": 1,
+         "profile": "web", "overrides": {"1": {"ram": 4096}, "40-50": {"dry_run": true}}},
+        {"kind": "docker", "container_name": "cache-{index}", "count": 3, "image_name": "redis:7"}
+      ]
+    }
+
+Chaque entrée de `fleet` est un générateur : il est fusionné avec ses profils
+et validé une seule fois, puis déplié paresseusement en `count` spécifications
+individuelles (même format que les travaux du démon). Les fichiers inclus
+apportent leurs profils (ceux du fichier courant sont prioritaires) et leurs
+entrées. Le tableau `fleet` est lu de façon incrémentale : un fichier de
+plusieurs milliers d'entrées n'est jamais chargé entièrement en mémoire.
+"""
+import json
+import os
+import re
+import string
+
+from disk_profiles import PROFILES, get_profile
+
+STREAM_CHUNK = 64 * 1024
+HYPERVISORS = ("VirtualBox", "VMware", "QEMU", "Hyper-V")
+
+# Champs mis en forme avec l'indice de l'entrée ({index}, {hypervisor}, {kind})
+PATTERN_FIELDS = ("vm_name", "container_name", "iso_path", "bridge")
+PATTERN_VARIABLES = {"index", "hypervisor", "kind"}
+
+VM_DEFAULTS = {"vm_name": "MaVM", "arch": "x86_64", "ram": 2048, "iso_path": "isos/ubuntu.iso", "dry_run": False}
+DOCKER_DEFAULTS = {
+    "container_name": "mon-conteneur", "image_name": "ubuntu:latest", "volume_name": "",
+    "ports": {}, "env_vars": {}, "command": "bash",
+}
+
+# Saut d'une valeur sans la décoder : caractères structurants, puis fin d'une chaîne
+_STRUCTURE = re.compile(r'["\[\]{}]')
+_STRING_END = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+
+_NONE = type(None)
+_POSITIVE = (lambda value: value > 0, "doit être strictement positif")
+
+
+def _valid_disk_profile(profile):
+    try:
+        get_profile(profile)
+    except ValueError:
+        return False
+    return True
+
+# Schéma : champ -> (types acceptés, (vérification, message) ou None)
+VM_SCHEMA = {
+    "kind": ((str,), (lambda value: value == "vm", "doit valoir 'vm'")),
+    "hypervisor": ((str,), (lambda value: value in HYPERVISORS, f"doit être l'un de {', '.join(HYPERVISORS)}")),
+    "vm_name": ((str,), None),
+    "arch": ((str,), None),
+    "ram": ((int,), _POSITIVE),
+    "cpus": ((int, _NONE), _POSITIVE),
+    "tuning": ((str, _NONE), None),
+    "disk_profile": ((str, dict, _NONE), (
+        _valid_disk_profile, f"doit être un profil de disque ({', '.join(PROFILES)}) ou des options valides",
+    )),
+    "iso_path": ((str,), None),
+    "dry_run": ((bool,), None),
+    "bridge": ((str, _NONE), None),
+    "template": ((str, _NONE), None),
+    "cloud_init": ((dict, _NONE), None),
+    "ready": ((dict, _NONE), None),
+    "priority": ((int,), None),
+}
+DOCKER_SCHEMA = {
+    "kind": ((str,), (lambda value: value == "docker", "doit valoir 'docker'")),
+    "container_name": ((str,), None),
+    "image_name": ((str,), None),
+    "volume_name": ((str,), None),
+    "ports": ((dict,), None),
+    "env_vars": ((dict,), None),
+    "command": ((str,), None),
+    "ready": ((dict, _NONE), None),
+    "priority": ((int,), None),
+}
+GENERATOR_SCHEMA = {
+    "count": ((int,), (lambda value: value >= 0, "doit être positif ou nul")),
+    "start": ((int,), None),
+    "profile": ((str, list), None),
+    "overrides": ((dict,), None),
+}
+
+
+class FleetConfigError(ValueError):
+    """Configuration de flotte invalide."""
+
+
+def compile_schema(schema, required=()):
+    """
+    Compile un schéma en fonction de validation `validate(values, where)`.
+
+    Les vérifications sont préparées une fois pour toutes ; la validation lève
+    `FleetConfigError` en listant tous les champs invalides.
+    """
+    checks = []
+    for field, (types, rule) in schema.items():
+        # bool est un int pour Python : on le refuse là où un nombre est attendu
+        reject_bool = int in types and bool not in types
+        checks.append((field, types, reject_bool, rule))
+    allowed = frozenset(schema)
+    required = tuple(required)
+
+    def validate(values, where, partial=False):
+        errors = [f"champ inconnu '{field}'" for field in values if field not in allowed]
+        if not partial:
+            errors += [f"champ '{field}' obligatoire" for field in required if field not in values]
+        for field, types, reject_bool, rule in checks:
+            if field not in values:
+                continue
+            value = values[field]
+            if not isinstance(value, types) or (reject_bool and isinstance(value, bool)):
+                names = "/".join("null" if kind is _NONE else kind.__name__ for kind in types)
+                errors.append(f"'{field}' doit être de type {names}")
+            elif rule is not None and value is not None and not rule[0](value):
+                errors.append(f"'{field}' {rule[1]}")
+        if errors:
+            raise FleetConfigError(f"{where} : " + " ; ".join(errors))
+
+    return validate
+
+
+_VALIDATORS = {
+    "vm": compile_schema({**VM_SCHEMA, **GENERATOR_SCHEMA}, required=("hypervisor",)),
+    "docker": compile_schema({**DOCKER_SCHEMA, **GENERATOR_SCHEMA}),
+}
+_OVERRIDE_VALIDATORS = {"vm": compile_schema(VM_SCHEMA), "docker": compile_schema(DOCKER_SCHEMA)}
+_PROFILE_VALIDATOR = compile_schema({**VM_SCHEMA, **DOCKER_SCHEMA, "kind": ((str,), None), **GENERATOR_SCHEMA})
+
+
+class _JsonStream:
+    """Lecture incrémentale d'un document JSON (objet racine, tableaux élément par élément)."""
+
+    def __init__(self, file, chunk_size=None):
+        self.file = file
+        self.chunk_size = chunk_size or STREAM_CHUNK
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Les données déjà décodées sont libérées au passage
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise FleetConfigError(f"JSON invalide : '{char}' attendu, '{found or 'fin du fichier'}' trouvé")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise FleetConfigError(f"JSON invalide : {e.msg}") from e
+            # Un nombre en fin de tampon peut être tronqué : on relit avant de conclure
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def skip(self):
+        """
+        Passe la valeur suivante sans la décoder : seules les chaînes et
+        l'imbrication des tableaux et objets sont suivies (recherche par regex).
+        """
+        if self.peek() not in "[{":
+            self.value()
+            return
+        depth = 0
+        while True:
+            match = _STRUCTURE.search(self.buffer, self.pos)
+            if match and match.group() == '"':
+                end = _STRING_END.match(self.buffer, match.end())
+                if end:
+                    self.pos = end.end()
+                    continue
+                self.pos = match.start()  # chaîne coupée par la fin du tampon
+            elif match:
+                self.pos = match.end()
+                depth += 1 if match.group() in "[{" else -1
+                if depth == 0:
+                    return
+                continue
+            else:
+                self.pos = len(self.buffer)
+            if not self._fill():
+                raise FleetConfigError("JSON invalide : fin du fichier inattendue")
+
+    def _separator(self, closing):
+        found = self.peek()
+        self.pos += 1
+        if found == closing:
+            return False
+        if found != ",":
+            raise FleetConfigError(f"JSON invalide : ',' ou '{closing}' attendu, '{found or 'fin du fichier'}' trouvé")
+        return True
+
+    def keys(self):
+        """Parcourt les clés de l'objet racine ; l'appelant lit chaque valeur (value() ou array())."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if not self._separator("}"):
+                return
+
+    def array(self):
+        """Parcourt un tableau élément par élément."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if not self._separator("]"):
+                return
+
+
+def iter_document(path, fleet=True):
+    """
+    Parcourt un fichier de configuration : (clé, valeur), puis ("fleet", entrée) pour chaque entrée de flotte.
+
+    Avec `fleet=False`, le tableau `fleet` est sauté sans être décodé et donne un seul ("fleet", None).
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        stream = _JsonStream(file)
+        for key in stream.keys():
+            if key == "fleet" and not fleet:
+                stream.skip()
+                yield "fleet", None
+            elif key == "fleet" and stream.peek() == "[":
+                for entry in stream.array():
+                    yield "fleet", entry
+            else:
+                yield key, stream.value()
+
+
+def _parse_overrides(overrides, validate, where):
+    """Prépare les surcharges par indice ({"3": {...}, "10-20": {...}}) : [(début, fin, valeurs, motifs)]."""
+    parsed = []
+    for key, values in overrides.items():
+        try:
+            low, _, high = str(key).partition("-")
+            bounds = (int(low), int(high or low))
+        except ValueError:
+            raise FleetConfigError(f"{where} : indice de surcharge invalide '{key}'") from None
+        if not isinstance(values, dict):
+            raise FleetConfigError(f"{where} : la surcharge '{key}' doit être un objet")
+        validate(values, f"{where}.overrides[{key}]", partial=True)
+        parsed.append((bounds[0], bounds[1], values, _pattern_fields(values, f"{where}.overrides[{key}]")))
+    return parsed
+
+
+def _check_pattern(pattern, field, where):
+    try:
+        names = {name.split(".")[0].split("[")[0] for _, name, _, _ in string.Formatter().parse(pattern) if name is not None}
+    except ValueError as e:
+        raise FleetConfigError(f"{where} : motif '{field}' invalide ({e})") from None
+    unknown = names - PATTERN_VARIABLES - {""}
+    if unknown:
+        raise FleetConfigError(f"{where} : variable(s) inconnue(s) dans '{field}' : {', '.join(sorted(unknown))}")
+    return bool(names)
+
+
+def _pattern_fields(values, where):
+    """Champs à motif présents dans `values` : {champ: contient une variable}."""
+    return {field: isinstance(values[field], str) and _check_pattern(values[field], field, where)
+            for field in PATTERN_FIELDS if field in values}
+
+
+class Fleet:
+    """Flotte décrite par un fichier (lu en flux) ou par un dictionnaire déjà chargé."""
+
+    def __init__(self, path=None, document=None, _parents=()):
+        self.path = os.path.abspath(path) if path else None
+        self.base_dir = os.path.dirname(self.path) if self.path else os.getcwd()
+        if self.path in _parents:
+            raise FleetConfigError(f"Inclusion circulaire de {path}")
+
+        if document is None:
+            # Premier passage : tout sauf les entrées de flotte, sautées sans décodage et lues plus tard à la demande
+            document = dict(iter_document(self.path, fleet=False))
+        self.document = document
+        self.header = {key: value for key, value in document.items() if key != "fleet"}
+
+        self.includes = [
+            Fleet(os.path.join(self.base_dir, include), _parents=_parents + (self.path,))
+            for include in self.header.get("include", [])
+        ]
+        self.raw_profiles = {}
+        for include in self.includes:
+            self.raw_profiles.update(include.raw_profiles)
+        for name, profile in self.header.get("profiles", {}).items():
+            _PROFILE_VALIDATOR(profile, f"profiles[{name}]", partial=True)
+            self.raw_profiles[name] = profile
+        self._profiles = {}
+
+    @classmethod
+    def from_dict(cls, config):
+        """Flotte décrite par un dictionnaire (ex : configuration déjà chargée)."""
+        return cls(document=config)
+
+    # --------------------------------------------------------------- profils
+    def profile(self, name, _resolving=()):
+        """Retourne un profil, fusionné avec ses profils parents (calculé une seule fois)."""
+        if name in self._profiles:
+            return self._profiles[name]
+        if name not in self.raw_profiles:
+            raise FleetConfigError(f"Profil inconnu : {name}")
+        if name in _resolving:
+            raise FleetConfigError(f"Héritage de profils circulaire : {' -> '.join(_resolving + (name,))}")
+        raw = dict(self.raw_profiles[name])
+        merged = self._merge_profiles(raw.pop("profile", None), _resolving + (name,))
+        merged.update(raw)
+        self._profiles[name] = merged
+        return merged
+
+    def _merge_profiles(self, names, _resolving=()):
+        merged = {}
+        for name in ([names] if isinstance(names, str) else names or []):
+            merged.update(self.profile(name, _resolving))
+        return merged
+
+    # --------------------------------------------------------------- entrées
+    def entries(self):
+        """Parcourt les générateurs : fichiers inclus, sections historiques, puis tableau `fleet`."""
+        for include in self.includes:
+            yield from include.entries()
+        for hypervisor, values in self.header.get("hypervisors", {}).items():
+            yield {"kind": "vm", "hypervisor": hypervisor, **values}
+        if self.header.get("docker"):
+            yield {"kind": "docker", **self.header["docker"]}
+        if self.path:
+            for key, entry in iter_document(self.path):
+                if key == "fleet":
+                    yield entry
+        else:
+            yield from self.document.get("fleet", [])
+
+    def _generator(self, entry, where):
+        """Fusionne une entrée avec ses profils, la valide et prépare son dépliage (une seule fois)."""
+        if not isinstance(entry, dict):
+            raise FleetConfigError(f"{where} : une entrée doit être un objet")
+        base = self._merge_profiles(entry.get("profile"))
+        base.update(entry)
+        base.pop("profile", None)
+        kind = base.setdefault("kind", "vm")
+        validate = _VALIDATORS.get(kind)
+        if validate is None:
+            raise FleetConfigError(f"{where} : type '{kind}' inconnu (vm ou docker)")
+        validate(base, where)
+
+        count = base.pop("count", 1)
+        start = base.pop("start", 1 if count > 1 else 0)
+        overrides = _parse_overrides(base.pop("overrides", {}), _OVERRIDE_VALIDATORS[kind], where)
+        base = {**(VM_DEFAULTS if kind == "vm" else DOCKER_DEFAULTS), **base}
+
+        name_field = "vm_name" if kind == "vm" else "container_name"
+        patterns = _pattern_fields(base, where)
+        if count > 1 and not patterns.get(name_field):
+            raise FleetConfigError(f"{where} : '{name_field}' doit contenir {{index}} quand count > 1")
+        return base, range(start, start + count), overrides, patterns
+
+    def specs(self):
+        """
+        Déplie paresseusement la flotte en spécifications individuelles.
+
+        Chaque spécification a le format d'un travail du démon
+        ({"kind": "vm", "hypervisor", "vm_name", "ram", ...} ou {"kind": "docker", ...}).
+        """
+        seen = set()
+        for position, entry in enumerate(self.entries()):
+            where = f"fleet[{position}]"
+            base, indices, overrides, patterns = self._generator(entry, where)
+            for index in indices:
+                spec = dict(base)
+                fields = dict(patterns)
+                for low, high, values, overridden in overrides:
+                    if low <= index <= high:
+                        spec.update(values)
+                        fields.update(overridden)
+                variables = {"index": index, "hypervisor": spec.get("hypervisor", ""), "kind": spec["kind"]}
+                for field, is_pattern in fields.items():
+                    if not is_pattern:
+                        continue
+                    try:
+                        spec[field] = spec[field].format(**variables)
+                    except (KeyError, IndexError, ValueError) as e:
+                        raise FleetConfigError(f"{where} : motif '{field}' invalide pour l'indice {index} ({e!r})") from None
+
+                name = spec["vm_name"] if spec["kind"] == "vm" else spec["container_name"]
+                key = (spec["kind"], spec.get("hypervisor"), name)
+                if key in seen:
+                    raise FleetConfigError(f"{where} : '{name}' est déjà défini")
+                seen.add(key)
+                yield spec
+
+
+def load_fleet(path):
+    """Ouvre un fichier de flotte ; une configuration absente donne une flotte vide."""
+    if not os.path.exists(path):
+        return Fleet.from_dict({})
+    return Fleet(path)
+
+
+def load_jobs(path):
+    """
+    Travaux d'un fichier soumis au démon : liste de travaux, {"jobs": [...]},
+    travail seul, ou fichier de configuration ou de flotte (déplié en flux, les
+    inclusions étant relatives au fichier).
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        if _JsonStream(file).peek() != "{":
+            file.seek(0)
+            return json.load(file)
+    fleet = Fleet(path)
+    if "jobs" in fleet.header:
+        return fleet.header["jobs"]
+    if {"fleet", "hypervisors", "docker", "include"} & fleet.document.keys():
+        return fleet.specs()
+    return [fleet.header]
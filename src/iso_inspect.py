@@ -0,0 +1,264 @@
+"""
+Inspection rapide d'une ISO d'installation (ISO9660 + El Torito).
+
+Seuls les descripteurs de volume (à partir du secteur 16) et le catalogue de
+démarrage El Torito sont projetés en mémoire (mmap) : l'image n'est jamais lue
+en entier, quelle que soit sa taille. On en tire le label du volume, la
+distribution, sa version et l'architecture, qui servent à choisir le `guestOS`
+VMware, le `--ostype` VirtualBox et les périphériques QEMU.
+
+Les résultats sont mis en cache par empreinte (SHA-256) des secteurs lus ;
+l'empreinte elle-même est mémorisée par (chemin, inode, taille, mtime), si bien
+qu'une ISO inchangée n'est même plus ouverte.
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+from collections import namedtuple
+
+from settings import state_path
+
+SECTOR = 2048
+DESCRIPTORS_SECTOR = 16
+MAX_DESCRIPTORS = 16  # PVD, boot record, Joliet, UDF... puis le terminateur
+EL_TORITO = b"EL TORITO SPECIFICATION"
+
+# Identifiants de plateforme du catalogue El Torito
+PLATFORMS = {0x00: "bios", 0x01: "ppc", 0x02: "mac", 0xEF: "efi"}
+
+# (motif du label, distribution) ; le premier motif reconnu l'emporte
+DISTROS = [
+    (r"debian", "debian"),
+    (r"ubuntu", "ubuntu"),
+    (r"rocky", "rocky"),
+    (r"alma", "alma"),
+    (r"centos", "centos"),
+    (r"rhel|red ?hat", "rhel"),
+    (r"fedora", "fedora"),
+    (r"opensuse|suse|\bsle\b", "opensuse"),
+    (r"freebsd", "freebsd"),
+    (r"cccoma|win(?:dows)?[-_ ]?\d", "windows"),
+]
+
+ARCHITECTURES = [
+    (r"amd64|x86[-_]64|x64", "x86_64"),
+    (r"aarch64|arm64", "aarch64"),
+    (r"i[3-6]86", "i386"),
+]
+
+IsoInfo = namedtuple("IsoInfo", "label system publisher application distro release arch bootable platforms")
+
+_lock = threading.Lock()
+
+
+def _cache_path():
+    return state_path("iso_inspect.json")
+
+
+def _load_cache():
+    path = _cache_path()
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"⚠️ Cache d'inspection des ISO illisible : {e}")
+    return {"files": {}, "digests": {}}
+
+
+def _save_cache(cache):
+    path = _cache_path()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(cache, file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_sectors(fileno, file_size, sector, count):
+    """
+    Projette `count` secteurs à partir de `sector` et retourne leurs octets.
+
+    L'offset d'un mmap doit être aligné sur la granularité d'allocation : on
+    projette depuis la frontière précédente et on ne copie que la zone utile.
+    """
+    start = sector * SECTOR
+    if start >= file_size:
+        return b""
+    end = min(start + count * SECTOR, file_size)
+    offset = start - start % mmap.ALLOCATIONGRANULARITY
+    with mmap.mmap(fileno, end - offset, access=mmap.ACCESS_READ, offset=offset) as mapped:
+        return mapped[start - offset:end - offset]
+
+
+def read_boot_sectors(path):
+    """
+    Retourne (descripteurs de volume, catalogue El Torito) d'une ISO.
+
+    Lève ValueError si le fichier n'est pas une image ISO9660.
+    """
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        descriptors = _read_sectors(file.fileno(), size, DESCRIPTORS_SECTOR, MAX_DESCRIPTORS)
+        if descriptors[1:6] != b"CD001":
+            raise ValueError(f"{path} n'est pas une image ISO9660")
+
+        catalog = b""
+        for index in range(0, len(descriptors) - SECTOR + 1, SECTOR):
+            kind = descriptors[index]
+            if descriptors[index + 1:index + 6] != b"CD001" or kind == 255:
+                break
+            if kind == 0 and descriptors[index + 7:index + 7 + len(EL_TORITO)] == EL_TORITO:
+                catalog_sector = int.from_bytes(descriptors[index + 71:index + 75], "little")
+                catalog = _read_sectors(file.fileno(), size, catalog_sector, 1)
+        return descriptors, catalog
+
+
+def _field(descriptor, start, end):
+    return descriptor[start:end].decode("ascii", "replace").strip(" \x00")
+
+
+def parse_platforms(catalog):
+    """Plateformes de démarrage déclarées par le catalogue El Torito (ordre du catalogue)."""
+    if len(catalog) < 64 or catalog[0] != 0x01 or catalog[30:32] != b"\x55\xaa":
+        return []
+    platforms = [PLATFORMS.get(catalog[1], hex(catalog[1]))]
+    position = 64
+    while position + 32 <= len(catalog) and catalog[position] in (0x90, 0x91):
+        platform = PLATFORMS.get(catalog[position + 1], hex(catalog[position + 1]))
+        if platform not in platforms:
+            platforms.append(platform)
+        entries = int.from_bytes(catalog[position + 2:position + 4], "little")
+        final = catalog[position] == 0x91
+        position += 32 * (entries + 1)
+        if final:
+            break
+    return platforms
+
+
+def normalize_arch(text):
+    """Nom canonique de l'architecture citée dans un texte (`amd64` -> `x86_64`, `arm64` -> `aarch64`), ou None."""
+    text = (text or "").lower()
+    return next((name for pattern, name in ARCHITECTURES if re.search(pattern, text)), None)
+
+
+def identify(text):
+    """Retourne (distribution, version, architecture) déduits d'un label ou d'un nom de fichier."""
+    text = text.lower()
+    arch = normalize_arch(text)
+    # Les numéros d'architecture (x86_64, i386...) ne sont pas des versions
+    for pattern, _ in ARCHITECTURES:
+        text = re.sub(pattern, " ", text)
+
+    for pattern, distro in DISTROS:
+        match = re.search(pattern, text)
+        if match:
+            break
+    else:
+        return None, None, arch
+
+    release = None
+    if distro != "windows":
+        number = re.search(r"\d+(?:[._-]\d+)*", text[match.end():])
+        if number:
+            release = re.sub(r"[_-]", ".", number.group())
+    return distro, release, arch
+
+
+def parse_descriptors(descriptors, catalog=b""):
+    """Extrait les informations d'une ISO depuis ses secteurs de descripteurs et son catalogue."""
+    pvd = descriptors[:SECTOR]
+    label = _field(pvd, 40, 72)
+    volume_set = _field(pvd, 190, 318)
+    publisher = _field(pvd, 318, 446)
+    application = _field(pvd, 574, 702)
+
+    distro, release, arch = identify(label)
+    if distro is None:
+        distro, release, arch_hint = identify(f"{volume_set} {publisher} {application}")
+        arch = arch or arch_hint
+
+    platforms = parse_platforms(catalog)
+    if arch is None and "bios" in platforms:
+        arch = "x86_64"
+    return IsoInfo(
+        label=label, system=_field(pvd, 8, 40), publisher=publisher, application=application,
+        distro=distro, release=release, arch=arch, bootable=bool(platforms), platforms=platforms,
+    )
+
+
+def inspect_iso(path):
+    """
+    Inspecte une ISO et retourne un `IsoInfo`, ou None si ce n'est pas une image ISO9660 lisible.
+
+    Aucune lecture n'a lieu si l'ISO est inchangée depuis sa dernière inspection.
+    """
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    signature = f"{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+    key = os.path.abspath(path)
+
+    with _lock:
+        cache = _load_cache()
+    known = cache["files"].get(key)
+    if known and known["signature"] == signature and known["sha256"] in cache["digests"]:
+        return IsoInfo(**cache["digests"][known["sha256"]])
+
+    try:
+        descriptors, catalog = read_boot_sectors(path)
+    except (OSError, ValueError) as e:
+        logging.info(f"ℹ️ Inspection de l'ISO impossible : {e}")
+        return None
+    digest = hashlib.sha256(descriptors + catalog).hexdigest()
+
+    with _lock:
+        cache = _load_cache()
+        if digest in cache["digests"]:
+            info = IsoInfo(**cache["digests"][digest])
+        else:
+            info = parse_descriptors(descriptors, catalog)
+            cache["digests"][digest] = info._asdict()
+        cache["files"][key] = {"signature": signature, "sha256": digest}
+        _save_cache(cache)
+    return info
+
+
+def arch_mismatch(info, target):
+    """
+    Indique si l'ISO vise une autre architecture que `target` (celle émulée par
+    QEMU ou celle de l'hôte). Une ISO i386 démarre sur x86_64 ; une architecture
+    inconnue n'est jamais signalée.
+    """
+    if info is None or info.arch is None or target is None:
+        return False
+    return info.arch != target and (info.arch, target) != ("i386", "x86_64")
+
+
+def os_hint(info):
+    """
+    Nom court du système (`debian-12.9.0`, `rocky-9.3`...) reconnu par les motifs
+    de `vmx.guess_guest_os` et `vbox.guess_ostype`, ou None si inconnu.
+    """
+    if info is None or info.distro is None:
+        return None
+    return f"{info.distro}-{info.release}" if info.release else info.distro
+
+
+def qemu_devices(info):
+    """
+    Périphériques QEMU adaptés au système invité : {"disk": interface, "nic": modèle}.
+
+    Les systèmes libres embarquent les pilotes virtio dès l'installation ;
+    l'installateur Windows ne les a pas et reste sur IDE et e1000. Retourne None
+    pour un système inconnu (périphériques par défaut de QEMU).
+    """
+    if info is None or info.distro is None:
+        return None
+    if info.distro == "windows":
+        return {"disk": "ide", "nic": "e1000"}
+    return {"disk": "virtio", "nic": "virtio-net-pci"}
@@ -0,0 +1,340 @@
+"""
+Supervision des VMs QEMU et des conteneurs lancés par l'outil.
+
+Les machines suivies sont celles que l'outil a lancées :
+  - VMs QEMU : fichier PID écrit par QEMU (`-pidfile .vm_create/pids/<vm>.pid`)
+  - conteneurs : marqueur `.vm_create/pids/<conteneur>.container`, dont le PID
+    principal est résolu via `docker inspect`
+
+À intervalle fixe, l'échantillonneur relève le temps CPU, la mémoire résidente,
+les octets lus/écrits sur disque et les compteurs de l'interface TAP (QEMU).
+Pour un conteneur, les compteurs viennent de son cgroup v2 (tous ses processus)
+si possible, sinon de son processus principal. Les échantillons sont gardés
+dans un tampon circulaire de taille fixe par machine et exportés au format texte de
+Prometheus (fichier et/ou point d'entrée HTTP `/metrics`), avec le coût CPU de
+l'échantillonneur lui-même.
+"""
+import collections
+import glob
+import http.server
+import logging
+import os
+import subprocess
+import threading
+import time
+
+import psutil
+from colorama import Fore, Style
+
+import executor
+from settings import state_path
+
+DEFAULT_INTERVAL = 5.0
+DEFAULT_CAPACITY = 720  # une heure d'historique à 5 s
+REDISCOVER_EVERY = 12  # `docker inspect` n'est relancé qu'une fois toutes les N mesures
+CGROUP_ROOT = "/sys/fs/cgroup"
+METRIC_PREFIX = "vm_create"
+
+Sample = collections.namedtuple(
+    "Sample", ["ts", "name", "kind", "pid", "cpu_seconds", "rss_bytes", "read_bytes", "write_bytes",
+               "net_rx_bytes", "net_tx_bytes"]
+)
+
+_METRICS = [
+    ("cpu_seconds_total", "counter", "Temps CPU consommé (utilisateur + système).", "cpu_seconds"),
+    ("memory_rss_bytes", "gauge", "Mémoire résidente.", "rss_bytes"),
+    ("disk_read_bytes_total", "counter", "Octets lus sur disque.", "read_bytes"),
+    ("disk_write_bytes_total", "counter", "Octets écrits sur disque.", "write_bytes"),
+    ("net_receive_bytes_total", "counter", "Octets reçus sur l'interface TAP.", "net_rx_bytes"),
+    ("net_transmit_bytes_total", "counter", "Octets émis sur l'interface TAP.", "net_tx_bytes"),
+]
+
+
+def _label(value):
+    """Échappe une valeur d'étiquette Prometheus (antislash, guillemet, retour à la ligne)."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def pid_file(name):
+    """Chemin du fichier PID d'une VM QEMU (passé à `-pidfile`)."""
+    return state_path("pids", f"{name}.pid")
+
+
+def track_container(name):
+    """Marque un conteneur comme lancé par l'outil pour qu'il soit supervisé."""
+    open(state_path("pids", f"{name}.container"), "w").close()
+
+
+def tap_interface(cmdline):
+    """Nom de l'interface TAP d'une ligne de commande QEMU (`ifname=`), ou None."""
+    for arg in cmdline:
+        for option in arg.split(","):
+            if option.startswith("ifname="):
+                return option.split("=", 1)[1]
+    return None
+
+
+def qemu_processes(pids_dir=None):
+    """
+    VMs QEMU lancées par l'outil et toujours en cours d'exécution : {nom: (pid, ligne de commande)}.
+
+    Un fichier PID dont le processus n'existe plus, ou dont le PID a été réutilisé
+    par un autre programme, est ignoré.
+    """
+    processes = {}
+    for path in glob.glob(os.path.join(pids_dir or os.path.dirname(pid_file("_")), "*.pid")):
+        name = os.path.basename(path)[:-len(".pid")]
+        try:
+            with open(path, "r") as file:
+                pid = int(file.read().strip())
+            cmdline = psutil.Process(pid).cmdline()
+        except (OSError, ValueError, psutil.Error):
+            continue
+        if cmdline and "qemu" in os.path.basename(cmdline[0]):
+            processes[name] = (pid, cmdline)
+    return processes
+
+
+def _cgroup_dir(pid):
+    """Dossier cgroup v2 d'un processus, ou None (cgroup v1, /proc indisponible...)."""
+    try:
+        with open(f"/proc/{pid}/cgroup", "r") as file:
+            for line in file:
+                if line.startswith("0::"):
+                    path = os.path.join(CGROUP_ROOT, line.strip()[3:].lstrip("/"))
+                    return path if os.path.isfile(os.path.join(path, "cpu.stat")) else None
+    except OSError:
+        pass
+    return None
+
+
+def read_cgroup(path):
+    """Lit CPU, mémoire et E/S d'un cgroup v2 : (cpu_seconds, rss_bytes, read_bytes, write_bytes)."""
+    cpu_seconds = 0.0
+    with open(os.path.join(path, "cpu.stat"), "r") as file:
+        for line in file:
+            key, value = line.split()
+            if key == "usage_usec":
+                cpu_seconds = int(value) / 1e6
+                break
+    with open(os.path.join(path, "memory.current"), "r") as file:
+        rss_bytes = int(file.read())
+    read_bytes = write_bytes = 0
+    try:
+        with open(os.path.join(path, "io.stat"), "r") as file:
+            for line in file:
+                for field in line.split()[1:]:
+                    key, _, value = field.partition("=")
+                    if key == "rbytes":
+                        read_bytes += int(value)
+                    elif key == "wbytes":
+                        write_bytes += int(value)
+    except OSError:
+        pass  # contrôleur io non délégué
+    return cpu_seconds, rss_bytes, read_bytes, write_bytes
+
+
+class ResourceMonitor:
+    """Échantillonneur à intervalle fixe, historique en tampon circulaire par machine."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, capacity=DEFAULT_CAPACITY, pids_dir=None):
+        self.interval = interval
+        self.capacity = capacity
+        self.samples = {}  # {nom: deque(maxlen=capacity)}
+        self.pids_dir = pids_dir or os.path.dirname(pid_file("_"))
+        self.targets = {}
+        self._processes = {}  # objets psutil réutilisés d'une mesure à l'autre
+        self._ticks = 0
+        self._lock = threading.Lock()
+        self.self_cpu_seconds = 0.0
+        self.last_duration = 0.0
+        self._started = time.monotonic()
+
+    # ------------------------------------------------------------ découverte
+    def discover(self):
+        """Recense les VMs QEMU et conteneurs suivis : {nom: {"kind", "pid", "tap", "cgroup"}}."""
+        targets = {}
+        for name, (pid, cmdline) in qemu_processes(self.pids_dir).items():
+            targets[name] = {"kind": "qemu", "pid": pid, "tap": tap_interface(cmdline), "cgroup": None}
+
+        for path in glob.glob(os.path.join(self.pids_dir, "*.container")):
+            name = os.path.basename(path)[:-len(".container")]
+            known = self.targets.get(name)
+            if known and psutil.pid_exists(known["pid"]):
+                targets[name] = known
+                continue
+            try:
+                result = executor.run(["docker", "inspect", "--format", "{{.State.Pid}}", name],
+                                      capture_output=True, text=True)
+                pid = int(result.stdout.strip() or 0) if result.returncode == 0 else 0
+            except (OSError, ValueError, subprocess.SubprocessError) as e:
+                logging.warning(f"⚠️ Conteneur '{name}' non résolu : {e}")
+                continue
+            if pid > 0:
+                targets[name] = {"kind": "container", "pid": pid, "tap": None, "cgroup": _cgroup_dir(pid)}
+
+        self.targets = targets
+        with self._lock:
+            # L'historique d'une machine disparue est oublié
+            for name in set(self.samples) - set(targets):
+                del self.samples[name]
+        return targets
+
+    # --------------------------------------------------------------- mesures
+    def _process(self, pid):
+        process = self._processes.get(pid)
+        if process is None:
+            process = self._processes[pid] = psutil.Process(pid)
+        return process
+
+    def _measure(self, target):
+        if target["cgroup"]:
+            try:
+                return read_cgroup(target["cgroup"])
+            except (OSError, ValueError):
+                target["cgroup"] = None
+        process = self._process(target["pid"])
+        with process.oneshot():
+            times = process.cpu_times()
+            rss = process.memory_info().rss
+            try:
+                io = process.io_counters()
+                read_bytes, write_bytes = io.read_bytes, io.write_bytes
+            except (AttributeError, psutil.AccessDenied):
+                read_bytes = write_bytes = 0
+        return times.user + times.system, rss, read_bytes, write_bytes
+
+    def sample_once(self):
+        """Relève une mesure de chaque machine suivie et retourne les échantillons ajoutés."""
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        if self._ticks % REDISCOVER_EVERY == 0:
+            self.discover()
+        self._ticks += 1
+
+        taps = {target["tap"] for target in self.targets.values() if target["tap"]}
+        net = psutil.net_io_counters(pernic=True) if taps else {}
+        now = time.time()
+        batch = []
+        for name, target in list(self.targets.items()):
+            try:
+                cpu_seconds, rss, read_bytes, write_bytes = self._measure(target)
+            except psutil.Error:
+                # Machine arrêtée : elle sera oubliée jusqu'à la prochaine découverte
+                self._processes.pop(target["pid"], None)
+                del self.targets[name]
+                continue
+            counters = net.get(target["tap"])
+            batch.append(Sample(
+                now, name, target["kind"], target["pid"], cpu_seconds, rss, read_bytes, write_bytes,
+                counters.bytes_recv if counters else 0, counters.bytes_sent if counters else 0,
+            ))
+
+        with self._lock:
+            for sample in batch:
+                ring = self.samples.get(sample.name)
+                if ring is None:
+                    ring = self.samples[sample.name] = collections.deque(maxlen=self.capacity)
+                ring.append(sample)
+            self.self_cpu_seconds += time.process_time() - cpu_start
+            self.last_duration = time.perf_counter() - wall_start
+        return batch
+
+    def latest(self):
+        """Dernier échantillon de chaque machine."""
+        with self._lock:
+            return [self.samples[name][-1] for name in sorted(self.samples)]
+
+    # ---------------------------------------------------------------- export
+    def render_prometheus(self):
+        """Rend les dernières mesures au format texte d'exposition Prometheus."""
+        latest = self.latest()
+        lines = []
+        for metric, kind, help_text, field in _METRICS:
+            full_name = f"{METRIC_PREFIX}_{metric}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for sample in latest:
+                labels = f'name="{_label(sample.name)}",kind="{_label(sample.kind)}"'
+                lines.append(f"{full_name}{{{labels}}} {getattr(sample, field)}")
+
+        uptime = max(time.monotonic() - self._started, 1e-9)
+        lines += [
+            f"# HELP {METRIC_PREFIX}_monitor_cpu_seconds_total Temps CPU consommé par l'échantillonneur.",
+            f"# TYPE {METRIC_PREFIX}_monitor_cpu_seconds_total counter",
+            f"{METRIC_PREFIX}_monitor_cpu_seconds_total {self.self_cpu_seconds:.6f}",
+            f"# HELP {METRIC_PREFIX}_monitor_cpu_ratio Part d'un cœur utilisée par l'échantillonneur.",
+            f"# TYPE {METRIC_PREFIX}_monitor_cpu_ratio gauge",
+            f"{METRIC_PREFIX}_monitor_cpu_ratio {self.self_cpu_seconds / uptime:.6f}",
+            f"# HELP {METRIC_PREFIX}_monitor_sample_duration_seconds Durée de la dernière mesure.",
+            f"# TYPE {METRIC_PREFIX}_monitor_sample_duration_seconds gauge",
+            f"{METRIC_PREFIX}_monitor_sample_duration_seconds {self.last_duration:.6f}",
+            f"# HELP {METRIC_PREFIX}_monitor_targets Machines suivies.",
+            f"# TYPE {METRIC_PREFIX}_monitor_targets gauge",
+            f"{METRIC_PREFIX}_monitor_targets {len(latest)}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        """Écrit l'export Prometheus de façon atomique (compatible textfile collector)."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Démarre le point d'entrée HTTP `/metrics` dans un thread et retourne le serveur."""
+        monitor = self
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = monitor.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug(format % args)
+
+        server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def run(self, duration=None, output=None, stop_event=None):
+        """
+        Échantillonne à intervalle fixe (sans dérive) jusqu'à `duration` secondes
+        ou jusqu'à `stop_event`, en réécrivant `output` après chaque mesure.
+        """
+        stop_event = stop_event or threading.Event()
+        deadline = time.monotonic() + duration if duration else None
+        next_tick = time.monotonic()
+        while not stop_event.is_set():
+            self.sample_once()
+            if output:
+                self.write_file(output)
+            next_tick += self.interval
+            if deadline and next_tick > deadline:
+                break
+            stop_event.wait(max(0.0, next_tick - time.monotonic()))
+
+
+def run_monitor(interval=DEFAULT_INTERVAL, capacity=DEFAULT_CAPACITY, port=None, output=None, duration=None):
+    """Lance la supervision (Ctrl+C pour arrêter)."""
+    monitor = ResourceMonitor(interval, capacity)
+    server = monitor.serve(port) if port else None
+    print(f"{Fore.CYAN}📈 Supervision des machines lancées par l'outil toutes les {interval:g} s"
+          f"{f' — http://127.0.0.1:{port}/metrics' if port else ''}{f' — {output}' if output else ''}{Style.RESET_ALL}")
+    try:
+        monitor.run(duration, output)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server:
+            server.shutdown()
+    print(f"⏹️ Supervision arrêtée (coût CPU de l'échantillonneur : {monitor.self_cpu_seconds:.3f} s).")
+    return monitor
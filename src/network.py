@@ -3,6 +3,9 @@ import subprocess
 import logging
 import psutil
 
+import executor
+from artifacts import register
+
 def detect_bridgeable_interface():
     os_type = platform.system()
     
@@ -15,7 +18,7 @@ def detect_bridgeable_interface():
 
     elif os_type == "Windows" or "microsoft" in platform.release().lower() or "WSL" in platform.platform():
         try:
-            result = subprocess.run(
+            result = executor.run(
                 [
                     "powershell.exe",
                     "-Command",
@@ -35,7 +38,7 @@ def detect_bridgeable_interface():
 
     elif os_type == "Darwin":
         try:
-            result = subprocess.run(["networksetup", "-listallhardwareports"], capture_output=True, text=True)
+            result = executor.run(["networksetup", "-listallhardwareports"], capture_output=True, text=True)
             blocks = result.stdout.split("Hardware Port:")
             for block in blocks[1:]:
                 if "Device" in block and "Wi-Fi" in block:
@@ -51,14 +54,15 @@ def detect_bridgeable_interface():
 
 def create_tap_interface(tap_name="tap0", bridge_name="br0"):
     try:
-        result = subprocess.run(["ip", "link", "show", tap_name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        result = executor.run(["ip", "link", "show", tap_name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         if result.returncode == 0:
             print(f"⚠️ L'interface {tap_name} existe déjà, utilisation directe.")
             return tap_name
 
-        subprocess.run(["sudo", "ip", "tuntap", "add", "dev", tap_name, "mode", "tap"], check=True)
-        subprocess.run(["sudo", "ip", "link", "set", tap_name, "up"], check=True)
-        subprocess.run(["sudo", "ip", "link", "set", tap_name, "master", bridge_name], check=True)
+        executor.run(["sudo", "ip", "tuntap", "add", "dev", tap_name, "mode", "tap"], check=True)
+        executor.run(["sudo", "ip", "link", "set", tap_name, "up"], check=True)
+        executor.run(["sudo", "ip", "link", "set", tap_name, "master", bridge_name], check=True)
+        register("tap", tap_name)
         return tap_name
 
     except subprocess.CalledProcessError as e:
@@ -6,6 +6,8 @@ import socket
 import subprocess
 from colorama import Fore, Style
 
+import executor
+
 
 
 def detect_os():
@@ -58,7 +60,7 @@ def check_command_exists(command):
 def run_command(command):
     """Exécute une commande et retourne True si elle réussit."""
     try:
-        subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        executor.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
         return True
     except subprocess.CalledProcessError:
         return False
@@ -147,7 +149,7 @@ def is_docker_installed():
         return False  # Docker n'est pas installé
 
     try:
-        subprocess.run(["docker", "info"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        executor.run(["docker", "info"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
         return True  # Docker fonctionne
     except subprocess.CalledProcessError:
         return False  # Docker installé mais service non actif
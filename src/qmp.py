@@ -0,0 +1,375 @@
+"""
+Démarrage rapide de VMs QEMU depuis un état sauvegardé (QMP).
+
+Une VM QEMU lancée par l'outil expose son moniteur QMP sur un socket Unix.
+La capture (`save_state`) :
+
+  1. met la VM en pause (`stop`)
+  2. fige son disque : la VM continue sur un nouvel overlay QCOW2
+     (`blockdev-snapshot-sync`), le disque d'origine ne change plus
+  3. écrit l'état complet (mémoire, périphériques) dans un fichier
+     (`migrate` vers une URI `file:`, QEMU >= 8.2)
+  4. relance la VM (`cont`), ou l'arrête (`quit`)
+
+Une nouvelle instance (`launch_from_state`) démarre sur un overlay en copie sur
+écriture du disque figé, avec la ligne de commande QEMU de la VM d'origine et
+`-incoming` : elle reprend là où la capture a été faite, sans redémarrer le
+système invité.
+"""
+import json
+import logging
+import os
+import socket
+import subprocess
+import time
+
+import psutil
+from colorama import Fore, Style
+
+import executor
+from checkpoint import StepJournal
+from artifacts import register_file
+from monitor import pid_file, tap_interface
+from network import create_tap_interface
+from readiness import qga_socket_path
+from settings import state_path
+from utils import create_overlay_disk
+
+DEFAULT_TIMEOUT = 120
+POLL_INTERVAL = 0.1
+STATES_DIR = "vmstates"
+
+
+class QMPError(RuntimeError):
+    """Erreur renvoyée par QEMU ou dialogue QMP impossible."""
+
+
+def qmp_socket_path(name):
+    """Chemin du socket QMP d'une VM QEMU (passé à `-qmp`)."""
+    return state_path("qmp", f"{name}.sock")
+
+
+class QMPClient:
+    """Client QMP minimal (JSON ligne à ligne sur un socket Unix)."""
+
+    def __init__(self, path, timeout=DEFAULT_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.events = []
+        self._socket = None
+        self._file = None
+
+    def connect(self):
+        """Se connecte, lit la bannière et négocie les capacités."""
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(self.timeout)
+        try:
+            self._socket.connect(self.path)
+        except OSError as e:
+            self.close()
+            raise QMPError(f"Connexion QMP impossible ({self.path}) : {e}") from e
+        self._file = self._socket.makefile("rwb")
+        if "QMP" not in self._read():
+            raise QMPError(f"Bannière QMP attendue sur {self.path}")
+        self.execute("qmp_capabilities")
+        return self
+
+    def close(self):
+        for handle in (self._file, self._socket):
+            if handle is not None:
+                handle.close()
+        self._file = self._socket = None
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read(self):
+        try:
+            line = self._file.readline()
+        except OSError as e:
+            raise QMPError(f"Lecture QMP impossible : {e}") from e
+        if not line:
+            raise QMPError("Connexion QMP fermée par QEMU")
+        return json.loads(line)
+
+    def execute(self, command, **arguments):
+        """Exécute une commande QMP et retourne son résultat ; les événements reçus entre-temps sont conservés."""
+        message = {"execute": command}
+        if arguments:
+            message["arguments"] = arguments
+        self._file.write(json.dumps(message).encode() + b"\n")
+        self._file.flush()
+        while True:
+            response = self._read()
+            if "event" in response:
+                self.events.append(response)
+            elif "error" in response:
+                raise QMPError(f"{command} : {response['error'].get('desc', response['error'])}")
+            elif "return" in response:
+                return response["return"]
+
+    def wait_migration(self, timeout=DEFAULT_TIMEOUT):
+        """Attend la fin d'une migration et retourne les statistiques de `query-migrate`."""
+        deadline = time.monotonic() + timeout
+        while True:
+            info = self.execute("query-migrate")
+            status = info.get("status")
+            if status == "completed":
+                return info
+            if status in ("failed", "cancelled"):
+                raise QMPError(f"Migration {status} : {info.get('error-desc', '')}".strip())
+            if time.monotonic() > deadline:
+                self.execute("migrate_cancel")
+                raise QMPError(f"Migration non terminée après {timeout} s")
+            time.sleep(POLL_INTERVAL)
+
+    def wait_status(self, pending=("inmigrate",), timeout=DEFAULT_TIMEOUT):
+        """Attend que la VM quitte les états `pending` et retourne son état."""
+        deadline = time.monotonic() + timeout
+        while True:
+            status = self.execute("query-status").get("status")
+            if status not in pending:
+                return status
+            if time.monotonic() > deadline:
+                raise QMPError(f"VM toujours dans l'état '{status}' après {timeout} s")
+            time.sleep(POLL_INTERVAL)
+
+
+# ---------------------------------------------------------------- états sauvegardés
+def _manifest_path(snapshot):
+    return state_path(STATES_DIR, f"{snapshot}.json")
+
+
+def list_states():
+    """Retourne les états sauvegardés {nom: manifeste}."""
+    directory = os.path.dirname(_manifest_path("_"))
+    states = {}
+    for entry in sorted(os.listdir(directory)):
+        if entry.endswith(".json"):
+            with open(os.path.join(directory, entry), "r") as file:
+                states[entry[:-5]] = json.load(file)
+    return states
+
+
+def get_state(snapshot):
+    """Retourne le manifeste d'un état sauvegardé ou lève KeyError."""
+    path = _manifest_path(snapshot)
+    if not os.path.exists(path):
+        raise KeyError(f"État sauvegardé inconnu : {snapshot}")
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def read_cmdline(name):
+    """Retourne (ligne de commande, dossier courant) du processus QEMU d'une VM, via son fichier PID."""
+    try:
+        with open(pid_file(name), "r") as file:
+            process = psutil.Process(int(file.read().strip()))
+        return process.cmdline(), process.cwd()
+    except (OSError, ValueError, psutil.Error) as e:
+        raise QMPError(f"VM QEMU '{name}' introuvable : {e}") from e
+
+
+def find_disk(cmdline):
+    """Disque principal d'une ligne de commande QEMU (`-hda` ou premier `-drive file=` hors CD)."""
+    for index, arg in enumerate(cmdline[:-1]):
+        value = cmdline[index + 1]
+        if arg == "-hda":
+            return value
+        if arg == "-drive" and "media=cdrom" not in value:
+            for option in value.split(","):
+                if option.startswith("file="):
+                    return option[len("file="):]
+    raise QMPError("Aucun disque trouvé dans la ligne de commande QEMU")
+
+
+def _block_device(qmp, paths):
+    """
+    Retourne (périphérique, image active) du disque dont la chaîne d'images
+    contient l'un des `paths` : après une capture, la VM écrit dans un overlay
+    dont le disque de la ligne de commande n'est plus que la base.
+    """
+    for device in qmp.execute("query-block"):
+        inserted = device.get("inserted") or {}
+        chain, image = [inserted.get("file")], inserted.get("image")
+        while image:
+            chain.append(image.get("filename"))
+            image = image.get("backing-image")
+        if any(path in chain for path in paths):
+            return device["device"], inserted["file"]
+    raise QMPError(f"Périphérique du disque {paths[0]} introuvable (query-block)")
+
+
+def _overlay_path(base, snapshot):
+    """Nouvel overlay de la VM capturée (`<disque>-<état>-run.qcow2`), sans écraser un overlay existant."""
+    stem = f"{os.path.splitext(base)[0]}-{snapshot}-run"
+    overlay, index = f"{stem}.qcow2", 1
+    while os.path.exists(overlay):
+        index += 1
+        overlay = f"{stem}{index}.qcow2"
+    return overlay
+
+
+def save_state(name, snapshot=None, keep_running=True, timeout=DEFAULT_TIMEOUT):
+    """
+    Capture l'état complet d'une VM QEMU en cours d'exécution.
+
+    - snapshot : nom de l'état sauvegardé (par défaut celui de la VM)
+    - keep_running : la VM reprend sur un nouvel overlay après la capture ;
+      sinon elle est arrêtée et son disque sert directement de base
+
+    Le disque figé et le fichier d'état appartiennent ensuite à l'état
+    sauvegardé : le rollback de la VM d'origine et le gc les conservent.
+    Retourne le manifeste de l'état (fichier d'état, disque de base, ligne de commande).
+    """
+    snapshot = snapshot or name
+    cmdline, cwd = read_cmdline(name)
+    disk = find_disk(cmdline)
+    # Les VMs récentes sont lancées avec des chemins absolus (QEMU démonisé tourne dans `/`)
+    base = os.path.join(cwd, disk)
+    if not os.path.exists(base):
+        raise QMPError(f"Disque de '{name}' introuvable : {base} (chemin relatif à un dossier inconnu ?)")
+    state_file = os.path.abspath(state_path(STATES_DIR, f"{snapshot}.state"))
+    overlay = _overlay_path(base, snapshot)
+
+    start = time.perf_counter()
+    with QMPClient(qmp_socket_path(name), timeout) as qmp:
+        qmp.execute("stop")
+        try:
+            # Image où la VM écrit : le disque d'origine, ou l'overlay d'une capture précédente
+            device, active = _block_device(qmp, (disk, base))
+            frozen = os.path.join(cwd, active)
+            if keep_running:
+                qmp.execute("blockdev-snapshot-sync", device=device,
+                            **{"snapshot-file": overlay, "format": "qcow2"})
+            qmp.execute("migrate", uri=f"file:{state_file}")
+            qmp.wait_migration(timeout)
+        except QMPError:
+            qmp.execute("cont")
+            raise
+        qmp.execute("cont" if keep_running else "quit")
+    elapsed = time.perf_counter() - start
+
+    if keep_running:
+        register_file(overlay, "QEMU", name)
+    StepJournal("QEMU", name).replace_artifact(frozen, overlay if keep_running else None)
+    for path in (frozen, state_file):
+        register_file(path, "QEMU", f"vmstate:{snapshot}")
+    manifest = {
+        "source": name,
+        "state": state_file,
+        "disk": disk,
+        "device": device,
+        "base": frozen,
+        "cmdline": cmdline,
+        "cwd": cwd,
+        "size": os.path.getsize(state_file) if os.path.exists(state_file) else None,
+        "seconds": round(elapsed, 3),
+        "ts": time.time(),
+    }
+    with open(_manifest_path(snapshot), "w") as file:
+        json.dump(manifest, file, indent=2)
+    print(f"{Fore.GREEN}✅ État de '{name}' sauvegardé ({snapshot}) en {elapsed:.2f} s.{Style.RESET_ALL}")
+    return manifest
+
+
+def _rewrite(arg, renames):
+    """Remplace dans un argument QEMU les chemins propres à la VM d'origine (valeurs entières uniquement)."""
+    if arg in renames:
+        return renames[arg]
+    options = []
+    for option in arg.split(","):
+        key, sep, value = option.rpartition("=")
+        scheme = "unix:" if value.startswith("unix:") else ""
+        if value[len(scheme):] in renames:
+            option = f"{key}{sep}{scheme}{renames[value[len(scheme):]]}"
+        options.append(option)
+    return ",".join(options)
+
+
+def build_restore_command(manifest, name, overlay, tap=None):
+    """
+    Ligne de commande d'une nouvelle instance démarrant depuis l'état `manifest`.
+
+    Le matériel est celui de la VM d'origine (condition d'une migration) ; seuls
+    le disque, les sockets, le fichier PID et l'interface TAP changent.
+    """
+    source = manifest["source"]
+    renames = {
+        manifest["disk"]: overlay,
+        qga_socket_path(source): qga_socket_path(name),
+        qmp_socket_path(source): qmp_socket_path(name),
+        pid_file(source): pid_file(name),
+    }
+    old_tap = tap_interface(manifest["cmdline"])
+    if old_tap and tap:
+        renames[old_tap] = tap
+
+    cmdline = list(manifest["cmdline"])
+    cmd = []
+    skip = False
+    for index, arg in enumerate(cmdline):
+        if skip:
+            skip = False
+            continue
+        if arg == "-incoming":
+            skip = True
+            continue
+        if index > 0 and cmdline[index - 1] == "-cdrom" and not os.path.isabs(arg):
+            arg = os.path.join(manifest["cwd"], arg)
+        cmd.append(_rewrite(arg, renames))
+    if "-daemonize" not in cmd:
+        cmd.append("-daemonize")
+    return cmd + ["-incoming", f"file:{manifest['state']}"]
+
+
+def _launch(cmd):
+    print(f"{Fore.BLUE}🖥️ Exécution : {' '.join(cmd)}{Style.RESET_ALL}")
+    executor.run(cmd, check=True)
+    return True
+
+
+def launch_from_state(snapshot, name, timeout=DEFAULT_TIMEOUT):
+    """
+    Démarre une nouvelle VM QEMU depuis un état sauvegardé, sur un overlay du disque figé.
+
+    Retourne le nom de la VM une fois qu'elle tourne, ou None en cas d'échec.
+    """
+    try:
+        manifest = get_state(snapshot)
+    except KeyError as e:
+        print(f"{Fore.RED}❌ {e.args[0]}{Style.RESET_ALL}")
+        return None
+
+    if os.path.exists(f"{name}.qcow2"):
+        print(f"{Fore.RED}❌ Impossible de démarrer '{name}' : le disque '{name}.qcow2' existe déjà.{Style.RESET_ALL}")
+        return None
+
+    start = time.perf_counter()
+    journal = StepJournal("QEMU", name)
+    journal.reset()
+    try:
+        overlay = journal.run("disk", create_overlay_disk, manifest["base"], name, artifact=True)
+        if overlay is None:
+            return None
+        tap = create_tap_interface() if tap_interface(manifest["cmdline"]) else None
+        cmd = build_restore_command(manifest, name, os.path.abspath(overlay), tap)
+        journal.run("cmd-00", _launch, cmd, fingerprint=cmd)
+
+        # L'état a été capturé VM en pause : la nouvelle instance attend `cont`.
+        with QMPClient(qmp_socket_path(name), timeout) as qmp:
+            status = qmp.wait_status(timeout=timeout)
+            if status != "running":
+                qmp.execute("cont")
+    except (OSError, QMPError, subprocess.CalledProcessError) as e:
+        logging.error(f"❌ Démarrage de '{name}' depuis '{snapshot}' impossible : {e}")
+        print(f"{Fore.RED}❌ Démarrage de '{name}' depuis '{snapshot}' impossible : {e}{Style.RESET_ALL}")
+        return None
+
+    journal.finish()
+    elapsed = time.perf_counter() - start
+    print(f"{Fore.GREEN}✅ VM '{name}' démarrée depuis '{snapshot}' en {elapsed:.2f} s.{Style.RESET_ALL}")
+    return name
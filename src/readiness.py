@@ -0,0 +1,183 @@
+"""
+Attente de disponibilité des machines et mesure du temps de mise à disposition.
+
+Une fois la commande de lancement terminée, la machine n'est pas forcément
+utilisable. Ce module sonde en parallèle (une seule boucle asyncio) autant de
+machines que nécessaire, avec un délai exponentiel entre deux essais :
+
+  - "tcp"    : un port TCP accepte les connexions
+  - "ssh"    : le serveur SSH envoie sa bannière
+  - "docker" : état de santé Docker "healthy" (ou "running" sans healthcheck)
+  - "qga"    : l'agent invité QEMU répond sur son socket Unix
+
+Le temps entre le lancement et la disponibilité est enregistré pour chaque
+machine, et les percentiles de la flotte sont affichés.
+"""
+import asyncio
+import collections
+import json
+import math
+import time
+
+from colorama import Fore, Style
+
+from async_engine import AsyncExecutor
+from settings import state_path
+
+DEFAULT_TIMEOUT = 300
+INITIAL_DELAY = 0.5
+MAX_DELAY = 10.0
+BACKOFF_FACTOR = 2.0
+PROBE_TIMEOUT = 5.0
+
+# Sonde utilisée sans section "ready" dans la configuration (les autres hyperviseurs n'ont pas de sonde implicite).
+DEFAULT_PROBES = {"QEMU": "qga", "docker": "docker"}
+
+ReadyResult = collections.namedtuple("ReadyResult", ["name", "probe", "ready", "seconds", "attempts", "error"])
+
+
+def qga_socket_path(name):
+    """Chemin du socket de l'agent invité QEMU pour une VM."""
+    return state_path("qga", f"{name}.sock")
+
+
+async def probe_tcp(host, port, timeout=PROBE_TIMEOUT):
+    """Retourne True si le port TCP accepte une connexion."""
+    _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    writer.close()
+    await writer.wait_closed()
+    return True
+
+
+async def probe_ssh(host, port=22, timeout=PROBE_TIMEOUT):
+    """Retourne True si le serveur envoie une bannière SSH."""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        banner = await asyncio.wait_for(reader.readline(), timeout)
+    finally:
+        writer.close()
+    return banner.startswith(b"SSH-")
+
+
+async def probe_docker(container, engine, timeout=PROBE_TIMEOUT):
+    """Retourne True si le conteneur est "healthy" (ou "running" s'il n'a pas de healthcheck)."""
+    template = "{{if .State.Health}}{{.State.Health.Status}}{{else}}{{.State.Status}}{{end}}"
+    result = await asyncio.wait_for(
+        engine.run(["docker", "inspect", "--format", template, container], resources=["docker"]), timeout
+    )
+    return result.returncode == 0 and result.stdout.strip() in ("healthy", "running")
+
+
+async def probe_qga(socket_path, timeout=PROBE_TIMEOUT):
+    """Retourne True si l'agent invité QEMU répond à `guest-sync`."""
+    reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(socket_path), timeout)
+    try:
+        token = int(time.monotonic() * 1000) % 2 ** 31
+        writer.write(json.dumps({"execute": "guest-sync", "arguments": {"id": token}}).encode() + b"\n")
+        await writer.drain()
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if not line:
+                return False
+            try:
+                response = json.loads(line)
+            except ValueError:
+                continue
+            if response.get("return") == token:
+                return True
+    finally:
+        writer.close()
+
+
+def build_target(name, kind, spec=None):
+    """
+    Construit la cible de sonde d'une machine qui vient d'être lancée.
+
+    `kind` est l'hyperviseur ou "docker" ; `spec` la section "ready" de la
+    configuration ({"probe", "host", "port", "timeout"}). Retourne None si
+    aucune sonde n'est possible (ex : VirtualBox sans port SSH configuré).
+    """
+    target = dict(spec or {})
+    target.setdefault("probe", DEFAULT_PROBES.get(kind))
+    if target["probe"] is None or (target["probe"] == "tcp" and "port" not in target):
+        return None
+    target.update(name=name, launched_at=time.monotonic())
+    return target
+
+
+def _probe(target, engine):
+    probe = target.get("probe", "tcp")
+    if probe == "tcp":
+        return probe_tcp(target.get("host", "127.0.0.1"), target["port"])
+    if probe == "ssh":
+        return probe_ssh(target.get("host", "127.0.0.1"), target.get("port", 22))
+    if probe == "docker":
+        return probe_docker(target.get("container", target["name"]), engine)
+    if probe == "qga":
+        return probe_qga(target.get("socket") or qga_socket_path(target["name"]))
+    raise ValueError(f"Sonde inconnue : {probe}")
+
+
+async def wait_ready(target, engine=None, timeout=None, initial_delay=INITIAL_DELAY, max_delay=MAX_DELAY,
+                     factor=BACKOFF_FACTOR):
+    """
+    Sonde une machine jusqu'à ce qu'elle soit disponible ou que le délai expire.
+
+    `target` : {"name", "probe", "host", "port", "container", "socket", "launched_at", "timeout"}
+    (`launched_at` en secondes `time.monotonic()`, par défaut maintenant).
+    Retourne un `ReadyResult` ; `seconds` est mesuré depuis le lancement.
+    """
+    engine = engine or AsyncExecutor(on_output=None)
+    launched_at = target.get("launched_at") or time.monotonic()
+    deadline = launched_at + (timeout or target.get("timeout", DEFAULT_TIMEOUT))
+    delay = initial_delay
+    attempts = 0
+    error = None
+
+    while True:
+        attempts += 1
+        try:
+            if await _probe(target, engine):
+                return ReadyResult(target["name"], target.get("probe", "tcp"), True,
+                                   time.monotonic() - launched_at, attempts, None)
+            error = "réponse inattendue"
+        except (OSError, asyncio.TimeoutError, ValueError) as e:
+            error = str(e) or type(e).__name__
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return ReadyResult(target["name"], target.get("probe", "tcp"), False,
+                               time.monotonic() - launched_at, attempts, error)
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * factor, max_delay)
+
+
+async def wait_all(targets, engine=None, **kwargs):
+    """Sonde toutes les machines en parallèle et retourne leurs `ReadyResult`."""
+    engine = engine or AsyncExecutor(on_output=None)
+    return await asyncio.gather(*(wait_ready(target, engine, **kwargs) for target in targets))
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """Percentiles (rang le plus proche) d'une liste de durées."""
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    return {point: ordered[max(0, math.ceil(point / 100 * len(ordered)) - 1)] for point in points}
+
+
+def print_ready_report(results):
+    """Affiche le temps de mise à disposition par machine puis les percentiles de la flotte."""
+    print(f"\n⏱️ Temps de mise à disposition :")
+    for result in results:
+        if result.ready:
+            print(f"  {Fore.GREEN}✔{Style.RESET_ALL} {result.name:24s} {result.seconds:8.2f} s  ({result.probe}, {result.attempts} essais)")
+        else:
+            print(f"  {Fore.RED}✖{Style.RESET_ALL} {result.name:24s} non disponible après {result.seconds:.0f} s ({result.error})")
+
+    ready = [result.seconds for result in results if result.ready]
+    if ready:
+        stats = percentiles(ready)
+        print(f"  {len(ready)}/{len(results)} prêtes — p50 {stats[50]:.2f} s, p90 {stats[90]:.2f} s, "
+              f"p99 {stats[99]:.2f} s, max {max(ready):.2f} s")
+    return percentiles(ready)
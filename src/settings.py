@@ -0,0 +1,17 @@
+import os
+
+# Dossier où l'outil conserve son état (journal, caches, checkpoints...).
+# Peut être redéfini via la variable d'environnement VM_CREATE_HOME.
+DEFAULT_STATE_DIR = ".vm_create"
+
+
+def state_dir():
+    """Retourne le dossier d'état de l'outil."""
+    return os.environ.get("VM_CREATE_HOME", DEFAULT_STATE_DIR)
+
+
+def state_path(*parts):
+    """Construit un chemin dans le dossier d'état et crée le dossier parent si besoin."""
+    path = os.path.join(state_dir(), *parts)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return path
@@ -0,0 +1,166 @@
+"""
+Modèles de VM et clones liés (VirtualBox, VMware).
+
+Une VM préparée est enregistrée comme modèle : un instantané de référence est
+pris, puis les nouvelles VMs sont créées en clones liés de cet instantané
+(`VBoxManage clonevm --options link`, `vmrun clone ... linked`) au lieu de
+repartir d'un disque vide et de l'ISO d'installation.
+"""
+import json
+import logging
+import os
+import subprocess
+import time
+
+from colorama import Fore, Style
+
+import executor
+from settings import state_path
+
+TEMPLATES_FILE = "templates.json"
+DEFAULT_SNAPSHOT = "template-base"
+SUPPORTED_HYPERVISORS = ("VirtualBox", "VMware")
+
+
+def _vmx_path(vm):
+    return vm if vm.endswith(".vmx") else f"{vm}.vmx"
+
+
+def load_templates():
+    """Retourne les modèles enregistrés {nom: {hypervisor, source, snapshot, ...}}."""
+    path = state_path(TEMPLATES_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def _save_templates(templates):
+    path = state_path(TEMPLATES_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(templates, file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def get_template(name):
+    """Retourne un modèle enregistré ou lève KeyError."""
+    templates = load_templates()
+    if name not in templates:
+        raise KeyError(f"Modèle inconnu : {name}")
+    return templates[name]
+
+
+def _snapshot_exists(hypervisor, source, snapshot, paths):
+    if hypervisor == "VirtualBox":
+        result = executor.run([paths["VirtualBox"], "snapshot", source, "list", "--machinereadable"],
+                              capture_output=True, text=True)
+        return f'="{snapshot}"' in (result.stdout or "")
+    result = executor.run([paths["VMware"], "-T", "ws", "listSnapshots", _vmx_path(source)],
+                          capture_output=True, text=True)
+    return snapshot in (result.stdout or "").splitlines()
+
+
+def register_template(hypervisor, source, paths, name=None, snapshot=DEFAULT_SNAPSHOT):
+    """
+    Enregistre une VM préparée comme modèle et prend son instantané de référence.
+
+    - source : nom de la VM (VirtualBox) ou nom/chemin du .vmx (VMware)
+    - name : nom du modèle (par défaut celui de la VM)
+    """
+    if hypervisor not in SUPPORTED_HYPERVISORS:
+        raise ValueError(f"Les modèles ne sont pas supportés pour {hypervisor}")
+    name = name or os.path.splitext(os.path.basename(source))[0]
+
+    if not _snapshot_exists(hypervisor, source, snapshot, paths):
+        print(f"{Fore.CYAN}📸 Instantané '{snapshot}' de '{source}'...{Style.RESET_ALL}")
+        if hypervisor == "VirtualBox":
+            executor.run([paths["VirtualBox"], "snapshot", source, "take", snapshot], check=True)
+        else:
+            executor.run([paths["VMware"], "-T", "ws", "snapshot", _vmx_path(source), snapshot], check=True)
+
+    templates = load_templates()
+    templates[name] = {
+        "hypervisor": hypervisor,
+        "source": _vmx_path(source) if hypervisor == "VMware" else source,
+        "snapshot": snapshot,
+        "ts": time.time(),
+    }
+    _save_templates(templates)
+    print(f"{Fore.GREEN}✅ Modèle '{name}' enregistré ({hypervisor}, instantané '{snapshot}').{Style.RESET_ALL}")
+    return templates[name]
+
+
+def build_clone_commands(hypervisor, template, name, ram, paths, bridge_interface=None):
+    """
+    Construit les commandes de création d'une VM en clone lié d'un modèle.
+
+    Pour VMware, la mémoire et le réseau sont hérités du modèle.
+    """
+    if template["hypervisor"] != hypervisor:
+        raise ValueError(f"Le modèle est un modèle {template['hypervisor']}, pas {hypervisor}")
+
+    if hypervisor == "VirtualBox":
+        vbox_path = paths["VirtualBox"]
+        cmd_vm = [
+            [vbox_path, "clonevm", template["source"], "--snapshot", template["snapshot"],
+             "--options", "link", "--name", name, "--register"],
+            [vbox_path, "modifyvm", name, "--memory", str(ram)],
+        ]
+        if bridge_interface:
+            cmd_vm.append([vbox_path, "modifyvm", name, "--nic1", "bridged", "--bridgeadapter1", bridge_interface])
+        else:
+            cmd_vm.append([vbox_path, "modifyvm", name, "--nic1", "nat"])
+        return cmd_vm
+
+    if hypervisor == "VMware":
+        vmware_path = paths["VMware"]
+        return [
+            [vmware_path, "-T", "ws", "clone", template["source"], f"{name}.vmx", "linked",
+             f"-snapshot={template['snapshot']}", f"-cloneName={name}"],
+            [vmware_path, "-T", "ws", "start", f"{name}.vmx"],
+        ]
+
+    raise ValueError(f"Les clones liés ne sont pas supportés pour {hypervisor}")
+
+
+def benchmark_clone(hypervisor, template_name, paths, iso_path, ram=2048, runs=1):
+    """
+    Compare le temps de création d'une VM depuis zéro et en clone lié.
+
+    Chaque VM de mesure est supprimée (rollback) après chaque passage. Seules
+    les créations réussies sont chronométrées ; les échecs sont comptés à part.
+    Retourne {"scratch": [durées], "clone": [durées], "failed": {"scratch": n, "clone": n}}.
+    """
+    from checkpoint import rollback
+    from vm_manager import create_vm
+
+    timings = {"scratch": [], "clone": [], "failed": {"scratch": 0, "clone": 0}}
+    for run in range(runs):
+        for mode in ("scratch", "clone"):
+            name = f"bench-{mode}-{run}"
+            start = time.perf_counter()
+            try:
+                created = create_vm(hypervisor, name, "x86_64", ram, iso_path, paths,
+                                    template=template_name if mode == "clone" else None)
+            except (OSError, subprocess.CalledProcessError) as e:
+                logging.warning(f"⚠️ Échec de la création de '{name}' : {e}")
+                created = None
+            finally:
+                rollback(hypervisor, name, paths)
+            if created:
+                timings[mode].append(time.perf_counter() - start)
+            else:
+                timings["failed"][mode] += 1
+
+    print(f"\n⏱️ Création sous {hypervisor} ({runs} passage(s)) :")
+    for mode, label in (("scratch", "Depuis zéro"), ("clone", "Clone lié")):
+        values = timings[mode]
+        if values:
+            print(f"  {label:12s} moyenne {sum(values) / len(values):7.2f} s  min {min(values):7.2f} s")
+        if timings["failed"][mode]:
+            print(f"  {Fore.RED}{label:12s} {timings['failed'][mode]} échec(s), non chronométré(s){Style.RESET_ALL}")
+    if timings["scratch"] and timings["clone"]:
+        speedup = (sum(timings["scratch"]) / len(timings["scratch"])) / max(sum(timings["clone"]) / len(timings["clone"]), 1e-9)
+        print(f"  {Fore.GREEN}Gain du clone lié : x{speedup:.1f}{Style.RESET_ALL}")
+    return timings
@@ -7,6 +7,13 @@ from colorama import Fore, Style
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 
+import executor
+from async_engine import AsyncExecutor
+from disk_cache import get_cache
+from disk_profiles import DEFAULT_DISK_SIZE, qemu_img_options
+from artifacts import register
+from monitor import track_container
+
 
 
 
@@ -27,11 +34,11 @@ def detect_linux_bridge():
 def create_linux_bridge(bridge_name="br0", physical_iface=None):
     """Crée un bridge Linux avec l'interface physique donnée."""
     try:
-        subprocess.run(["sudo", "ip", "link", "add", bridge_name, "type", "bridge"], check=True)
-        subprocess.run(["sudo", "ip", "link", "set", bridge_name, "up"], check=True)
+        executor.run(["sudo", "ip", "link", "add", bridge_name, "type", "bridge"], check=True)
+        executor.run(["sudo", "ip", "link", "set", bridge_name, "up"], check=True)
         if physical_iface:
-            subprocess.run(["sudo", "ip", "link", "set", physical_iface, "master", bridge_name], check=True)
-            subprocess.run(["sudo", "ip", "link", "set", physical_iface, "up"], check=True)
+            executor.run(["sudo", "ip", "link", "set", physical_iface, "master", bridge_name], check=True)
+            executor.run(["sudo", "ip", "link", "set", physical_iface, "up"], check=True)
         return True
     except subprocess.CalledProcessError as e:
         print(f"Erreur lors de la création du bridge : {e}")
@@ -113,13 +120,28 @@ def prompt_input(prompt, default=None, required=False, validator=None):
         
         return user_input
 
-def create_qcow2_disk(disk_name, size="10G"):
-    """Crée un disque virtuel QCOW2 avec QEMU."""
+def create_qcow2_disk(disk_name, size=DEFAULT_DISK_SIZE, profile=None):
+    """Crée un disque virtuel QCOW2 avec QEMU, selon un profil de disque optionnel (voir `disk_profiles.py`)."""
     logging.info(f"📦 Création du disque {disk_name}.qcow2 ({size})...")
-    cmd = ["qemu-img", "create", "-f", "qcow2", f"{disk_name}.qcow2", size]
+    cmd = ["qemu-img", "create", "-f", "qcow2"] + qemu_img_options(profile) + [f"{disk_name}.qcow2", size]
+
+    try:
+        executor.run(cmd, check=True)
+        logging.info(f"✅ Disque {disk_name}.qcow2 créé.")
+        return f"{disk_name}.qcow2"
+    except subprocess.CalledProcessError as e:
+        logging.error(f"❌ Erreur lors de la création du disque QCOW2 : {e}")
+        return None
+
+def create_overlay_disk(base_image, disk_name, size=None):
+    """Crée un disque QCOW2 en copie sur écriture au-dessus d'une image de base (ex : image cloud)."""
+    logging.info(f"📦 Création du disque {disk_name}.qcow2 au-dessus de {base_image}...")
+    cmd = ["qemu-img", "create", "-f", "qcow2", "-b", os.path.abspath(base_image), "-F", "qcow2", f"{disk_name}.qcow2"]
+    if size:
+        cmd.append(size)
 
     try:
-        subprocess.run(cmd, check=True)
+        executor.run(cmd, check=True)
         logging.info(f"✅ Disque {disk_name}.qcow2 créé.")
         return f"{disk_name}.qcow2"
     except subprocess.CalledProcessError as e:
@@ -127,18 +149,30 @@ def create_qcow2_disk(disk_name, size="10G"):
         return None
 
 def convert_disk_format(source_disk, target_disk, format):
-    """Convertit un disque QCOW2 dans un autre format (VDI, VMDK, VHD)."""
+    """
+    Convertit un disque QCOW2 dans un autre format (VDI, VMDK, VHD).
+
+    Si ce disque source (même empreinte SHA-256) a déjà été converti dans ce
+    format, le résultat est repris du cache des conversions (voir `disk_cache.py`).
+    """
+    cache = get_cache()
+    if cache and cache.fetch(source_disk, format, target_disk):
+        return target_disk
+
     logging.info(f"🔄 Conversion du disque {source_disk} en {format}...")
     cmd = ["qemu-img", "convert", "-O", format, source_disk, target_disk]
 
     try:
-        subprocess.run(cmd, check=True)
+        executor.run(cmd, check=True)
         logging.info(f"✅ Disque converti en {target_disk}")
-        return target_disk
     except subprocess.CalledProcessError as e:
         logging.error(f"❌ Erreur lors de la conversion du disque : {e}")
         return None
 
+    if cache:
+        cache.store(source_disk, format, target_disk)
+    return target_disk
+
 def list_local_isos():
     """Liste les ISOs disponibles dans le dossier 'isos/'."""
     if not os.path.exists(ISO_FOLDER):
@@ -196,31 +230,31 @@ def vm_exists(hypervisor, name, paths):
         else:
             return False
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = executor.run(cmd, capture_output=True, text=True)
         return name in result.stdout
 
     except subprocess.CalledProcessError:
         return False
 
-def create_docker_container(container_name, image_name, volume_name="", ports=None, env_vars=None, command="bash"):
-    """
-    Crée un conteneur Docker de manière robuste.
-
-    - container_name : Nom du conteneur
-    - image_name : Image Docker à utiliser
-    - volume_name : Nom du volume (optionnel)
-    - ports : Dictionnaire de ports {hôte: conteneur} (ex: {8080: 80})
-    - env_vars : Dictionnaire des variables d'environnement {clé: valeur}
-    - command : Commande à exécuter à l'intérieur du conteneur (ex: "bash")
-
-    """
-
-
-    print(f"{Fore.CYAN}🚀 Création du conteneur Docker '{container_name}'...{Style.RESET_ALL}")
-
-    # 🗑 Supprime le conteneur s'il existe déjà
-    subprocess.run(["docker", "rm", "-f", container_name], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
+def list_vms(hypervisor, paths):
+    """Liste les noms des VMs connues de l'hyperviseur (VirtualBox : enregistrées, VMware : en cours)."""
+    try:
+        if hypervisor == "VirtualBox":
+            result = executor.run([paths["VirtualBox"], "list", "vms"], capture_output=True, text=True)
+            return [line.split('"')[1] for line in result.stdout.splitlines() if line.count('"') >= 2]
+        if hypervisor == "VMware":
+            result = executor.run([paths["VMware"], "-T", "ws", "list"], capture_output=True, text=True)
+            return [
+                os.path.splitext(os.path.basename(line.strip()))[0]
+                for line in result.stdout.splitlines()
+                if line.strip().endswith(".vmx")
+            ]
+    except (OSError, subprocess.CalledProcessError) as e:
+        logging.warning(f"⚠️ Impossible de lister les VMs {hypervisor} : {e}")
+    return []
+
+def build_docker_run_command(container_name, image_name, volume_name="", ports=None, env_vars=None, command="bash"):
+    """Construit la commande `docker run` correspondant aux paramètres du conteneur."""
     # ⚙️ Commande de base
     cmd = ["docker", "run", "-dit", "--name", container_name]
 
@@ -243,11 +277,13 @@ def create_docker_container(container_name, image_name, volume_name="", ports=No
 
     # 🏁 Ajout de la commande personnalisée
     cmd.extend(["sh", "-c", command])
+    return cmd
 
-    # 🏗 Exécution de la commande
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
 
+def _report_docker_result(container_name, result):
     if result.returncode == 0:
+        track_container(container_name)
+        register("container", container_name, id=result.stdout.strip() if isinstance(result.stdout, str) else None)
         print(f"{Fore.GREEN}✅ Conteneur '{container_name}' créé avec succès !{Style.RESET_ALL}")
         print(f"👉 Pour entrer dans le conteneur : {Fore.YELLOW}docker exec -it {container_name} bash{Style.RESET_ALL}")
     else:
@@ -255,11 +291,51 @@ def create_docker_container(container_name, image_name, volume_name="", ports=No
         print(result.stderr)
 
 
+def create_docker_container(container_name, image_name, volume_name="", ports=None, env_vars=None, command="bash"):
+    """
+    Crée un conteneur Docker de manière robuste.
+
+    - container_name : Nom du conteneur
+    - image_name : Image Docker à utiliser
+    - volume_name : Nom du volume (optionnel)
+    - ports : Dictionnaire de ports {hôte: conteneur} (ex: {8080: 80})
+    - env_vars : Dictionnaire des variables d'environnement {clé: valeur}
+    - command : Commande à exécuter à l'intérieur du conteneur (ex: "bash")
+
+    """
+
+
+    print(f"{Fore.CYAN}🚀 Création du conteneur Docker '{container_name}'...{Style.RESET_ALL}")
+
+    # 🗑 Supprime le conteneur s'il existe déjà
+    executor.run(["docker", "rm", "-f", container_name], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    cmd = build_docker_run_command(container_name, image_name, volume_name, ports, env_vars, command)
+
+    # 🏗 Exécution de la commande
+    result = executor.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    _report_docker_result(container_name, result)
+
+
+async def create_docker_container_async(container_name, image_name, volume_name="", ports=None, env_vars=None,
+                                        command="bash", engine=None):
+    """Variante asynchrone de `create_docker_container` (sorties diffusées en direct)."""
+    engine = engine or AsyncExecutor()
+    print(f"{Fore.CYAN}🚀 Création du conteneur Docker '{container_name}'...{Style.RESET_ALL}")
+
+    await engine.run(["docker", "rm", "-f", container_name], resources=["docker"], label=container_name)
+
+    cmd = build_docker_run_command(container_name, image_name, volume_name, ports, env_vars, command)
+    result = await engine.run(cmd, resources=["docker"], label=container_name)
+    _report_docker_result(container_name, result)
+    return result
+
+
 def is_docker_installed():
     """Vérifie si Docker est installé et en cours d'exécution."""
     try:
-        subprocess.run(["docker", "--version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-        subprocess.run(["docker", "info"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        executor.run(["docker", "--version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        executor.run(["docker", "info"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
         return True
     except subprocess.CalledProcessError:
         return False
@@ -0,0 +1,142 @@
+"""
+Commandes VirtualBox de création d'une VM, selon un profil matériel.
+
+  - "compat"      : une seule vCPU, carte réseau et contrôleur par défaut,
+                    comme les commandes historiques de `create_vm`
+  - "performance" : plusieurs vCPU (I/O APIC activé, obligatoire au-delà d'une
+                    vCPU), paravirtualisation KVM, nested paging et grandes
+                    pages, carte réseau `virtio`, cache d'E/S de l'hôte désactivé
+                    sur le contrôleur (pas de double cache hôte/invité)
+
+Le profil "performance" regroupe ses réglages en un seul `modifyvm` : chaque
+appel à VBoxManage coûte un démarrage de processus et un verrou de session.
+"""
+import os
+import re
+
+DEFAULT_PROFILE = "compat"
+DEFAULT_OSTYPE = "Linux_64"
+STORAGE_CONTROLLER = "SATA Controller"
+
+PROFILES = {
+    "compat": {
+        "cpus": 1,
+        "ostype": False,
+        "nic_type": None,
+        "host_io_cache": None,
+        "settings": [],
+    },
+    "performance": {
+        "cpus": 4,
+        "ostype": True,
+        "nic_type": "virtio",
+        "host_io_cache": "off",
+        "settings": [
+            "--paravirtprovider", "kvm",
+            "--hwvirtex", "on",
+            "--nestedpaging", "on",
+            "--largepages", "on",
+        ],
+    },
+}
+
+# (motif du nom de fichier, --ostype VirtualBox) ; le premier motif reconnu l'emporte
+OSTYPE_PATTERNS = [
+    (r"debian", "Debian_64"),
+    (r"ubuntu", "Ubuntu_64"),
+    (r"rhel|rocky|alma|centos", "RedHat_64"),
+    (r"fedora", "Fedora_64"),
+    (r"opensuse|suse", "OpenSUSE_64"),
+    (r"freebsd", "FreeBSD_64"),
+    (r"win(?:dows)?[-_]?11", "Windows11_64"),
+    (r"win(?:dows)?[-_]?10", "Windows10_64"),
+    (r"windows|cccoma", "Windows10_64"),
+]
+
+
+def guess_ostype(image_path):
+    """Déduit le `--ostype` VirtualBox du nom d'une ISO ou d'une image disque."""
+    name = os.path.basename(image_path or "").lower()
+    for pattern, ostype in OSTYPE_PATTERNS:
+        if re.search(pattern, name):
+            return ostype
+    return DEFAULT_OSTYPE
+
+
+def get_profile(name=None):
+    """Retourne un profil VirtualBox ou lève ValueError."""
+    name = name or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Profil VirtualBox inconnu : {name} ({', '.join(PROFILES)})")
+    return PROFILES[name]
+
+
+def build_vbox_commands(vbox_path, name, ram, disk, iso_path, bridge_interface=None, boot_disk=False, profile=None,
+                        cpus=None, ostype=None, image=None):
+    """
+    Construit les commandes VBoxManage de création et de configuration de la VM.
+
+    - disk : disque principal (VDI) ; iso_path : ISO d'installation ou seed cloud-init
+    - cpus : remplace le nombre de vCPU du profil (l'I/O APIC est activé au-delà d'une)
+    - ostype : remplace le type de système déduit du nom de `image` (par défaut l'ISO)
+    """
+    selected = get_profile(profile)
+    cpus = cpus or min(selected["cpus"], os.cpu_count() or selected["cpus"])
+    ioapic = "on" if cpus > 1 else "off"
+
+    createvm = [vbox_path, "createvm", "--name", name]
+    if ostype or selected["ostype"]:
+        createvm += ["--ostype", ostype or guess_ostype(image or iso_path)]
+    createvm.append("--register")
+
+    if selected["settings"]:
+        system = [
+            [vbox_path, "modifyvm", name, "--memory", str(ram), "--ioapic", ioapic, "--apic", "on",
+             "--cpus", str(cpus)] + selected["settings"],
+        ]
+    else:
+        system = [
+            [vbox_path, "modifyvm", name, "--memory", str(ram)],
+            [vbox_path, "modifyvm", name, "--ioapic", ioapic],
+            [vbox_path, "modifyvm", name, "--apic", "on"],
+        ]
+        if cpus > 1:
+            system.append([vbox_path, "modifyvm", name, "--cpus", str(cpus)])
+
+    storagectl = [vbox_path, "storagectl", name, "--name", STORAGE_CONTROLLER, "--add", "sata", "--controller", "IntelAhci"]
+    if selected["host_io_cache"]:
+        storagectl += ["--hostiocache", selected["host_io_cache"]]
+
+    cmd_vm = [createvm] + system + [
+        storagectl,
+        [vbox_path, "storageattach", name, "--storagectl", STORAGE_CONTROLLER, "--port", "0", "--device", "0", "--type", "hdd", "--medium", disk],
+        [vbox_path, "storageattach", name, "--storagectl", STORAGE_CONTROLLER, "--port", "1", "--device", "0", "--type", "dvddrive", "--medium", iso_path],
+        [vbox_path, "modifyvm", name, "--boot1", "disk" if boot_disk else "dvd"],
+        [vbox_path, "modifyvm", name, "--biosbootmenu", "messageandmenu"],
+    ]
+
+    # Configuration réseau : bridgé ou NAT (NAT par défaut)
+    nic_type = ["--nictype1", selected["nic_type"]] if selected["nic_type"] else []
+    if bridge_interface and nic_type:
+        cmd_vm.append([vbox_path, "modifyvm", name, "--nic1", "bridged", "--bridgeadapter1", bridge_interface] + nic_type)
+    elif bridge_interface:
+        cmd_vm.append([vbox_path, "modifyvm", name, "--nic1", "bridged"])
+        cmd_vm.append([vbox_path, "modifyvm", name, "--bridgeadapter1", bridge_interface])
+    else:
+        cmd_vm.append([vbox_path, "modifyvm", name, "--nic1", "nat"] + nic_type)
+    return cmd_vm
+
+
+def build_vbox_reset_commands(vbox_path, name, keep_disks=True):
+    """
+    Commandes supprimant une VM enregistrée par une création précédente, avant de la recréer.
+
+    `unregistervm --delete` supprime aussi les disques attachés : avec `keep_disks`,
+    ils sont d'abord détachés, si bien que seuls les réglages de la VM disparaissent.
+    """
+    detach = [
+        [vbox_path, "storageattach", name, "--storagectl", STORAGE_CONTROLLER, "--port", str(port), "--device", "0",
+         "--medium", "none"]
+        for port in (0, 1)
+    ] if keep_disks else []
+    return detach + [[vbox_path, "unregistervm", name, "--delete"]]
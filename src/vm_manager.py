@@ -1,25 +1,46 @@
+import asyncio
+import functools
 import logging
 import os
-import subprocess
 import json
 import argparse
+import platform
 from colorama import Fore, Style, init
+import executor
+from async_engine import AsyncExecutor, command_resources
 from os_detection import detect_os, find_hypervisors
 from utils import (
     prompt_input, get_available_memory, create_qcow2_disk, convert_disk_format,
-    list_local_isos, download_iso, vm_exists, choose_from_list,
-    is_docker_installed, create_docker_container,detect_linux_bridge, create_linux_bridge
+    list_local_isos, download_iso, vm_exists, choose_from_list, create_overlay_disk,
+    is_docker_installed, detect_linux_bridge, create_linux_bridge,
+    create_docker_container_async
 )
 from network import (detect_bridgeable_interface,create_tap_interface)
+from daemon import DaemonClient, run_daemon
+from checkpoint import StepJournal, rollback
+from artifacts import DEFAULT_MIN_AGE, collect_garbage_async, register_file
+from templates import benchmark_clone, build_clone_commands, get_template, load_templates, register_template
+from cloud_init import create_seed_image
+from iso_inspect import arch_mismatch, inspect_iso, normalize_arch, os_hint, qemu_devices
+from vbox import build_vbox_commands, build_vbox_reset_commands, guess_ostype
+from vmx import build_vmx, guess_guest_os, write_vmx
+from fleet import Fleet, FleetConfigError, load_fleet, load_jobs
+from monitor import pid_file, run_monitor
+from qmp import QMPError, launch_from_state, list_states, qmp_socket_path, save_state
+from readiness import ReadyResult, build_target, print_ready_report, qga_socket_path, wait_ready
+from disk_profiles import benchmark_profiles, drive_options, get_profile
+from disk_cache import ConversionCache, configure_cache, get_cache, parse_size
 
 # Initialisation de Colorama pour Windows
 init(autoreset=True)
 
+# Nombre maximal de créations lancées simultanément en mode batch parallèle (la flotte est dépliée au fil de l'eau)
+MAX_PENDING_LAUNCHES = 64
+
+
 def load_config(file_path="config.json"):
-    if os.path.exists(file_path):
-        with open(file_path, "r") as file:
-            return json.load(file)
-    return {}
+    """Charge les sections de la configuration, hors entrées de flotte (lues à la demande, voir `fleet.py`)."""
+    return load_fleet(file_path).header
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Gestionnaire de VMs et conteneurs Docker.")
@@ -27,140 +48,611 @@ def parse_arguments():
     parser.add_argument("--config", type=str, default="config.json", help="Chemin du fichier de configuration JSON.")
     parser.add_argument("--bridge", type=str, default=None, help="Interface de bridge à utiliser (sinon NAT sera utilisé)")
     parser.add_argument("--auto-bridge", action="store_true", help="Utilise automatiquement une interface bridge sans interaction")
+    parser.add_argument("--parallel", action="store_true", help="En mode batch, crée en parallèle toutes les VMs configurées et le conteneur Docker.")
+    parser.add_argument("--disk-cache-size", type=str, default=None, help="Taille maximale du cache des disques convertis (ex : 20G).")
+    parser.add_argument("--no-disk-cache", action="store_true", help="Désactive le cache des disques convertis.")
+    parser.add_argument("--wait-ready", action="store_true", help="En mode batch, attend que chaque machine soit disponible et affiche les temps de mise à disposition.")
+    parser.add_argument("--journal", type=str, default=None, help="Fichier journal des commandes (défaut : .vm_create/journal.jsonl).")
+    parser.add_argument("--replay", type=str, default=None, help="Rejoue les sorties d'un journal au lieu d'exécuter les commandes.")
+    parser.add_argument("--replay-speed", type=float, default=0.0, help="Facteur appliqué aux durées rejouées (0 = instantané).")
+
+    subparsers = parser.add_subparsers(dest="command")
+    journal_parser = subparsers.add_parser("journal", help="Résumé du journal des commandes.")
+    journal_parser.add_argument("--top", type=int, default=10, help="Nombre de commandes affichées par catégorie.")
+
+    daemon_parser = subparsers.add_parser("daemon", help="Démon de provisionnement (API HTTP sur socket Unix).")
+    daemon_parser.add_argument("--socket", type=str, default=None, help="Chemin du socket (défaut : .vm_create/daemon.sock).")
+    daemon_parser.add_argument("--workers", type=int, default=8, help="Nombre de travaux traités simultanément.")
+    daemon_parser.add_argument("--limit", action="append", default=[], metavar="HYPERVISEUR=N",
+                               help="Limite de concurrence par hyperviseur (ex : VirtualBox=2, docker=8).")
+
+    template_parser = subparsers.add_parser("template", help="Modèles de VM pour les clones liés (VirtualBox, VMware).")
+    template_subparsers = template_parser.add_subparsers(dest="template_action", required=True)
+    register_parser = template_subparsers.add_parser("register", help="Enregistre une VM préparée comme modèle.")
+    register_parser.add_argument("hypervisor", choices=["VirtualBox", "VMware"])
+    register_parser.add_argument("source", help="Nom de la VM (VirtualBox) ou chemin du .vmx (VMware).")
+    register_parser.add_argument("--name", default=None, help="Nom du modèle (défaut : nom de la VM).")
+    register_parser.add_argument("--snapshot", default="template-base", help="Nom de l'instantané de référence.")
+    template_subparsers.add_parser("list", help="Liste les modèles enregistrés.")
+    bench_parser = template_subparsers.add_parser("bench", help="Compare création depuis zéro et clone lié.")
+    bench_parser.add_argument("hypervisor", choices=["VirtualBox", "VMware"])
+    bench_parser.add_argument("template", help="Nom du modèle.")
+    bench_parser.add_argument("--iso", default="isos/ubuntu.iso", help="ISO utilisée pour la création depuis zéro.")
+    bench_parser.add_argument("--ram", type=int, default=2048)
+    bench_parser.add_argument("--runs", type=int, default=1)
+
+    cache_parser = subparsers.add_parser("cache", help="Cache des disques convertis.")
+    cache_parser.add_argument("action", choices=["stats", "clear"])
+
+    rollback_parser = subparsers.add_parser("rollback", help="Annule une création de VM (complète ou partielle).")
+    rollback_parser.add_argument("hypervisor", choices=["VirtualBox", "VMware", "QEMU", "Hyper-V"])
+    rollback_parser.add_argument("vm_name", help="Nom de la VM à annuler.")
+
+    gc_parser = subparsers.add_parser("gc", help="Supprime les disques, .vmx, interfaces TAP et conteneurs orphelins créés par l'outil.")
+    gc_parser.add_argument("--dry-run", action="store_true", help="Liste les orphelins sans rien supprimer.")
+    gc_parser.add_argument("--min-age", type=float, default=DEFAULT_MIN_AGE,
+                           help="Âge minimal (secondes) d'une ressource pour être supprimée (protège les créations en cours).")
+    gc_parser.add_argument("--containers", action="store_true",
+                           help="Supprime aussi les conteneurs arrêtés créés par l'outil.")
+
+    monitor_parser = subparsers.add_parser("monitor", help="Supervise les VMs QEMU et conteneurs lancés (export Prometheus).")
+    monitor_parser.add_argument("--interval", type=float, default=5.0, help="Intervalle entre deux mesures (secondes).")
+    monitor_parser.add_argument("--capacity", type=int, default=720, help="Nombre d'échantillons gardés en mémoire par machine.")
+    monitor_parser.add_argument("--port", type=int, default=None, help="Port HTTP du point d'entrée /metrics.")
+    monitor_parser.add_argument("--output", type=str, default=None, help="Fichier d'export Prometheus réécrit à chaque mesure.")
+    monitor_parser.add_argument("--duration", type=float, default=None, help="Durée de la supervision (défaut : jusqu'à Ctrl+C).")
+
+    bench_disk_parser = subparsers.add_parser("bench-disk", help="Compare les profils de disque QCOW2 sur le stockage local.")
+    bench_disk_parser.add_argument("--profiles", type=str, default=None,
+                                   help="Profils à comparer, séparés par des virgules (défaut : tous).")
+    bench_disk_parser.add_argument("--size", type=str, default="1G", help="Taille des images de test.")
+    bench_disk_parser.add_argument("--runs", type=int, default=3, help="Nombre de créations par profil.")
+    bench_disk_parser.add_argument("--dir", type=str, default=".", help="Dossier (stockage) où créer les images de test.")
+
+    state_parser = subparsers.add_parser("state", help="États sauvegardés de VMs QEMU pour le démarrage rapide.")
+    state_subparsers = state_parser.add_subparsers(dest="state_action", required=True)
+    save_parser = state_subparsers.add_parser("save", help="Capture l'état complet d'une VM QEMU en cours d'exécution.")
+    save_parser.add_argument("vm_name", help="Nom de la VM QEMU.")
+    save_parser.add_argument("--name", default=None, help="Nom de l'état sauvegardé (défaut : nom de la VM).")
+    save_parser.add_argument("--stop", action="store_true", help="Arrête la VM après la capture au lieu de la relancer.")
+    state_subparsers.add_parser("list", help="Liste les états sauvegardés.")
+    launch_parser = state_subparsers.add_parser("launch", help="Démarre une nouvelle VM depuis un état sauvegardé.")
+    launch_parser.add_argument("state", help="Nom de l'état sauvegardé.")
+    launch_parser.add_argument("vm_name", help="Nom de la nouvelle VM.")
+    launch_parser.add_argument("--wait-ready", action="store_true", help="Attend que la VM soit disponible (agent invité).")
+
+    client_parser = subparsers.add_parser("client", help="Client du démon de provisionnement.")
+    client_parser.add_argument("--socket", type=str, default=None, help="Chemin du socket du démon.")
+    client_parser.add_argument("action", choices=["submit", "status", "list", "cancel", "health"])
+    client_parser.add_argument("target", nargs="?", help="Fichier JSON de travaux (submit) ou identifiant (status, cancel).")
     return parser.parse_args()
 
-def create_vm(hypervisor, name, arch, ram, iso_path, paths, dry_run=False, bridge_interface=None):
-    """Crée une machine virtuelle avec gestion optionnelle du bridge réseau."""
-    # Vérification si la VM existe déjà
+# Format de disque attendu par chaque hyperviseur (QEMU utilise directement le QCOW2)
+DISK_FORMATS = {"VirtualBox": "vdi", "VMware": "vmdk"}
+
+
+def ensure_vm_name_available(hypervisor, name, paths):
+    """
+    Vérifie si la VM existe déjà et propose de la supprimer ou de la renommer.
+
+    Retourne le nom à utiliser, ou None si la VM existe toujours.
+    """
     while vm_exists(hypervisor, name, paths):
         print(f"{Fore.YELLOW}⚠️ La VM '{name}' existe déjà.{Style.RESET_ALL}")
         choix = choose_from_list("Que voulez-vous faire ?", ["Supprimer la VM", "Changer de nom"])
         if choix == "Supprimer la VM":
             print(f"{Fore.RED}🗑 Suppression de la VM existante '{name}'...{Style.RESET_ALL}")
             if hypervisor == "VirtualBox":
-                subprocess.run([paths["VirtualBox"], "unregistervm", name, "--delete"], check=True)
+                executor.run([paths["VirtualBox"], "unregistervm", name, "--delete"], check=True)
             elif hypervisor == "VMware":
-                subprocess.run([paths["VMware"], "-T", "ws", "deleteVM", f"{name}.vmx"], check=True)
+                executor.run([paths["VMware"], "-T", "ws", "deleteVM", f"{name}.vmx"], check=True)
             elif hypervisor == "Hyper-V":
-                subprocess.run(["powershell.exe", "Remove-VM", "-Name", name, "-Force"], check=True)
+                executor.run(["powershell.exe", "Remove-VM", "-Name", name, "-Force"], check=True)
             print(f"{Fore.GREEN}✅ VM '{name}' supprimée.{Style.RESET_ALL}")
         else:
             name = prompt_input("Entrez un nouveau nom pour la VM", required=True)
 
     if vm_exists(hypervisor, name, paths):
         print(f"{Fore.RED}❌ Impossible de créer la VM '{name}', elle existe toujours après modification.{Style.RESET_ALL}")
-        return
-
-    print(f"\n{Fore.CYAN}➡️ Création de la VM '{name}' avec {ram} Mo de RAM sous {hypervisor}...{Style.RESET_ALL}")
-
-    qcow2_disk = create_qcow2_disk(name)
-    if not qcow2_disk:
-        return
-
-    converted_disk = None
+        return None
+    return name
+
+
+def build_vm_commands(hypervisor, name, ram, iso_path, paths, qcow2_disk, converted_disk=None, bridge_interface=None,
+                      boot_disk=False, detach=False, tuning=None, cpus=None, disk_profile=None):
+    """
+    Construit la liste des commandes de création/démarrage de la VM pour l'hyperviseur donné.
+
+    Avec `boot_disk`, la VM démarre sur son disque (image cloud) et `iso_path`
+    est le seed cloud-init, simplement attaché comme lecteur CD.
+    Avec `detach`, QEMU passe en arrière-plan une fois lancé (`-daemonize`) au lieu
+    de bloquer jusqu'à l'arrêt de la VM, pour pouvoir en sonder la disponibilité.
+    `tuning` choisit le profil matériel de l'hyperviseur (voir `vbox.py` et `vmx.py`)
+    et `cpus` remplace son nombre de vCPU (2 par défaut pour QEMU).
+    `disk_profile` (voir `disk_profiles.py`) règle le cache L2 du disque QEMU.
+    Le système invité est lu dans l'ISO d'installation (voir `iso_inspect.py`),
+    à défaut déduit du nom de l'image démarrée.
+    """
     cmd_vm = []
+    info = None if boot_disk else inspect_iso(iso_path)
+    hint = os_hint(info)
+    if hint:
+        logging.info(f"💿 ISO '{info.label}' : {hint} ({info.arch or 'architecture inconnue'})")
+    # QEMU émule l'architecture de son binaire (qemu-system-<arch>), les autres hyperviseurs celle de l'hôte
+    target = normalize_arch(os.path.basename(paths.get("QEMU", ""))) if hypervisor == "QEMU" else normalize_arch(platform.machine())
+    if arch_mismatch(info, target):
+        logging.warning(f"⚠️ ISO '{info.label}' prévue pour {info.arch}, {hypervisor} exécute du {target}")
+        print(f"{Fore.YELLOW}⚠️ L'ISO '{info.label}' est prévue pour {info.arch} mais {hypervisor} exécute du {target} : "
+              f"la VM ne démarrera probablement pas.{Style.RESET_ALL}")
+    # Image cloud : le système se déduit de l'image source, pas du disque converti
+    image = hint or (qcow2_disk if boot_disk else iso_path)
 
     if hypervisor == "VirtualBox":
-        vbox_path = paths["VirtualBox"]
-        # Conversion du disque pour VirtualBox (format VDI)
-        converted_disk = convert_disk_format(qcow2_disk, f"{name}.vdi", "vdi")
-
-        # Liste de commandes de base pour VirtualBox
-        cmd_vm = [
-            [vbox_path, "createvm", "--name", name, "--register"],
-            [vbox_path, "modifyvm", name, "--memory", str(ram)],
-            [vbox_path, "modifyvm", name, "--ioapic", "off"],
-            [vbox_path, "modifyvm", name, "--apic", "on"],
-            [vbox_path, "storagectl", name, "--name", "SATA Controller", "--add", "sata", "--controller", "IntelAhci"],
-            [vbox_path, "storageattach", name, "--storagectl", "SATA Controller", "--port", "0", "--device", "0", "--type", "hdd", "--medium", converted_disk],
-            [vbox_path, "storageattach", name, "--storagectl", "SATA Controller", "--port", "1", "--device", "0", "--type", "dvddrive", "--medium", iso_path],
-            [vbox_path, "modifyvm", name, "--boot1", "dvd"],
-            [vbox_path, "modifyvm", name, "--biosbootmenu", "messageandmenu"],
-        ]
-
-        # Configuration réseau : bridgé ou NAT (NAT par défaut)
-        if bridge_interface:
-            cmd_vm.append([vbox_path, "modifyvm", name, "--nic1", "bridged"])
-            cmd_vm.append([vbox_path, "modifyvm", name, "--bridgeadapter1", bridge_interface])
-        else:
-            cmd_vm.append([vbox_path, "modifyvm", name, "--nic1", "nat"])
+        cmd_vm = build_vbox_commands(
+            paths["VirtualBox"], name, ram, converted_disk, iso_path, bridge_interface, boot_disk,
+            profile=tuning, cpus=cpus, ostype=guess_ostype(hint) if hint else None, image=image,
+        )
 
     elif hypervisor == "VMware":
         vmware_path = paths["VMware"]
-        converted_disk = convert_disk_format(qcow2_disk, f"{name}.vmdk", "vmdk")
         # Choix du type de connexion en fonction de l'option bridge
         connection_type = "bridged" if bridge_interface else "nat"
-        vmx_content = f"""
-        .encoding = "UTF-8"
-        config.version = "8"
-        virtualHW.version = "16"
-        displayName = "{name}"
-        guestOS = "ubuntu-64"
-        memsize = "{ram}"
-        numvcpus = "2"
-        scsi0.present = "TRUE"
-        scsi0.virtualDev = "lsilogic"
-        sata0.present = "TRUE"
-        sata0:0.present = "TRUE"
-        sata0:0.fileName = "{converted_disk}"
-        sata0:0.deviceType = "disk"
-        ide1:0.present = "TRUE"
-        ide1:0.fileName = "{iso_path}"
-        ide1:0.deviceType = "cdrom-image"
-        ethernet0.present = "TRUE"
-        ethernet0.connectionType = "{connection_type}"
-        """
-        vmx_path = f"{name}.vmx"
-        with open(vmx_path, "w") as vmx_file:
-            vmx_file.write(vmx_content.strip())
+        vmx_path = write_vmx(f"{name}.vmx", build_vmx(
+            name, ram, converted_disk, iso_path, connection_type, boot_disk,
+            profile=tuning, cpus=cpus, guest_os=guess_guest_os(image),
+        ))
+        register_file(vmx_path, "VMware", name)
         logging.info(f"✅ Fichier VMX créé : {vmx_path}")
 
         cmd_vm = [[vmware_path, "-T", "ws", "start", vmx_path]]
 
     elif hypervisor == "QEMU":
+        # Périphériques paravirtuels si le système invité les prend en charge dès l'installation
+        devices = qemu_devices(info)
+        interface = devices["disk"] if devices else "ide"
+        # Chemins absolus : avec `-daemonize`, QEMU se place dans `/`, et la capture
+        # d'état (`qmp.py`) relit les chemins dans la ligne de commande du processus.
+        disk_path = os.path.abspath(qcow2_disk)
+        # Format explicite (pas de détection) et cache L2 du profil de disque
+        disk_params = ["-drive", f"file={disk_path},format=qcow2,if={interface}" + drive_options(disk_profile, disk_path)]
+
         # Pour QEMU, configuration de la partie réseau en mode bridge ou NAT
+        nic = devices["nic"] if devices else "virtio-net-pci"
+        net_params = ["-net", "nic", "-net", "user"]
+        if devices:
+            net_params = ["-netdev", "user,id=net0", "-device", f"{nic},netdev=net0"]
         if bridge_interface:
-            from network import create_tap_interface
             tap_iface = create_tap_interface()
             if not tap_iface:
                 print(f"{Fore.RED}❌ Échec de la configuration réseau. Passage en NAT.{Style.RESET_ALL}")
-                net_params = ["-net", "nic", "-net", "user"]
             else:
                 net_params = [
                     "-netdev", f"tap,id=net0,ifname={tap_iface},script=no,downscript=no",
-                    "-device", "virtio-net-pci,netdev=net0"
+                    "-device", f"{nic},netdev=net0"
                 ]
 
 
         cmd_vm = [[
             paths["QEMU"], "-m", str(ram),
-            "-hda", qcow2_disk,
-            "-cdrom", iso_path,
-            "-boot", "d",
+        ] + disk_params + [
+            "-cdrom", os.path.abspath(iso_path),
+            "-boot", "c" if boot_disk else "d",
             "-vga", "virtio",
             "-display", "gtk,gl=on",
             "-accel", "tcg",
-            "-smp", "2",
-            "-usb", "-device", "usb-tablet"
-        ] + net_params]
+            "-smp", str(cpus or 2),
+            "-usb", "-device", "usb-tablet",
+            # Canal de l'agent invité (qemu-guest-agent), utilisé par la sonde de disponibilité
+            "-chardev", f"socket,path={qga_socket_path(name)},server=on,wait=off,id=qga0",
+            "-device", "virtio-serial",
+            "-device", "virtserialport,chardev=qga0,name=org.qemu.guest_agent.0",
+            # Fichier PID lu par le mode supervision (`monitor`)
+            "-pidfile", pid_file(name),
+            # Moniteur QMP : capture de l'état pour le démarrage rapide (`state save`)
+            "-qmp", f"unix:{qmp_socket_path(name)},server=on,wait=off",
+        ] + net_params + (["-daemonize"] if detach else [])]
+
+    return cmd_vm
+
+
+def _start_journal(hypervisor, name):
+    """Retourne le journal d'étapes de la VM et indique s'il s'agit d'une reprise."""
+    journal = StepJournal(hypervisor, name)
+    if journal.resumable():
+        failed = journal.state.get("failed") or "?"
+        print(f"{Fore.CYAN}🔁 Reprise de la création de '{name}' (dernière étape en échec : {failed}).{Style.RESET_ALL}")
+        return journal, True
+    return journal, False
+
+
+def prepare_seed_image(name, cloud_init):
+    """Génère (ou reprend du cache) le seed NoCloud de la VM et retourne son chemin."""
+    seed = create_seed_image(
+        name, cloud_init.get("user_data"), cloud_init.get("meta_data"), cloud_init.get("network_config")
+    )
+    logging.info(f"🌱 Seed cloud-init : {seed}")
+    return seed
+
+
+def _reset_commands(journal, hypervisor, name, cmd_vm, paths, template=None):
+    """
+    Commandes à exécuter avant de rejouer la première commande VirtualBox (étape
+    précédente invalidée : disque modifié...) : la VM enregistrée par l'exécution
+    précédente est supprimée, sinon `createvm` et `storagectl` échouent ("already exists").
+    Les disques produits par le journal sont conservés ; ceux d'un clone sont recréés.
+    """
+    if hypervisor != "VirtualBox" or not cmd_vm or journal.steps.get("cmd-00", {}).get("status") != "done":
+        return []
+    if not journal.should_run("cmd-00", cmd_vm[0]):
+        return []
+    print(f"{Fore.YELLOW}🗑 Suppression de la VM '{name}' enregistrée lors de l'exécution précédente...{Style.RESET_ALL}")
+    return build_vbox_reset_commands(paths["VirtualBox"], name, keep_disks=not template)
+
+
+class _DirectRunner:
+    """
+    Exécuteur de `create_vm`, avec la même interface que `AsyncExecutor` :
+    chaque étape s'exécute directement dans le thread appelant, sans réservation
+    de ressources, et les sorties des commandes de l'hyperviseur restent à l'écran.
+    """
+
+    async def call(self, func, *args, resources=(), **kwargs):
+        return func(*args, **kwargs)
+
+    async def run(self, cmd, resources=(), check=False, label=None):
+        if check:
+            return executor.run(cmd, check=True)
+        return executor.run(cmd, capture_output=True)  # nettoyage : erreurs attendues, sorties masquées
+
+
+async def _create_vm(runner, hypervisor, name, ram, iso_path, paths, dry_run=False, bridge_interface=None,
+                     interactive=True, check_exists=True, template=None, cloud_init=None, detach=False,
+                     tuning=None, cpus=None, disk_profile=None):
+    """Étapes communes à `create_vm` et `create_vm_async`, exécutées par `runner` (voir `AsyncExecutor`)."""
+    journal, resuming = _start_journal(hypervisor, name)
+    if not resuming:
+        if interactive:
+            name = await runner.call(ensure_vm_name_available, hypervisor, name, paths)
+        elif check_exists and await runner.call(vm_exists, hypervisor, name, paths, resources=command_resources([paths.get(hypervisor, "")])):
+            print(f"{Fore.RED}❌ La VM '{name}' existe déjà.{Style.RESET_ALL}")
+            name = None
+        if name is None:
+            return None
+        journal = StepJournal(hypervisor, name)
+        journal.reset()
+
+    print(f"\n{Fore.CYAN}➡️ Création de la VM '{name}' avec {ram} Mo de RAM sous {hypervisor}...{Style.RESET_ALL}")
+
+    cloud_image = cloud_init.get("image") if cloud_init else None
+    if cloud_init:
+        iso_path = await runner.call(prepare_seed_image, name, cloud_init)
+
+    if template:
+        cmd_vm = build_clone_commands(hypervisor, get_template(template), name, ram, paths, bridge_interface)
+    else:
+        disk_resources = ["qemu-img", f"disk:{name}.qcow2"]
+        if cloud_image and hypervisor in DISK_FORMATS:
+            # L'image cloud est convertie directement (et servie par le cache des conversions).
+            qcow2_disk = cloud_image
+        elif cloud_image:
+            create_overlay = functools.partial(runner.call, create_overlay_disk, resources=disk_resources)
+            qcow2_disk = await journal.arun("disk", create_overlay, cloud_image, name, artifact=True)
+        else:
+            make_disk = functools.partial(create_qcow2_disk, profile=disk_profile) if disk_profile else create_qcow2_disk
+            create_disk = functools.partial(runner.call, make_disk, resources=disk_resources)
+            # Un changement de profil recrée le disque à la reprise
+            qcow2_disk = await journal.arun("disk", create_disk, name, artifact=True, fingerprint=disk_profile or "default")
+        if not qcow2_disk:
+            return None
+
+        converted_disk = None
+        if hypervisor in DISK_FORMATS:
+            disk_format = DISK_FORMATS[hypervisor]
+            convert = functools.partial(runner.call, convert_disk_format, resources=["qemu-img", f"disk:{qcow2_disk}"])
+            converted_disk = await journal.arun(
+                "convert", convert, qcow2_disk, f"{name}.{disk_format}", disk_format, artifact=True
+            )
+
+        cmd_vm = await runner.call(
+            build_vm_commands, hypervisor, name, ram, iso_path, paths, qcow2_disk, converted_disk, bridge_interface,
+            bool(cloud_image), detach, tuning, cpus, disk_profile,
+        )
 
     if dry_run:
         print(f"{Fore.MAGENTA}[Dry-run] Commandes : {cmd_vm}{Style.RESET_ALL}")
-        return
+        journal.clear()
+        return name
+
+    async def run_command(cmd):
+        print(f"{Fore.BLUE}🖥️ [{name}] Exécution : {' '.join(cmd)}{Style.RESET_ALL}")
+        return await runner.run(cmd, resources=command_resources(cmd), check=True, label=name)
 
-    # Exécution des commandes
-    for cmd in cmd_vm:
-        print(f"{Fore.BLUE}🖥️ Exécution : {' '.join(cmd)}{Style.RESET_ALL}")
-        subprocess.run(cmd, check=True)
+    # Exécution des commandes (les étapes déjà effectuées sont sautées)
+    for cmd in _reset_commands(journal, hypervisor, name, cmd_vm, paths, template):
+        await runner.run(cmd, resources=command_resources(cmd), check=False, label=name)
+    for index, cmd in enumerate(cmd_vm):
+        await journal.arun(f"cmd-{index:02d}", run_command, cmd, fingerprint=cmd)
 
+    journal.finish()
     print(f"{Fore.GREEN}✅ VM '{name}' créée avec succès.{Style.RESET_ALL}")
+    return name
+
+
+def create_vm(hypervisor, name, arch, ram, iso_path, paths, dry_run=False, bridge_interface=None, template=None,
+              cloud_init=None, tuning=None, cpus=None, disk_profile=None):
+    """
+    Crée une machine virtuelle avec gestion optionnelle du bridge réseau.
+
+    Chaque étape terminée est enregistrée dans un journal (voir `checkpoint.py`) :
+    après un échec, une nouvelle exécution reprend à l'étape qui a échoué.
+    Avec `template` (nom d'un modèle enregistré), la VM est un clone lié du
+    modèle : ni disque à créer, ni ISO à démarrer.
+    Avec `cloud_init` ({"image", "user_data", "meta_data", "network_config"}),
+    la VM démarre sur l'image cloud et se configure seule via un seed NoCloud.
+    `disk_profile` : profil de création du disque QCOW2 (voir `disk_profiles.py`).
+
+    Retourne le nom de la VM créée, ou None si elle n'a pas été créée.
+    """
+    return asyncio.run(_create_vm(
+        _DirectRunner(), hypervisor, name, ram, iso_path, paths, dry_run, bridge_interface, template=template,
+        cloud_init=cloud_init, tuning=tuning, cpus=cpus, disk_profile=disk_profile,
+    ))
+
+
+async def create_vm_async(hypervisor, name, arch, ram, iso_path, paths, dry_run=False, bridge_interface=None,
+                          engine=None, interactive=True, check_exists=True, template=None, cloud_init=None,
+                          detach=False, tuning=None, cpus=None, disk_profile=None):
+    """
+    Variante asynchrone de `create_vm`.
+
+    Les étapes lourdes sont réservées par ressource : création du disque (`qemu-img`),
+    conversion (un seul traitement par disque source) et appels à l'hyperviseur
+    (ex : nombre borné d'appels `VBoxManage` simultanés). Les sorties des commandes
+    sont diffusées en direct, préfixées par le nom de la VM.
+    Sans `interactive`, une VM existante fait échouer la création au lieu d'ouvrir le menu ;
+    `check_exists=False` saute cette vérification (l'appelant connaît déjà l'inventaire).
+    `detach` : voir `build_vm_commands`.
+    """
+    return await _create_vm(
+        engine or AsyncExecutor(), hypervisor, name, ram, iso_path, paths, dry_run, bridge_interface,
+        interactive=interactive, check_exists=check_exists, template=template, cloud_init=cloud_init,
+        detach=detach, tuning=tuning, cpus=cpus, disk_profile=disk_profile,
+    )
+
+
+async def launch_and_wait(launch, kind, ready_spec=None, engine=None):
+    """
+    Attend la fin du lancement `launch` (coroutine retournant le nom de la machine,
+    ou un résultat de `docker run`) puis sonde la machine jusqu'à sa disponibilité.
+
+    Retourne un `ReadyResult`, ou None si le lancement a échoué ou si aucune sonde n'est possible.
+    """
+    launched = await launch
+    if kind == "docker":
+        launched = ready_spec["container"] if launched is not None and launched.returncode == 0 else None
+    if not launched:
+        return None
+
+    target = build_target(launched, kind, ready_spec)
+    if target is None:
+        print(f"{Fore.YELLOW}⚠️ Aucune sonde de disponibilité pour '{launched}' ({kind}) : "
+              f"ajoutez une section \"ready\" (ex : {{\"probe\": \"ssh\", \"port\": 2222}}).{Style.RESET_ALL}")
+        return None
+    print(f"{Fore.CYAN}⏳ Attente de la disponibilité de '{launched}' ({target['probe']})...{Style.RESET_ALL}")
+    return await wait_ready(target, engine)
+
+
+def _launch_spec(spec, paths, engine, wait):
+    """Coroutine de création d'une machine décrite par une spécification de flotte."""
+    if spec["kind"] == "docker":
+        launch = create_docker_container_async(
+            spec["container_name"], spec["image_name"], spec["volume_name"], spec["ports"], spec["env_vars"],
+            spec["command"], engine=engine,
+        )
+        ready_spec = {"container": spec["container_name"], **(spec.get("ready") or {})}
+        return launch_and_wait(launch, "docker", ready_spec, engine) if wait else launch
+
+    launch = create_vm_async(
+        spec["hypervisor"], spec["vm_name"], spec["arch"], spec["ram"], spec["iso_path"], paths,
+        dry_run=spec["dry_run"], bridge_interface=spec.get("bridge"), engine=engine, interactive=False,
+        template=spec.get("template"), cloud_init=spec.get("cloud_init"), detach=wait,
+        tuning=spec.get("tuning"), cpus=spec.get("cpus"), disk_profile=spec.get("disk_profile"),
+    )
+    if wait and not spec["dry_run"]:
+        return launch_and_wait(launch, spec["hypervisor"], spec.get("ready"), engine)
+    return launch
+
+
+async def provision_batch_async(config, paths, with_docker=True, engine=None, wait=False,
+                                max_pending=MAX_PENDING_LAUNCHES):
+    """
+    Crée en parallèle les machines du fichier de configuration (VMs des hyperviseurs disponibles et conteneurs).
+
+    `config` est une `Fleet` ou un dictionnaire de configuration : la flotte est dépliée
+    au fil de l'eau, avec au plus `max_pending` créations en cours à la fois.
+    Avec `wait`, chaque machine est sondée dès son lancement (section "ready" de sa
+    configuration) et les temps de mise à disposition de la flotte sont affichés.
+    """
+    engine = engine or AsyncExecutor()
+    fleet = config if isinstance(config, Fleet) else Fleet.from_dict(config)
+    pending = set()
+    results = []
+
+    def collect(done):
+        for task in done:
+            results.append(task.exception() or task.result())
+
+    for spec in fleet.specs():
+        if spec["kind"] == "docker" and not with_docker:
+            continue
+        if spec["kind"] == "vm" and spec["hypervisor"] not in paths:
+            print(f"{Fore.YELLOW}⚠️ Hyperviseur '{spec['hypervisor']}' non disponible, VM '{spec['vm_name']}' ignorée.{Style.RESET_ALL}")
+            continue
+        pending.add(asyncio.ensure_future(_launch_spec(spec, paths, engine, wait)))
+        if len(pending) >= max_pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            collect(done)
+
+    if pending:
+        done, _ = await asyncio.wait(pending)
+        collect(done)
+
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"{Fore.RED}❌ Échec d'une création : {result}{Style.RESET_ALL}")
+    if wait:
+        ready = [result for result in results if isinstance(result, ReadyResult)]
+        if ready:
+            print_ready_report(ready)
+    return results
+
+
+def run_cache_command(action):
+    """Affiche les statistiques du cache des disques convertis, ou le vide."""
+    cache = get_cache() or ConversionCache()
+    if action == "clear":
+        cache.clear()
+        print(f"{Fore.GREEN}✅ Cache des disques vidé.{Style.RESET_ALL}")
+        return
+
+    stats = cache.stats()
+    print(f"\n💾 Cache des disques : {stats['entries']} entrées, "
+          f"{stats['size'] / 1024 ** 2:.1f} Mo / {stats['max_size'] / 1024 ** 2:.0f} Mo")
+    print(f"  ✔ succès : {stats['hits']}  ✖ échecs : {stats['misses']}  "
+          f"taux : {stats['hit_ratio']:.0%}  évictions : {stats['evictions']}")
+
+
+def run_template_command(args):
+    """Enregistre, liste ou mesure les modèles de VM."""
+    if args.template_action == "list":
+        for name, template in load_templates().items():
+            print(f"  {name:20s} {template['hypervisor']:10s} {template['source']} @ {template['snapshot']}")
+        return
+
+    _, hypervisor_paths = find_hypervisors()
+    if args.template_action == "register":
+        register_template(args.hypervisor, args.source, hypervisor_paths, name=args.name, snapshot=args.snapshot)
+    else:
+        benchmark_clone(args.hypervisor, args.template, hypervisor_paths, args.iso, ram=args.ram, runs=args.runs)
+
+
+def run_state_command(args):
+    """Capture, liste ou démarre les états sauvegardés de VMs QEMU."""
+    if args.state_action == "list":
+        for name, state in list_states().items():
+            size = (state.get("size") or 0) / 1024 ** 2
+            print(f"  {name:20s} {state['source']:20s} {size:9.1f} Mio  {state['base']}")
+        return
+
+    if args.state_action == "save":
+        try:
+            save_state(args.vm_name, args.name, keep_running=not args.stop)
+        except QMPError as e:
+            print(f"{Fore.RED}❌ Capture de '{args.vm_name}' impossible : {e}{Style.RESET_ALL}")
+        return
+
+    if args.wait_ready:
+        launch = asyncio.to_thread(launch_from_state, args.state, args.vm_name)
+        result = asyncio.run(launch_and_wait(launch, "QEMU"))
+        if result:
+            print_ready_report([result])
+    else:
+        launch_from_state(args.state, args.vm_name)
+
+
+def run_client(args):
+    """Exécute une action du client du démon et affiche la réponse JSON."""
+    client = DaemonClient(args.socket)
+    if args.action == "submit":
+        # Fichier de configuration ou de flotte : chaque machine devient un travail
+        response = client.submit(load_jobs(args.target))
+    elif args.action == "status":
+        response = client.status(args.target)
+    elif args.action == "cancel":
+        response = client.cancel(args.target)
+    elif args.action == "list":
+        response = client.list()
+    else:
+        response = client.health()
+    print(json.dumps(response, indent=2, ensure_ascii=False))
 
 
 def main():
     args = parse_arguments()
-    config = load_config(args.config) if args.batch else {}
+    executor.configure(args.journal)
+    if args.replay:
+        executor.enable_replay(args.replay, speed=args.replay_speed)
+
+    configure_cache(
+        parse_size(args.disk_cache_size) if args.disk_cache_size else None,
+        enabled=not args.no_disk_cache,
+    )
+
+    if args.command == "cache":
+        run_cache_command(args.action)
+        return
+
+    if args.command == "journal":
+        executor.print_summary(top=args.top)
+        return
+
+    if args.command == "daemon":
+        limits = {key: int(value) for key, value in (item.split("=", 1) for item in args.limit)}
+        run_daemon(args.socket, workers=args.workers, limits=limits)
+        return
+
+    if args.command == "gc":
+        _, hypervisor_paths = find_hypervisors()
+        asyncio.run(collect_garbage_async(hypervisor_paths, dry_run=args.dry_run, min_age=args.min_age,
+                                          stopped_containers=args.containers))
+        return
+
+    if args.command == "monitor":
+        run_monitor(args.interval, args.capacity, port=args.port, output=args.output, duration=args.duration)
+        return
+
+    if args.command == "bench-disk":
+        benchmark_profiles(args.profiles.split(",") if args.profiles else None, args.size, args.runs, args.dir)
+        return
+
+    if args.command == "state":
+        run_state_command(args)
+        return
+
+    if args.command == "client":
+        run_client(args)
+        return
+
+    if args.command == "template":
+        run_template_command(args)
+        return
+
+    if args.command == "rollback":
+        _, hypervisor_paths = find_hypervisors()
+        rollback(args.hypervisor, args.vm_name, hypervisor_paths)
+        return
+
     os_type = detect_os()
 
+    if args.batch and args.parallel:
+        _, hypervisor_paths = find_hypervisors()
+        try:
+            asyncio.run(provision_batch_async(load_fleet(args.config), hypervisor_paths, with_docker=is_docker_installed(),
+                                              wait=args.wait_ready))
+        except FleetConfigError as e:
+            print(f"{Fore.RED}❌ Configuration invalide : {e}{Style.RESET_ALL}")
+            exit(1)
+        return
+
+    config = load_config(args.config) if args.batch else {}
+    # Profils de disque vérifiés avant toute création (une erreur n'apparaîtrait sinon qu'à `qemu-img`)
+    for hypervisor, hypervisor_config in config.get("hypervisors", {}).items():
+        try:
+            get_profile(hypervisor_config.get("disk_profile"))
+        except ValueError as e:
+            print(f"{Fore.RED}❌ Configuration invalide ({hypervisor}) : {e}{Style.RESET_ALL}")
+            exit(1)
+
     mode = choose_from_list(
         f"{Fore.YELLOW}Voulez-vous créer une VM ou un conteneur Docker ?{Style.RESET_ALL}",
         ["docker", "hypervisor"]
@@ -197,7 +689,14 @@ def main():
 
             command = prompt_input("Commande à exécuter dans le conteneur", default="bash")
 
-        create_docker_container(container_name, image_name, volume_name, ports, env_vars, command)
+        launch = create_docker_container_async(container_name, image_name, volume_name, ports, env_vars, command)
+        if args.batch and args.wait_ready:
+            ready_spec = {"container": container_name, **config.get("docker", {}).get("ready", {})}
+            result = asyncio.run(launch_and_wait(launch, "docker", ready_spec))
+            if result:
+                print_ready_report([result])
+        else:
+            asyncio.run(launch)
         return
 
     elif mode == "hypervisor":
@@ -215,7 +714,17 @@ def main():
             iso_path = hypervisor_config.get("iso_path", "isos/ubuntu.iso")
             dry_run = hypervisor_config.get("dry_run", False)
             bridge_interface = hypervisor_config.get("bridge", None)
+            template = hypervisor_config.get("template")
+            cloud_init = hypervisor_config.get("cloud_init")
+            tuning = hypervisor_config.get("tuning")
+            cpus = hypervisor_config.get("cpus")
+            disk_profile = hypervisor_config.get("disk_profile")
         else:
+            template = None
+            cloud_init = None
+            tuning = None
+            cpus = None
+            disk_profile = None
             vm_name = prompt_input("Nom de la VM", default="MaVM")
             ram = int(prompt_input("Mémoire RAM (Mo)", default="2048"))
             iso_list = list_local_isos()
@@ -241,7 +750,14 @@ def main():
                         bridge_interface = None
 
         print(f"{Fore.CYAN}🚀 Création de la VM '{vm_name}' sous {hypervisor}...{Style.RESET_ALL}")
-        create_vm(hypervisor, vm_name, "x86_64", ram, iso_path, hypervisor_paths, dry_run=dry_run, bridge_interface=bridge_interface)
+        wait = args.batch and args.wait_ready and not dry_run
+        launch = create_vm_async(hypervisor, vm_name, "x86_64", ram, iso_path, hypervisor_paths, dry_run=dry_run, bridge_interface=bridge_interface, template=template, cloud_init=cloud_init, detach=wait, tuning=tuning, cpus=cpus, disk_profile=disk_profile)
+        if wait:
+            result = asyncio.run(launch_and_wait(launch, hypervisor, hypervisor_config.get("ready")))
+            if result:
+                print_ready_report([result])
+        else:
+            asyncio.run(launch)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,149 @@
+"""
+Génération des fichiers .vmx (VMware) à partir de profils.
+
+Un profil décrit le matériel virtuel et les réglages mémoire :
+
+  - "compat"      : matériel générique (disque SATA, carte réseau par défaut),
+                    équivalent à l'ancien fichier écrit par `create_vm`
+  - "performance" : SCSI paravirtuel (pvscsi) et carte vmxnet3, mémoire non
+                    adossée à un fichier (.vmem), sans partage de pages ni
+                    récupération de mémoire inutilisée par l'hôte
+
+Le `guestOS` est déduit du nom de l'ISO (ou de l'image cloud) démarrée. Un
+invité Windows n'a pas les pilotes pvscsi et vmxnet3 à l'installation : il
+garde le disque SATA et reçoit une carte e1000e.
+"""
+import os
+import re
+
+DEFAULT_PROFILE = "compat"
+DEFAULT_GUEST_OS = "otherlinux-64"
+# Périphériques sans pilote dans l'installateur Windows, et leur remplaçant
+WINDOWS_FALLBACK = {"disk_controller": ("pvscsi", "sata"), "nic": ("vmxnet3", "e1000e")}
+
+PROFILES = {
+    "compat": {
+        "cpus": 2,
+        "disk_controller": "sata",
+        "nic": None,
+        "settings": {},
+    },
+    "performance": {
+        "cpus": 4,
+        "disk_controller": "pvscsi",
+        "nic": "vmxnet3",
+        "settings": {
+            # Mémoire invitée en RAM anonyme plutôt que dans un fichier .vmem
+            "mainMem.useNamedFile": "FALSE",
+            # Pas de recherche de pages identiques ni de récupération de pages libres de l'invité
+            "sched.mem.pshare.enable": "FALSE",
+            "MemTrimRate": "0",
+            "MemAllowAutoScaleDown": "FALSE",
+            "floppy0.present": "FALSE",
+        },
+    },
+}
+
+# (motif du nom de fichier, guestOS VMware) ; le premier motif reconnu l'emporte
+GUEST_OS_PATTERNS = [
+    (r"debian[-_]?(1[0-2])", "debian{0}-64"),
+    (r"debian", "debian12-64"),
+    (r"ubuntu", "ubuntu-64"),
+    (r"(?:rhel|rocky|alma)[-_a-z]*?(8|9)", "rhel{0}-64"),
+    (r"centos[-_a-z]*?(7|8)", "centos{0}-64"),
+    (r"fedora", "fedora-64"),
+    (r"opensuse|suse", "opensuse-64"),
+    (r"freebsd[-_]?(1[2-4])", "freebsd{0}-64"),
+    (r"win(?:dows)?[-_]?11", "windows11-64"),
+    (r"win(?:dows)?[-_]?10", "windows9-64"),
+    (r"windows|cccoma", "windows9-64"),
+]
+
+
+def guess_guest_os(image_path):
+    """Déduit le `guestOS` VMware du nom d'une ISO ou d'une image disque."""
+    name = os.path.basename(image_path or "").lower()
+    for pattern, guest_os in GUEST_OS_PATTERNS:
+        match = re.search(pattern, name)
+        if match:
+            return guest_os.format(*match.groups())
+    return DEFAULT_GUEST_OS
+
+
+def get_profile(name=None):
+    """Retourne un profil VMX ou lève ValueError."""
+    name = name or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Profil VMware inconnu : {name} ({', '.join(PROFILES)})")
+    return PROFILES[name]
+
+
+def build_vmx(name, ram, disk, iso_path, connection_type="nat", boot_disk=False, profile=None, cpus=None,
+              guest_os=None):
+    """
+    Construit les réglages d'une VM (dictionnaire ordonné clé -> valeur).
+
+    - disk : disque principal (VMDK) ; iso_path : ISO d'installation ou seed cloud-init
+    - boot_disk : démarrage sur le disque plutôt que sur le lecteur CD
+    - cpus, guest_os : remplacent les valeurs du profil et celle déduite de l'ISO
+    """
+    selected = dict(get_profile(profile))
+    cpus = cpus or min(selected["cpus"], os.cpu_count() or selected["cpus"])
+    guest_os = guest_os or guess_guest_os(disk if boot_disk else iso_path)
+    if guest_os.startswith("windows"):
+        for key, (paravirtual, fallback) in WINDOWS_FALLBACK.items():
+            if selected[key] == paravirtual:
+                selected[key] = fallback
+    settings = {
+        ".encoding": "UTF-8",
+        "config.version": "8",
+        "virtualHW.version": "16",
+        "displayName": name,
+        "guestOS": guest_os,
+        "memsize": ram,
+        "numvcpus": cpus,
+    }
+
+    if selected["disk_controller"] == "pvscsi":
+        settings.update({
+            "cpuid.coresPerSocket": cpus,
+            "scsi0.present": "TRUE",
+            "scsi0.virtualDev": "pvscsi",
+            "scsi0:0.present": "TRUE",
+            "scsi0:0.fileName": disk,
+            "scsi0:0.deviceType": "disk",
+        })
+    else:
+        settings.update({
+            "scsi0.present": "TRUE",
+            "scsi0.virtualDev": "lsilogic",
+            "sata0.present": "TRUE",
+            "sata0:0.present": "TRUE",
+            "sata0:0.fileName": disk,
+            "sata0:0.deviceType": "disk",
+        })
+
+    settings.update({
+        "ide1:0.present": "TRUE",
+        "ide1:0.fileName": iso_path,
+        "ide1:0.deviceType": "cdrom-image",
+        "bios.bootOrder": "hdd,cdrom" if boot_disk else "cdrom,hdd",
+        "ethernet0.present": "TRUE",
+        "ethernet0.connectionType": connection_type,
+    })
+    if selected["nic"]:
+        settings["ethernet0.virtualDev"] = selected["nic"]
+    settings.update(selected["settings"])
+    return settings
+
+
+def render_vmx(settings):
+    """Rend les réglages au format .vmx (`clé = "valeur"`, une par ligne)."""
+    return "\n".join(f'{key} = "{value}"' for key, value in settings.items()) + "\n"
+
+
+def write_vmx(path, settings):
+    """Écrit le fichier .vmx et retourne son chemin."""
+    with open(path, "w") as vmx_file:
+        vmx_file.write(render_vmx(settings))
+    return path
@@ -1,4 +1,59 @@
+import struct
 import sys
 import os
+import pytest
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """Redirige le dossier d'état (journal, caches...) vers un dossier temporaire."""
+    import executor
+
+    state_dir = tmp_path / "state"
+    monkeypatch.setenv("VM_CREATE_HOME", str(state_dir))
+    executor.configure(None)
+    executor.disable_replay()
+    yield state_dir
+    executor.disable_replay()
+
+
+ISO_SECTOR = 2048
+
+
+def _make_iso(path, label, platforms=(0x00, 0xEF), size=None):
+    """Écrit une ISO minimale : PVD, boot record El Torito, terminateur et catalogue (secteur 20)."""
+    pvd = bytearray(ISO_SECTOR)
+    pvd[0:7] = b"\x01CD001\x01"
+    pvd[8:40] = b"LINUX".ljust(32)
+    pvd[40:72] = label.encode().ljust(32)
+
+    boot_record = bytearray(ISO_SECTOR)
+    boot_record[0:7] = b"\x00CD001\x01"
+    boot_record[7:30] = b"EL TORITO SPECIFICATION"
+    boot_record[71:75] = struct.pack("<I", 20)
+
+    terminator = bytearray(ISO_SECTOR)
+    terminator[0:7] = b"\xffCD001\x01"
+
+    catalog = bytearray(ISO_SECTOR)
+    catalog[0:2] = bytes([0x01, platforms[0]])
+    catalog[30:32] = b"\x55\xaa"
+    catalog[32] = 0x88
+    for index, platform in enumerate(platforms[1:]):
+        header = 64 + index * 64
+        catalog[header:header + 4] = bytes([0x91 if index == len(platforms) - 2 else 0x90, platform, 1, 0])
+        catalog[header + 32] = 0x88
+
+    with open(path, "wb") as file:
+        file.write(b"\x00" * ISO_SECTOR * 16 + pvd + boot_record + terminator + b"\x00" * ISO_SECTOR + catalog)
+        if size:
+            file.truncate(size)  # image creuse : le reste n'est jamais lu
+    return str(path)
+
+
+@pytest.fixture
+def make_iso():
+    """Fabrique d'ISO minimales (voir `_make_iso`), pour les tests d'inspection et de construction des commandes."""
+    return _make_iso
@@ -0,0 +1,169 @@
+import asyncio
+import os
+import struct
+import subprocess
+import sys
+
+from artifacts import backing_chain, collect_garbage_async, find_orphans, live_state, load_registry, register, register_file
+from async_engine import AsyncExecutor
+from checkpoint import StepJournal
+from monitor import pid_file
+
+
+def make_file(path, size=64 * 1024):
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def state(journals=None, virtualbox=None, containers=None, interfaces=(set(), set())):
+    return {"journals": journals or {}, "virtualbox": virtualbox, "containers": containers, "interfaces": interfaces}
+
+
+def journal(status, hypervisor="QEMU", vm="vm1", registered=False, disk_ready=False):
+    return {(hypervisor, vm): {"status": status, "path": f"/nonexistent/{vm}.json", "mtime": 0, "registered": registered,
+                               "disk_ready": disk_ready}}
+
+
+def orphan_names(entries, live, min_age=0):
+    orphans, _ = find_orphans(entries, live, min_age)
+    return {(orphan.kind, os.path.basename(orphan.name)) for orphan in orphans}
+
+
+def test_file_orphans_follow_creation_state(tmp_path):
+    """✅ Teste les fichiers orphelins : création abandonnée, inachevée, terminée ou VM supprimée."""
+    register_file(make_file(tmp_path / "vm1.qcow2"), "QEMU", "vm1")
+    entries = load_registry()
+
+    assert orphan_names(entries, state()) == {("file", "vm1.qcow2")}
+    assert orphan_names(entries, state(journal("failed"))) == {("file", "vm1.qcow2"), ("checkpoint", "vm1.json")}
+    assert orphan_names(entries, state(journal("completed"))) == set()
+    assert orphan_names(entries, state(journal("completed")), min_age=3600) == set()
+
+
+def test_converted_vm_keeps_disk_but_drops_intermediate(tmp_path):
+    """✅ Teste qu'une VM VirtualBox garde son VDI mais pas son QCOW2 intermédiaire, sauf si elle a été supprimée."""
+    register_file(make_file(tmp_path / "vm1.qcow2"), "VirtualBox", "vm1")
+    register_file(make_file(tmp_path / "vm1.vdi"), "VirtualBox", "vm1")
+    entries = load_registry()
+    completed = journal("completed", "VirtualBox")
+
+    assert orphan_names(entries, state(completed, virtualbox={"vm1"})) == {("file", "vm1.qcow2")}
+    assert orphan_names(entries, state(completed, virtualbox=set())) == {
+        ("file", "vm1.qcow2"), ("file", "vm1.vdi"), ("checkpoint", "vm1.json"),
+    }
+
+
+def test_recreated_file_is_never_deleted(tmp_path):
+    """✅ Teste qu'un fichier recréé par autre chose (autre inode) est seulement retiré du registre."""
+    path = make_file(tmp_path / "vm1.vmdk")
+    register_file(path, "VMware", "vm1")
+    entries = load_registry()
+    entries[0]["ino"] = -1  # le fichier a été remplacé depuis son enregistrement
+
+    orphans, stale = find_orphans(entries, state(), min_age=0)
+
+    assert orphans == []
+    assert [entry["name"] for entry in stale] == [path]
+
+
+def test_taps_containers_and_incomplete_vms():
+    """✅ Teste les interfaces TAP, les conteneurs arrêtés et les VMs VirtualBox inachevées."""
+    register("tap", "tap0")
+    register("tap", "tap1")
+    register("container", "web", id="abc")
+    register("container", "db", id="def")
+    register("container", "replaced", id="old")
+    live = state(
+        journal("failed", "VirtualBox", "half", registered=True),
+        virtualbox={"half"},
+        containers={"web": ("abc", "exited"), "db": ("def", "running"), "replaced": ("new", "exited")},
+        interfaces=({"tap0", "tap1"}, {"tap1"}),
+    )
+
+    orphans, stale = find_orphans(load_registry(), live, min_age=0, stopped_containers=True)
+
+    assert {(orphan.kind, orphan.name) for orphan in orphans if orphan.kind != "checkpoint"} == {
+        ("tap", "tap0"), ("container", "web"), ("vm", "half"),
+    }
+    assert [entry["name"] for entry in stale] == ["replaced"]
+    # Sans option explicite, un conteneur arrêté peut l'avoir été volontairement
+    orphans, _ = find_orphans(load_registry(), live, min_age=0)
+    assert ("container", "web") not in {(orphan.kind, orphan.name) for orphan in orphans}
+
+
+def test_installed_qemu_disk_kept_after_unclean_shutdown(tmp_path):
+    """✅ Teste qu'une VM QEMU arrêtée brutalement (lancement `cmd-00` en échec) garde son disque installé et son journal."""
+    disk = make_file(tmp_path / "vm1.qcow2")
+    journal_ = StepJournal("QEMU", "vm1")
+    journal_.reset()
+    journal_.complete("disk", disk, artifacts=[disk])
+    journal_.fail("cmd-00", "QEMU a quitté avec le code 1")
+    broken = StepJournal("QEMU", "vm2")
+    broken.reset()
+    broken.complete("disk", make_file(tmp_path / "vm2.qcow2"), artifacts=[str(tmp_path / "vm2.qcow2")])
+    broken.fail("convert", "qemu-img convert a échoué")
+
+    live = asyncio.run(live_state({}, AsyncExecutor(on_output=None)))
+
+    assert live["journals"][("QEMU", "vm1")]["disk_ready"]
+    assert orphan_names(load_registry(), live) == {("file", "vm2.qcow2"), ("checkpoint", "QEMU-vm2.json")}
+
+
+def test_collect_garbage_dry_run_then_delete(tmp_path):
+    """✅ Teste le ramasse-miettes : simulation puis suppression, avec l'espace récupéré."""
+    journal = StepJournal("QEMU", "gone")
+    journal.reset()
+    journal.complete("disk", make_file(tmp_path / "gone.qcow2", size=256 * 1024), artifacts=[str(tmp_path / "gone.qcow2")])
+    journal.clear()  # création simulée : le journal est supprimé, le disque reste
+    kept = StepJournal("QEMU", "kept")
+    kept.reset()
+    kept.complete("disk", str(tmp_path / "kept.qcow2"), artifacts=[make_file(tmp_path / "kept.qcow2")])
+    kept.finish()
+
+    report = asyncio.run(collect_garbage_async({}, dry_run=True, min_age=0))
+    assert [os.path.basename(orphan.name) for orphan in report["orphans"]] == ["gone.qcow2"]
+    assert (tmp_path / "gone.qcow2").exists()
+
+    report = asyncio.run(collect_garbage_async({}, min_age=0))
+    assert not (tmp_path / "gone.qcow2").exists()
+    assert (tmp_path / "kept.qcow2").exists()
+    assert report["reclaimed"] > 0
+    assert [entry["name"] for entry in load_registry()] == [str(tmp_path / "kept.qcow2")]
+
+
+def make_overlay(path, backing):
+    """En-tête QCOW2 minimal pointant vers une image de base."""
+    name = backing.encode()
+    path.write_bytes(b"QFI\xfb" + struct.pack(">IQI", 3, 512, len(name)) + b"\x00" * 492 + name)
+    return str(path)
+
+
+def test_running_qemu_vm_and_backing_files_are_kept(tmp_path):
+    """✅ Teste qu'une VM QEMU au premier plan (journal "en cours") garde ses fichiers, comme les images de base."""
+    binary = tmp_path / "qemu-system-x86_64"
+    binary.symlink_to(sys.executable)
+    disk = make_file(tmp_path / "vm1.qcow2")
+    process = subprocess.Popen([str(binary), "-c", "import time; time.sleep(30)",
+                                "-drive", "file=vm1.qcow2,format=qcow2,if=virtio"], cwd=tmp_path)
+    try:
+        with open(pid_file("vm1"), "w") as file:
+            file.write(str(process.pid))
+        journal = StepJournal("QEMU", "vm1")
+        journal.reset()
+        journal.complete("disk", disk, artifacts=[disk])  # cmd-00 (QEMU) tourne encore : journal "en cours"
+        base = make_file(tmp_path / "gold.qcow2")
+        register_file(base, "QEMU", "gone")
+        clone = make_overlay(tmp_path / "clone.qcow2", base)
+        register_file(clone, "QEMU", "clone")
+
+        live = asyncio.run(live_state({}, AsyncExecutor(on_output=None)))
+        assert live["qemu"] == {"vm1": {disk}}
+        assert backing_chain(clone) == [base]
+        assert orphan_names(load_registry(), live) == {("file", "clone.qcow2")}
+    finally:
+        process.kill()
+        process.wait()
+
+    # VM arrêtée : son disque prêt reste le système installé, le clone sans journal est collecté
+    live = asyncio.run(live_state({}, AsyncExecutor(on_output=None)))
+    assert orphan_names(load_registry(), live) == {("file", "clone.qcow2")}
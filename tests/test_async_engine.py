@@ -0,0 +1,93 @@
+import asyncio
+import subprocess
+import sys
+import time
+import pytest
+
+import async_engine
+import executor
+from async_engine import AsyncExecutor, command_resources
+
+
+def test_run_streams_output_and_records(tmp_path):
+    """✅ Teste que les sorties sont diffusées ligne par ligne et journalisées."""
+    journal = tmp_path / "journal.jsonl"
+    executor.configure(str(journal))
+    lines = []
+    engine = AsyncExecutor(on_output=lambda label, stream, line: lines.append((label, stream, line)))
+    cmd = [sys.executable, "-c", "import sys; print('un'); print('deux'); print('err', file=sys.stderr)"]
+
+    result = asyncio.run(engine.run(cmd, label="vm1"))
+
+    assert result.returncode == 0
+    assert result.stdout == "un\ndeux"
+    assert ("vm1", "stdout", "un") in lines
+    assert ("vm1", "stderr", "err") in lines
+    entry = next(executor.read_journal(str(journal)))
+    assert entry["returncode"] == 0
+    assert entry["stdout_bytes"] == len("un\ndeux")
+
+
+def test_run_streams_long_progress_lines():
+    """✅ Teste une sortie de plus de 64 Kio sans `\\n` (barre de progression réécrite avec `\\r`)."""
+    lines = []
+    engine = AsyncExecutor(on_output=lambda label, stream, line: lines.append(line))
+    script = "import sys; sys.stdout.write('x' * 200000 + '\\r' + ''.join(f'({i}/100%)\\r' for i in range(100)) + 'fin')"
+
+    result = asyncio.run(engine.run([sys.executable, "-c", script], check=True))
+
+    assert lines == ["x" * 200000] + [f"({i}/100%)" for i in range(100)] + ["fin"]
+    assert result.stdout == "\n".join(lines)
+
+
+def test_pump_joins_crlf_split_across_chunks(monkeypatch):
+    """✅ Teste qu'un `\\r\\n` coupé entre deux blocs lus ne donne qu'une fin de ligne."""
+    monkeypatch.setattr(async_engine, "READ_CHUNK", 2)
+    lines = []
+
+    async def scenario():
+        stream = asyncio.StreamReader()
+        stream.feed_data(b"a\r\nbc\r\n\xc3\xa9\r")
+        stream.feed_eof()
+        await AsyncExecutor(on_output=None)._pump(stream, "stdout", None, lines)
+
+    asyncio.run(scenario())
+    assert lines == ["a", "bc", "é"]
+
+
+def test_run_check_raises():
+    """❌ Teste qu'un code retour non nul lève une erreur avec check=True."""
+    engine = AsyncExecutor(on_output=None)
+    with pytest.raises(subprocess.CalledProcessError):
+        asyncio.run(engine.run([sys.executable, "-c", "raise SystemExit(3)"], check=True))
+
+
+def test_resource_limits_cap_concurrency():
+    """✅ Teste que les sémaphores par ressource bornent la concurrence."""
+    engine = AsyncExecutor(limits={"VBoxManage": 1, "disk": 2})
+    active = {"VBoxManage": 0, "disk": 0}
+    peak = {"VBoxManage": 0, "disk": 0}
+
+    def work(kind):
+        active[kind] += 1
+        peak[kind] = max(peak[kind], active[kind])
+        time.sleep(0.02)
+        active[kind] -= 1
+
+    async def scenario():
+        await asyncio.gather(
+            *[engine.call(work, "VBoxManage", resources=["VBoxManage"]) for _ in range(4)],
+            *[engine.call(work, "disk", resources=["disk:a.qcow2"]) for _ in range(4)],
+        )
+
+    asyncio.run(scenario())
+    assert peak["VBoxManage"] == 1
+    assert peak["disk"] == 2
+
+
+def test_command_resources():
+    """✅ Teste la déduction des ressources à partir de la commande."""
+    assert command_resources(["/usr/bin/VBoxManage", "list", "vms"]) == ["VBoxManage"]
+    assert command_resources(["C:\\Program Files\\VMware\\vmrun.exe", "start"]) == ["vmrun"]
+    assert command_resources(["docker", "run"]) == ["docker"]
+    assert command_resources(["ip", "link"]) == []
@@ -0,0 +1,179 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from checkpoint import StepJournal, rollback
+from monitor import pid_file
+from vm_manager import create_vm
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Exécute le test dans un dossier temporaire (les disques sont créés dans le dossier courant)."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_run_skips_completed_steps(workdir):
+    """✅ Teste qu'une étape terminée est sautée tant que son artefact est intact."""
+    calls = []
+
+    def make_disk(name):
+        calls.append(name)
+        (workdir / f"{name}.qcow2").write_bytes(b"qcow2")
+        return f"{name}.qcow2"
+
+    journal = StepJournal("QEMU", "vm1")
+    assert journal.run("disk", make_disk, "vm1", artifact=True) == "vm1.qcow2"
+    assert journal.run("cmd-00", lambda: True) is True
+
+    resumed = StepJournal("QEMU", "vm1")
+    assert resumed.run("disk", make_disk, "vm1", artifact=True) == "vm1.qcow2"
+    assert calls == ["vm1"]
+
+    # Artefact modifié : l'étape et toutes les suivantes sont rejouées.
+    (workdir / "vm1.qcow2").write_bytes(b"corrompu")
+    resumed = StepJournal("QEMU", "vm1")
+    resumed.run("disk", make_disk, "vm1", artifact=True)
+    assert calls == ["vm1", "vm1"]
+    assert resumed.should_run("cmd-00") is True
+
+
+def test_create_vm_resumes_at_failed_step(workdir, mocker):
+    """✅ Teste qu'une création interrompue reprend à l'étape en échec, sans reconversion ni menu."""
+    paths = {"VirtualBox": "VBoxManage"}
+    mock_exists = mocker.patch("vm_manager.vm_exists", return_value=False)
+
+    def make_disk(name):
+        (workdir / f"{name}.qcow2").write_bytes(b"qcow2")
+        return f"{name}.qcow2"
+
+    def convert(source, target, fmt):
+        (workdir / target).write_bytes(b"vdi")
+        return target
+
+    mock_disk = mocker.patch("vm_manager.create_qcow2_disk", side_effect=make_disk)
+    mock_convert = mocker.patch("vm_manager.convert_disk_format", side_effect=convert)
+    executed = []
+
+    def fake_run(cmd, **kwargs):
+        executed.append(cmd)
+        if "storageattach" in cmd and len(executed) < 7:
+            raise subprocess.CalledProcessError(1, cmd)
+        return subprocess.CompletedProcess(cmd, 0)
+
+    mocker.patch("executor.run", side_effect=fake_run)
+
+    with pytest.raises(subprocess.CalledProcessError):
+        create_vm("VirtualBox", "TestVM", "x86_64", 2048, "debian.iso", paths)
+    assert StepJournal("VirtualBox", "TestVM").state["failed"] == "cmd-05"
+
+    failed_at = len(executed)
+    mock_exists.reset_mock()
+    create_vm("VirtualBox", "TestVM", "x86_64", 2048, "debian.iso", paths)
+
+    mock_exists.assert_not_called()
+    assert mock_disk.call_count == 1
+    assert mock_convert.call_count == 1
+    assert executed[failed_at][1] == "storageattach"
+    assert "createvm" not in [cmd[1] for cmd in executed[failed_at:]]
+    assert StepJournal("VirtualBox", "TestVM").state["status"] == "completed"
+
+
+
+def test_resume_after_disk_change_recreates_virtualbox_vm(workdir, mocker):
+    """✅ Teste qu'un disque modifié entre deux exécutions supprime la VM déjà enregistrée (disques détachés) avant `createvm`."""
+    paths = {"VirtualBox": "VBoxManage"}
+    mocker.patch("vm_manager.vm_exists", return_value=False)
+
+    def make_disk(name):
+        (workdir / f"{name}.qcow2").write_bytes(b"qcow2")
+        return f"{name}.qcow2"
+
+    def convert(source, target, fmt):
+        (workdir / target).write_bytes(b"vdi")
+        return target
+
+    mock_disk = mocker.patch("vm_manager.create_qcow2_disk", side_effect=make_disk)
+    mocker.patch("vm_manager.convert_disk_format", side_effect=convert)
+    executed = []
+
+    def fake_run(cmd, **kwargs):
+        executed.append(cmd)
+        if "--nic1" in cmd and len(executed) < 20:
+            raise subprocess.CalledProcessError(1, cmd)
+        return subprocess.CompletedProcess(cmd, 0)
+
+    mocker.patch("executor.run", side_effect=fake_run)
+
+    with pytest.raises(subprocess.CalledProcessError):
+        create_vm("VirtualBox", "TestVM", "x86_64", 2048, "debian.iso", paths)
+    (workdir / "TestVM.qcow2").write_bytes(b"autre contenu")
+    failed_at = len(executed)
+    create_vm("VirtualBox", "TestVM", "x86_64", 2048, "debian.iso", paths)
+
+    replayed = executed[failed_at:]
+    assert mock_disk.call_count == 2
+    assert [cmd[1] for cmd in replayed[:4]] == ["storageattach", "storageattach", "unregistervm", "createvm"]
+    assert replayed[0][-2:] == ["--medium", "none"] and replayed[2][-1] == "--delete"
+    assert StepJournal("VirtualBox", "TestVM").state["status"] == "completed"
+
+
+def test_disk_profile_change_recreates_disk(workdir, mocker):
+    """✅ Teste qu'un changement de profil de disque entre deux exécutions recrée le disque à la reprise."""
+    mocker.patch("vm_manager.vm_exists", return_value=False)
+
+    def make_disk(name, profile=None):
+        (workdir / f"{name}.qcow2").write_bytes(b"qcow2")
+        return f"{name}.qcow2"
+
+    mock_disk = mocker.patch("vm_manager.create_qcow2_disk", side_effect=make_disk)
+    mocker.patch("executor.run", side_effect=[subprocess.CalledProcessError(1, "qemu"), subprocess.CompletedProcess([], 0)])
+    paths = {"QEMU": "qemu-system-x86_64"}
+
+    with pytest.raises(subprocess.CalledProcessError):
+        create_vm("QEMU", "TestVM", "x86_64", 2048, "debian.iso", paths, disk_profile="thin")
+    create_vm("QEMU", "TestVM", "x86_64", 2048, "debian.iso", paths, disk_profile="performance")
+
+    assert [call.kwargs["profile"] for call in mock_disk.call_args_list] == ["thin", "performance"]
+    assert StepJournal("QEMU", "TestVM").state["status"] == "completed"
+
+
+def test_rollback_removes_vm_and_artifacts(workdir, mocker):
+    """✅ Teste que le rollback désenregistre la VM, supprime les artefacts et le journal."""
+    (workdir / "TestVM.qcow2").write_bytes(b"qcow2")
+    journal = StepJournal("VirtualBox", "TestVM")
+    journal.complete("disk", "TestVM.qcow2", ["TestVM.qcow2"])
+    journal.complete("cmd-00", True, fingerprint=["VBoxManage", "createvm"])
+    mock_run = mocker.patch("executor.run")
+
+    assert rollback("VirtualBox", "TestVM", {"VirtualBox": "VBoxManage"}) is True
+
+    mock_run.assert_called_once_with(["VBoxManage", "unregistervm", "TestVM", "--delete"], check=True)
+    assert not (workdir / "TestVM.qcow2").exists()
+    assert StepJournal("VirtualBox", "TestVM").steps == {}
+
+
+def test_rollback_stops_running_qemu_vm(workdir):
+    """✅ Teste que le rollback d'une VM QEMU arrête son processus avant de supprimer son disque."""
+    binary = workdir / "qemu-system-x86_64"
+    binary.symlink_to(sys.executable)
+    process = subprocess.Popen([str(binary), "-c", "import time; time.sleep(30)"])
+    with open(pid_file("vm1"), "w") as file:
+        file.write(str(process.pid))
+    (workdir / "vm1.qcow2").write_bytes(b"qcow2")
+    journal = StepJournal("QEMU", "vm1")
+    journal.complete("disk", "vm1.qcow2", ["vm1.qcow2"])
+    journal.complete("cmd-00", True)
+
+    try:
+        assert rollback("QEMU", "vm1", {"QEMU": "qemu-system-x86_64"}) is True
+        assert process.wait(timeout=5) is not None
+    finally:
+        process.kill()
+        process.wait()
+
+    assert not (workdir / "vm1.qcow2").exists()
+    assert not os.path.exists(pid_file("vm1"))
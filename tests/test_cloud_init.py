@@ -0,0 +1,76 @@
+import json
+import struct
+import pytest
+
+import cloud_init
+from cloud_init import build_iso, create_seed_image, render_seed_files
+from vm_manager import create_vm
+
+SECTOR = 2048
+
+
+def read_root(image, descriptor_sector, encoding):
+    """Lit les fichiers de la racine d'un arbre ISO9660 (primaire ou Joliet)."""
+    descriptor = image[descriptor_sector * SECTOR:(descriptor_sector + 1) * SECTOR]
+    assert descriptor[1:6] == b"CD001"
+    root_sector, root_size = struct.unpack_from("<I", descriptor, 158)[0], struct.unpack_from("<I", descriptor, 166)[0]
+    directory = image[root_sector * SECTOR:root_sector * SECTOR + root_size]
+    files, offset = {}, 0
+    while offset < len(directory) and directory[offset]:
+        length = directory[offset]
+        sector, size = struct.unpack_from("<I", directory, offset + 2)[0], struct.unpack_from("<I", directory, offset + 10)[0]
+        name_length = directory[offset + 32]
+        identifier = directory[offset + 33:offset + 33 + name_length]
+        if identifier not in (b"\x00", b"\x01"):
+            files[identifier.decode(encoding)] = image[sector * SECTOR:sector * SECTOR + size]
+        offset += length
+    return descriptor, files
+
+
+def test_build_iso_joliet_tree():
+    """✅ Teste que le seed contient le label cidata et les fichiers NoCloud sous leurs vrais noms."""
+    files = render_seed_files("vm1", {"users": [{"name": "ops"}]}, network_config={"version": 2})
+    image = build_iso(files)
+
+    pvd, primary = read_root(image, 16, "ascii")
+    svd, joliet = read_root(image, 17, "utf-16-be")
+
+    assert pvd[40:46] == b"cidata"
+    assert svd[88:91] == b"%/E"
+    assert svd[40:52].decode("utf-16-be") == "cidata"
+    assert set(primary) == {"METADATA.;1", "NETWORKC.;1", "USERDATA.;1"}
+    assert joliet["user-data"].startswith(b"#cloud-config\n")
+    assert json.loads(joliet["user-data"].split(b"\n", 1)[1]) == {"users": [{"name": "ops"}]}
+    assert json.loads(joliet["meta-data"]) == {"instance-id": "vm1", "local-hostname": "vm1"}
+    assert image[18 * SECTOR] == 0xFF
+    assert len(image) % SECTOR == 0
+
+
+def test_seed_image_cached_by_content(mocker):
+    """✅ Teste qu'un seed identique n'est construit qu'une seule fois."""
+    spy = mocker.spy(cloud_init, "build_iso")
+
+    first = create_seed_image("vm1", "#cloud-config\n")
+    second = create_seed_image("vm1", "#cloud-config\n")
+    other = create_seed_image("vm2", "#cloud-config\n")
+
+    assert first == second != other
+    assert spy.call_count == 2
+
+
+def test_create_vm_qemu_boots_cloud_image(tmp_path, monkeypatch, mocker):
+    """✅ Teste qu'une VM QEMU avec cloud-init démarre sur un overlay de l'image cloud avec le seed en CD."""
+    monkeypatch.chdir(tmp_path)
+    mock_run = mocker.patch("executor.run")
+    mock_disk = mocker.patch("vm_manager.create_qcow2_disk")
+
+    create_vm("QEMU", "cloud-vm", "x86_64", 1024, "unused.iso", {"QEMU": "qemu-system-x86_64"},
+              cloud_init={"image": "images/debian-cloud.qcow2", "user_data": {"packages": ["nginx"]}})
+
+    mock_disk.assert_not_called()
+    overlay_cmd = mock_run.call_args_list[0].args[0]
+    assert overlay_cmd[:6] == ["qemu-img", "create", "-f", "qcow2", "-b", str(tmp_path / "images/debian-cloud.qcow2")]
+    qemu_cmd = mock_run.call_args_list[-1].args[0]
+    assert qemu_cmd[qemu_cmd.index("-boot") + 1] == "c"
+    seed = qemu_cmd[qemu_cmd.index("-cdrom") + 1]
+    assert seed.endswith(".iso") and "seeds" in seed
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+import pytest
+
+from daemon import DaemonClient, ProvisioningDaemon
+
+
+@pytest.fixture
+def socket_dir():
+    """Dossier court pour le socket Unix (limite de ~108 caractères)."""
+    path = tempfile.mkdtemp(prefix="vmd-", dir="/tmp")
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def start_daemon(daemon):
+    """Lance le démon dans une boucle asyncio dédiée (thread) et attend que le socket soit prêt."""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    async def main():
+        await daemon.start()
+        ready.set()
+        await daemon._stopped.wait()
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(main(),), daemon=True)
+    thread.start()
+    assert ready.wait(5)
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(daemon.stop(), loop).result(5)
+        thread.join(5)
+        loop.close()
+
+    return stop
+
+
+def wait_status(client, job_id, states, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.status(job_id)
+        if job["status"] in states:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Le travail {job_id} n'a pas atteint {states}")
+
+
+def test_submit_and_status(socket_dir):
+    """✅ Teste la soumission de travaux et le suivi de leur état via le socket Unix."""
+    async def runner(job):
+        return job.spec["vm_name"]
+
+    daemon = ProvisioningDaemon(os.path.join(socket_dir, "d.sock"), paths={"QEMU": "qemu"}, runner=runner)
+    stop = start_daemon(daemon)
+    try:
+        client = DaemonClient(daemon.socket_path)
+        jobs = client.submit([{"hypervisor": "QEMU", "vm_name": f"vm-{i}"} for i in range(20)])
+        assert len(jobs) == 20
+
+        done = wait_status(client, jobs[-1]["id"], {"succeeded"})
+        assert done["result"] == "vm-19"
+        assert client.health()["hypervisors"] == ["QEMU"]
+        with pytest.raises(RuntimeError):
+            client.status("inconnu")
+    finally:
+        stop()
+
+
+def test_priority_limits_and_cancel(socket_dir):
+    """✅ Teste la priorité, la limite par hyperviseur et l'annulation."""
+    order = []
+    running = {"VirtualBox": 0}
+    peak = {"VirtualBox": 0}
+    release = threading.Event()
+
+    async def runner(job):
+        running["VirtualBox"] += 1
+        peak["VirtualBox"] = max(peak["VirtualBox"], running["VirtualBox"])
+        order.append(job.spec["vm_name"])
+        try:
+            while not release.is_set():
+                await asyncio.sleep(0.01)
+        finally:
+            running["VirtualBox"] -= 1
+
+    daemon = ProvisioningDaemon(os.path.join(socket_dir, "d.sock"), paths={"VirtualBox": "VBoxManage"},
+                                workers=1, limits={"VirtualBox": 1}, runner=runner)
+    stop = start_daemon(daemon)
+    try:
+        client = DaemonClient(daemon.socket_path)
+        first = client.submit({"hypervisor": "VirtualBox", "vm_name": "first"})[0]
+        wait_status(client, first["id"], {"running"})
+
+        low = client.submit({"hypervisor": "VirtualBox", "vm_name": "low", "priority": 200})[0]
+        high = client.submit({"hypervisor": "VirtualBox", "vm_name": "high", "priority": 1})[0]
+        dropped = client.submit({"hypervisor": "VirtualBox", "vm_name": "dropped"})[0]
+        assert client.cancel(dropped["id"])["status"] == "cancelled"
+
+        cancelled = client.cancel(first["id"])
+        wait_status(client, first["id"], {"cancelled"})
+        wait_status(client, high["id"], {"running"})
+        release.set()
+        wait_status(client, low["id"], {"succeeded"})
+
+        assert order == ["first", "high", "low"]
+        assert peak["VirtualBox"] == 1
+        assert cancelled["id"] == first["id"]
+    finally:
+        stop()
+
+
+def test_saturated_hypervisor_does_not_block_others(socket_dir):
+    """✅ Teste qu'un hyperviseur à sa limite n'accapare pas les workers : QEMU passe malgré la file VirtualBox."""
+    release = threading.Event()
+    started = []
+
+    async def runner(job):
+        started.append(job.spec["vm_name"])
+        if job.resource == "VirtualBox":
+            while not release.is_set():
+                await asyncio.sleep(0.01)
+        return job.spec["vm_name"]
+
+    daemon = ProvisioningDaemon(os.path.join(socket_dir, "d.sock"), paths={"VirtualBox": "VBoxManage", "QEMU": "qemu"},
+                                workers=3, limits={"VirtualBox": 1, "QEMU": 2}, runner=runner)
+    stop = start_daemon(daemon)
+    try:
+        client = DaemonClient(daemon.socket_path)
+        boxes = client.submit([{"hypervisor": "VirtualBox", "vm_name": f"vbox-{i}", "priority": 1} for i in range(10)])
+        wait_status(client, boxes[0]["id"], {"running"})
+        qemu = client.submit([{"hypervisor": "QEMU", "vm_name": f"qemu-{i}", "priority": 500} for i in range(4)])
+
+        for job in qemu:
+            assert wait_status(client, job["id"], {"succeeded"})["result"] == job["spec"]["vm_name"]
+        assert [client.status(job["id"])["status"] for job in boxes[1:]] == ["queued"] * 9
+        assert started.count("vbox-0") == 1 and len(started) == 5
+
+        release.set()
+        wait_status(client, boxes[-1]["id"], {"succeeded"})
+        assert started[5:] == [f"vbox-{i}" for i in range(1, 10)]
+    finally:
+        stop()
+
+
+def test_cancel_right_after_dequeue_keeps_worker_alive(socket_dir):
+    """✅ Teste l'annulation d'un travail juste retiré de la file : il ne s'exécute pas et le worker continue."""
+    started = []
+
+    async def runner(job):
+        started.append(job.spec["vm_name"])
+        await asyncio.sleep(0.01)
+        return job.spec["vm_name"]
+
+    async def main():
+        daemon = ProvisioningDaemon(os.path.join(socket_dir, "d.sock"), paths={"QEMU": "qemu"}, workers=1, runner=runner)
+        await daemon.start()
+        try:
+            first = daemon.submit({"hypervisor": "QEMU", "vm_name": "first"})
+            while first.status == "queued":
+                await asyncio.sleep(0)
+            assert first.task is not None and not started  # retiré de la file, pas encore démarré
+            daemon.cancel(first.id)
+            second = daemon.submit({"hypervisor": "QEMU", "vm_name": "second"})
+            for _ in range(200):
+                if second.status == "succeeded":
+                    break
+                await asyncio.sleep(0.01)
+            return first.status, second.status
+        finally:
+            await daemon.stop()
+
+    assert asyncio.run(main()) == ("cancelled", "succeeded")
+    assert started == ["second"]
+
+
+def test_warm_inventory_rejects_existing_vm(socket_dir, mocker):
+    """❌ Teste que l'inventaire chargé au démarrage refuse une VM déjà existante sans relancer de commande."""
+    mocker.patch("utils.list_vms", return_value=["Existing"])
+    daemon = ProvisioningDaemon(os.path.join(socket_dir, "d.sock"), paths={"VirtualBox": "VBoxManage"})
+    daemon.warm_up()
+    mock_create = mocker.patch("vm_manager.create_vm_async")
+    stop = start_daemon(daemon)
+    try:
+        client = DaemonClient(daemon.socket_path)
+        job = client.submit({"hypervisor": "VirtualBox", "vm_name": "Existing"})[0]
+        failed = wait_status(client, job["id"], {"failed"})
+        assert "existe déjà" in failed["error"]
+        mock_create.assert_not_called()
+    finally:
+        stop()
@@ -0,0 +1,74 @@
+import pytest
+
+import utils
+from disk_cache import ConversionCache, parse_size
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ConversionCache(root=str(tmp_path / "cache"), max_bytes=1024)
+
+
+def test_parse_size():
+    """✅ Teste la conversion des tailles lisibles en octets."""
+    assert parse_size("512M") == 512 * 1024 ** 2
+    assert parse_size("20GiB") == 20 * 1024 ** 3
+    assert parse_size(1024) == 1024
+    assert parse_size("1.5K") == 1536
+
+
+def test_fetch_miss_then_hit(tmp_path, cache):
+    """✅ Teste qu'un disque converti et stocké est ensuite servi par le cache."""
+    source = tmp_path / "vm.qcow2"
+    source.write_bytes(b"qcow2-data")
+    converted = tmp_path / "vm.vdi"
+    converted.write_bytes(b"vdi-data")
+
+    assert cache.fetch(str(source), "vdi", str(tmp_path / "out.vdi")) is False
+    assert cache.store(str(source), "vdi", str(converted)) is True
+    assert cache.fetch(str(source), "vdi", str(tmp_path / "out.vdi")) is True
+    assert (tmp_path / "out.vdi").read_bytes() == b"vdi-data"
+
+    # Même contenu ailleurs : même empreinte, donc succès ; autre format : échec.
+    copy = tmp_path / "copy.qcow2"
+    copy.write_bytes(b"qcow2-data")
+    assert cache.fetch(str(copy), "vdi", str(tmp_path / "out2.vdi")) is True
+    assert cache.fetch(str(copy), "vmdk", str(tmp_path / "out.vmdk")) is False
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 1)
+
+
+def test_lru_eviction(tmp_path, cache):
+    """✅ Teste l'éviction LRU quand la taille maximale est dépassée."""
+    for i, name in enumerate(["a", "b", "c"]):
+        source = tmp_path / f"{name}.qcow2"
+        source.write_bytes(name.encode())
+        converted = tmp_path / f"{name}.vdi"
+        converted.write_bytes(b"x" * 400)
+        cache.store(str(source), "vdi", str(converted))
+        if name == "b":
+            # "a" est relu : "b" devient la plus ancienne entrée.
+            cache.fetch(str(tmp_path / "a.qcow2"), "vdi", str(tmp_path / "a-out.vdi"))
+
+    assert cache.fetch(str(tmp_path / "b.qcow2"), "vdi", str(tmp_path / "b-out.vdi")) is False
+    assert cache.fetch(str(tmp_path / "a.qcow2"), "vdi", str(tmp_path / "a-out.vdi")) is True
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] <= 1024
+
+
+def test_convert_disk_format_uses_cache(tmp_path, mocker):
+    """✅ Teste que convert_disk_format ne relance pas qemu-img pour une conversion en cache."""
+    source = tmp_path / "vm.qcow2"
+    source.write_bytes(b"qcow2-data")
+
+    def fake_convert(cmd, check):
+        (tmp_path / cmd[-1].rsplit("/", 1)[-1]).write_bytes(b"converted")
+
+    mock_run = mocker.patch("executor.run", side_effect=fake_convert)
+
+    assert utils.convert_disk_format(str(source), str(tmp_path / "first.vdi"), "vdi") == str(tmp_path / "first.vdi")
+    assert utils.convert_disk_format(str(source), str(tmp_path / "second.vdi"), "vdi") == str(tmp_path / "second.vdi")
+
+    assert mock_run.call_count == 1
+    assert (tmp_path / "second.vdi").read_bytes() == b"converted"
@@ -0,0 +1,65 @@
+import errno
+import os
+import pytest
+
+import disk_clone
+from disk_clone import clone_file, data_extents
+
+MIB = 1024 * 1024
+
+
+@pytest.fixture
+def sparse_file(tmp_path):
+    """Fichier creux de 64 Mo contenant deux zones de données de 1 Mo."""
+    path = tmp_path / "disk.img"
+    with open(path, "wb") as file:
+        file.write(b"A" * MIB)
+        file.seek(32 * MIB)
+        file.write(b"B" * MIB)
+        file.truncate(64 * MIB)
+    return path
+
+
+def supports_holes(path):
+    with open(path, "rb") as file:
+        return hasattr(os, "SEEK_DATA") and sum(length for _, length in data_extents(file.fileno(), 64 * MIB)) < 64 * MIB
+
+
+def test_clone_preserves_content_and_holes(tmp_path, sparse_file):
+    """✅ Teste le clonage d'un fichier creux : contenu identique, trous conservés."""
+    target = tmp_path / "clone.img"
+
+    result = clone_file(str(sparse_file), str(target))
+
+    assert result.size == 64 * MIB
+    assert os.path.getsize(target) == 64 * MIB
+    assert target.read_bytes() == sparse_file.read_bytes()
+    if result.method == "reflink":
+        assert result.bytes_copied == 0
+    elif supports_holes(sparse_file):
+        assert result.bytes_copied < 64 * MIB
+        assert os.stat(target).st_blocks * 512 < 64 * MIB
+
+
+def test_clone_falls_back_without_reflink_and_copy_file_range(tmp_path, sparse_file, mocker):
+    """✅ Teste le repli sur sendfile quand reflink et copy_file_range sont indisponibles."""
+    mocker.patch("disk_clone._reflink", return_value=False)
+    mocker.patch("os.copy_file_range", side_effect=OSError(errno.EXDEV, "cross-device"), create=True)
+    target = tmp_path / "clone.img"
+
+    result = clone_file(str(sparse_file), str(target))
+
+    assert result.method in ("sendfile", "read-write")
+    assert target.read_bytes() == sparse_file.read_bytes()
+
+
+def test_clone_read_write_fallback(tmp_path, sparse_file, mocker):
+    """✅ Teste le dernier recours lecture/écriture."""
+    mocker.patch("disk_clone._reflink", return_value=False)
+    mocker.patch.object(disk_clone, "_COPY_METHODS", [("read-write", disk_clone._read_write, True)])
+    target = tmp_path / "clone.img"
+
+    result = clone_file(str(sparse_file), str(target))
+
+    assert result.method == "read-write"
+    assert target.read_bytes() == sparse_file.read_bytes()
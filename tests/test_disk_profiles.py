@@ -0,0 +1,73 @@
+import struct
+
+import pytest
+
+from disk_profiles import benchmark_profiles, get_profile, l2_cache_size, qemu_img_options, read_qcow2_geometry
+
+
+def write_qcow2_header(path, size, cluster_bits=16):
+    path.write_bytes(b"QFI\xfb" + struct.pack(">IQI", 3, 0, 0) + struct.pack(">IQ", cluster_bits, size))
+    return str(path)
+
+
+def test_qemu_img_options():
+    """✅ Teste le rendu des options qemu-img : rien sans profil, options du profil ou d'un dictionnaire."""
+    assert qemu_img_options(None) == []
+    assert qemu_img_options("default") == []
+    assert qemu_img_options("metadata") == ["-o", "preallocation=metadata,lazy_refcounts=on"]
+    assert qemu_img_options({"cluster_size": "1M", "extended_l2": True}) == ["-o", "cluster_size=1048576,extended_l2=on"]
+
+
+@pytest.mark.parametrize("profile, message", [
+    ("turbo", "Profil de disque inconnu"),
+    ({"cluster_size": "96K"}, "cluster_size invalide"),
+    ({"cluster_size": "4M"}, "cluster_size invalide"),
+    ({"preallocation": "sparse"}, "preallocation invalide"),
+    ({"cluster_size": "4K", "extended_l2": True}, "extended_l2"),
+    ({"compression": "zstd"}, "Options de disque inconnues"),
+])
+def test_invalid_profiles(profile, message):
+    """❌ Teste le refus des profils et options invalides."""
+    with pytest.raises(ValueError, match=message):
+        get_profile(profile)
+
+
+def test_l2_cache_covers_the_disk(tmp_path):
+    """✅ Teste le cache L2 "auto" : géométrie lue dans l'en-tête du disque, sinon déduite du profil."""
+    disk = write_qcow2_header(tmp_path / "vm.qcow2", 100 * 1024 ** 3, cluster_bits=21)
+
+    assert read_qcow2_geometry(disk) == (100 * 1024 ** 3, 2 * 1024 ** 2)
+    assert read_qcow2_geometry(str(tmp_path / "absent.qcow2")) is None
+    # 100 Gio en clusters de 2 Mio : 51200 entrées de 8 octets, arrondies à un cluster
+    assert l2_cache_size("thin", disk) == 2 * 1024 ** 2
+    # Sans disque : 10 Gio, clusters de 128 Kio et entrées étendues de 16 octets
+    assert l2_cache_size("performance") == 81920 * 16
+    assert l2_cache_size({"l2_cache_size": "8M"}, disk) == 8 * 1024 ** 2
+    assert l2_cache_size("default", disk) is None
+    assert l2_cache_size(None) is None
+
+
+def test_benchmark_profiles(tmp_path, mocker):
+    """✅ Teste le micro-benchmark : une image par passage et par profil, mesurée puis supprimée."""
+    created = []
+
+    def fake_run(cmd, **kwargs):
+        if cmd[:2] == ["qemu-img", "create"]:
+            path = cmd[-2]
+            with open(path, "wb") as image:
+                image.write(b"QFI\xfb")
+                if "preallocation=falloc" in cmd[-3]:
+                    image.truncate(1024 ** 2)
+            created.append(path)
+
+    mocker.patch("executor.run", side_effect=fake_run)
+    mocker.patch("disk_profiles.shutil.which", return_value=None)
+
+    results = benchmark_profiles(["default", "performance"], size="1M", runs=2, directory=str(tmp_path))
+
+    assert len(created) == 4
+    assert len(results["default"]["create"]) == 2
+    assert results["default"]["apparent"] == 4
+    assert results["performance"]["apparent"] == 1024 ** 2
+    assert results["default"]["write"] is None
+    assert list(tmp_path.iterdir()) == []
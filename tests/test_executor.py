@@ -0,0 +1,73 @@
+import json
+import subprocess
+import pytest
+
+import executor
+
+
+def test_run_records_journal_entry(tmp_path, mocker):
+    """✅ Teste qu'une commande est bien enregistrée dans le journal."""
+    journal = tmp_path / "journal.jsonl"
+    executor.configure(str(journal))
+    mocker.patch("subprocess.run", return_value=subprocess.CompletedProcess(["VBoxManage", "list", "vms"], 0, '"TestVM" {UUID}\n', ""))
+
+    result = executor.run(["VBoxManage", "list", "vms"], capture_output=True, text=True)
+
+    assert result.stdout == '"TestVM" {UUID}\n'
+    entry = json.loads(journal.read_text().strip())
+    assert entry["argv"] == ["VBoxManage", "list", "vms"]
+    assert entry["returncode"] == 0
+    assert entry["stdout_bytes"] == len('"TestVM" {UUID}\n')
+    assert entry["duration"] >= 0
+
+
+def test_run_records_failures(tmp_path, mocker):
+    """❌ Teste que les échecs (code retour et commande introuvable) sont journalisés."""
+    journal = tmp_path / "journal.jsonl"
+    executor.configure(str(journal))
+    mocker.patch("subprocess.run", side_effect=subprocess.CalledProcessError(2, ["qemu-img"], stderr="boom"))
+    with pytest.raises(subprocess.CalledProcessError):
+        executor.run(["qemu-img", "info"], check=True)
+
+    mocker.patch("subprocess.run", side_effect=FileNotFoundError)
+    with pytest.raises(FileNotFoundError):
+        executor.run(["vmrun", "-v"])
+
+    entries = list(executor.read_journal(str(journal)))
+    assert entries[0]["returncode"] == 2
+    assert entries[1]["error"] == "FileNotFoundError"
+
+
+def test_summarize_slowest_and_repeated(tmp_path):
+    """✅ Teste le résumé : commandes les plus lentes et les plus répétées."""
+    journal = tmp_path / "journal.jsonl"
+    executor.configure(str(journal))
+    executor.record(["docker", "info"], 0.5, 0)
+    executor.record(["docker", "info"], 0.25, 0)
+    executor.record(["qemu-img", "convert"], 12.0, 0)
+
+    summary = executor.summarize(str(journal), top=1)
+
+    assert summary["total"] == 3
+    assert summary["slowest"] == [(12.0, "qemu-img convert", 0)]
+    assert summary["most_repeated"] == [(2, 0.75, "docker info")]
+
+
+def test_replay_returns_recorded_output(tmp_path, mocker):
+    """✅ Teste que le mode rejeu renvoie les sorties enregistrées sans exécuter."""
+    journal = tmp_path / "journal.jsonl"
+    executor.configure(str(journal))
+    executor.record(["VBoxManage", "list", "vms"], 0.1, 0, stdout='"TestVM" {UUID}')
+    executor.record(["qemu-img", "create"], 0.1, 1, stderr="failed")
+    mock_run = mocker.patch("subprocess.run")
+
+    executor.enable_replay(str(journal))
+    result = executor.run(["VBoxManage", "list", "vms"], capture_output=True, text=True)
+    assert result.stdout == '"TestVM" {UUID}'
+    assert executor.run(["VBoxManage", "list", "vms"], capture_output=True).stdout == b'"TestVM" {UUID}'
+
+    with pytest.raises(subprocess.CalledProcessError):
+        executor.run(["qemu-img", "create"], check=True)
+    with pytest.raises(executor.ReplayMissError):
+        executor.run(["docker", "info"])
+    mock_run.assert_not_called()
@@ -0,0 +1,180 @@
+import asyncio
+import json
+
+import pytest
+
+import fleet
+import vm_manager
+from fleet import Fleet, FleetConfigError, load_fleet, load_jobs
+
+
+def write_json(path, document):
+    path.write_text(json.dumps(document, indent=2))
+    return path
+
+
+def test_legacy_config_expands_to_specs():
+    """✅ Teste que la configuration historique donne une VM par hyperviseur et un conteneur."""
+    specs = list(Fleet.from_dict({
+        "hypervisors": {"QEMU": {"vm_name": "q", "ram": 1024}, "VirtualBox": {"vm_name": "v"}},
+        "docker": {"container_name": "web"},
+    }).specs())
+
+    assert [(spec["kind"], spec.get("hypervisor"), spec.get("vm_name", spec.get("container_name"))) for spec in specs] == [
+        ("vm", "QEMU", "q"), ("vm", "VirtualBox", "v"), ("docker", None, "web"),
+    ]
+    assert specs[1]["ram"] == 2048 and specs[2]["image_name"] == "ubuntu:latest"
+
+
+def test_generators_profiles_and_overrides():
+    """✅ Teste count, motif de nom, héritage de profils et surcharges par indice."""
+    config = {
+        "profiles": {"small": {"ram": 1024, "dry_run": True}, "web": {"profile": "small", "template": "base"}},
+        "fleet": [
+            {"hypervisor": "QEMU", "vm_name": "web-{index:02d}", "count": 4, "profile": "web",
+             "overrides": {"2": {"ram": 4096}, "3-4": {"template": None}}},
+            {"kind": "docker", "container_name": "cache-{index}", "count": 2, "start": 0, "image_name": "redis:7"},
+        ],
+    }
+
+    specs = list(Fleet.from_dict(config).specs())
+
+    assert [spec.get("vm_name") or spec["container_name"] for spec in specs] == [
+        "web-01", "web-02", "web-03", "web-04", "cache-0", "cache-1",
+    ]
+    assert [spec.get("ram") for spec in specs[:4]] == [1024, 4096, 1024, 1024]
+    assert [spec.get("template") for spec in specs[:4]] == ["base", "base", None, None]
+    assert all(spec["dry_run"] for spec in specs[:4])
+    assert "count" not in specs[0] and "profile" not in specs[0]
+
+
+def test_overrides_expand_their_own_patterns():
+    """✅ Teste qu'un motif apporté par une surcharge est déplié, et qu'un nom littéral surchargé reste tel quel."""
+    config = {"fleet": [{"hypervisor": "QEMU", "vm_name": "x-{index}", "count": 3,
+                         "overrides": {"1": {"vm_name": "y-{index}-{hypervisor}"}, "3": {"vm_name": "solo"}}}]}
+
+    assert [spec["vm_name"] for spec in Fleet.from_dict(config).specs()] == ["y-1-QEMU", "x-2", "solo"]
+
+
+def test_includes_share_profiles(tmp_path):
+    """✅ Teste l'inclusion d'un fichier : ses profils et ses entrées sont repris."""
+    write_json(tmp_path / "base.json", {
+        "profiles": {"small": {"ram": 512}},
+        "fleet": [{"hypervisor": "QEMU", "vm_name": "base-vm", "profile": "small"}],
+    })
+    main = write_json(tmp_path / "fleet.json", {
+        "include": ["base.json"],
+        "fleet": [{"hypervisor": "QEMU", "vm_name": "app-{index}", "count": 2, "profile": "small"}],
+    })
+
+    specs = list(load_fleet(str(main)).specs())
+
+    assert [spec["vm_name"] for spec in specs] == ["base-vm", "app-1", "app-2"]
+    assert {spec["ram"] for spec in specs} == {512}
+
+
+@pytest.mark.parametrize("entry, message", [
+    ({"hypervisor": "Xen"}, "'hypervisor' doit être"),
+    ({"hypervisor": "QEMU", "ram": "2G"}, "'ram' doit être de type int"),
+    ({"hypervisor": "QEMU", "count": 3}, "doit contenir {index}"),
+    ({"hypervisor": "QEMU", "vm_name": "vm-{id}", "count": 2}, "variable(s) inconnue(s)"),
+    ({"vm_name": "vm"}, "'hypervisor' obligatoire"),
+    ({"hypervisor": "QEMU", "profile": "missing"}, "Profil inconnu"),
+    ({"hypervisor": "QEMU", "vm_name": "vm-{index}", "count": 2, "overrides": {"1": {"count": 5}}}, "champ inconnu 'count'"),
+    ({"hypervisor": "QEMU", "vm_name": "vm-{}", "count": 2}, "motif 'vm_name' invalide pour l'indice 1"),
+    ({"hypervisor": "QEMU", "vm_name": "vm-{index:q}", "count": 2}, "motif 'vm_name' invalide pour l'indice 1"),
+    ({"hypervisor": "QEMU", "vm_name": "vm-{index}", "count": 2, "overrides": {"2": {"vm_name": "y-{id}"}}},
+     "variable(s) inconnue(s) dans 'vm_name'"),
+    ({"hypervisor": "QEMU", "disk_profile": "turbo"}, "'disk_profile' doit être un profil de disque"),
+    ({"hypervisor": "QEMU", "disk_profile": {"cluster_size": "3K"}}, "'disk_profile' doit être un profil de disque"),
+])
+def test_invalid_entries(entry, message):
+    """❌ Teste la validation des entrées contre le schéma compilé."""
+    with pytest.raises(FleetConfigError, match=message.replace("(", r"\(").replace(")", r"\)")):
+        list(Fleet.from_dict({"fleet": [entry]}).specs())
+
+
+def test_duplicate_names_rejected():
+    """❌ Teste le refus de deux machines de même nom."""
+    config = {"fleet": [{"hypervisor": "QEMU", "vm_name": "a"}, {"hypervisor": "QEMU", "vm_name": "a"}]}
+
+    with pytest.raises(FleetConfigError, match="déjà défini"):
+        list(Fleet.from_dict(config).specs())
+
+
+def test_streamed_large_fleet(tmp_path, monkeypatch):
+    """✅ Teste la lecture incrémentale d'une grande flotte, avec un tampon minuscule."""
+    monkeypatch.setattr(fleet, "STREAM_CHUNK", 7)
+    entries = [{"hypervisor": "QEMU", "vm_name": f"vm-{index}", "ram": 1000 + index} for index in range(2000)]
+    path = write_json(tmp_path / "fleet.json", {"fleet": entries, "profiles": {"unused": {"ram": 1}}})
+
+    loaded = load_fleet(str(path))
+    specs = loaded.specs()
+    first = next(specs)
+
+    assert "unused" in loaded.raw_profiles
+    assert first["vm_name"] == "vm-0" and first["ram"] == 1000
+    assert sum(1 for _ in specs) == 1999
+
+
+def test_header_skips_fleet_entries_without_decoding(tmp_path, monkeypatch, mocker):
+    """✅ Teste que la lecture de l'en-tête saute le tableau `fleet` (chaînes piégées, tampon minuscule) sans le décoder."""
+    monkeypatch.setattr(fleet, "STREAM_CHUNK", 7)
+    entries = [{"hypervisor": "QEMU", "vm_name": f"vm-{index}", "arch": 'a]b}\\"[{'} for index in range(500)]
+    path = write_json(tmp_path / "fleet.json", {"fleet": entries, "profiles": {"small": {"ram": 512}}})
+    decode = mocker.spy(fleet._JsonStream, "value")
+
+    loaded = Fleet(str(path))
+
+    assert loaded.raw_profiles == {"small": {"ram": 512}}
+    assert decode.call_count == 3  # clés "fleet" et "profiles", valeur de "profiles"
+    assert [spec["arch"] for spec in loaded.specs()] == [entries[0]["arch"]] * 500
+
+
+def test_load_jobs_streams_fleet_files(tmp_path, monkeypatch):
+    """✅ Teste les fichiers soumis au démon : flotte avec inclusion relative au fichier, liste ou travail seul."""
+    configs = tmp_path / "configs"
+    configs.mkdir()
+    write_json(configs / "base.json", {"profiles": {"small": {"ram": 512}}})
+    write_json(configs / "fleet.json", {"include": ["base.json"],
+                                        "fleet": [{"hypervisor": "QEMU", "vm_name": "ci-{index}", "count": 2, "profile": "small"}]})
+    write_json(configs / "jobs.json", {"jobs": [{"hypervisor": "QEMU", "vm_name": "a"}]})
+    write_json(configs / "list.json", [{"kind": "docker"}])
+    write_json(configs / "one.json", {"hypervisor": "QEMU", "vm_name": "solo", "priority": 5})
+    monkeypatch.chdir(tmp_path)
+
+    assert [(spec["vm_name"], spec["ram"]) for spec in load_jobs("configs/fleet.json")] == [("ci-1", 512), ("ci-2", 512)]
+    assert load_jobs("configs/jobs.json") == [{"hypervisor": "QEMU", "vm_name": "a"}]
+    assert load_jobs("configs/list.json") == [{"kind": "docker"}]
+    assert load_jobs("configs/one.json") == [{"hypervisor": "QEMU", "vm_name": "solo", "priority": 5}]
+
+
+def test_invalid_json_reported(tmp_path):
+    """❌ Teste le signalement d'un fichier JSON invalide."""
+    path = tmp_path / "broken.json"
+    path.write_text('{"fleet": [{"hypervisor": "QEMU"} {"hypervisor": "QEMU"}]}')
+
+    with pytest.raises(FleetConfigError, match="JSON invalide"):
+        list(load_fleet(str(path)).specs())
+
+
+def test_provision_batch_bounds_pending_launches(mocker):
+    """✅ Teste que la flotte est lancée avec un nombre borné de créations simultanées."""
+    running = []
+    peak = []
+
+    async def fake_create_vm_async(hypervisor, name, *args, **kwargs):
+        running.append(name)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(name)
+        return name
+
+    mocker.patch("vm_manager.create_vm_async", side_effect=fake_create_vm_async)
+    config = {"fleet": [{"hypervisor": "QEMU", "vm_name": "vm-{index}", "count": 20},
+                        {"hypervisor": "VMware", "vm_name": "skipped"}]}
+
+    results = asyncio.run(vm_manager.provision_batch_async(config, {"QEMU": "qemu"}, max_pending=5))
+
+    assert sorted(results) == sorted(f"vm-{index}" for index in range(1, 21))
+    assert max(peak) <= 5
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+import iso_inspect
+from cloud_init import build_iso
+from iso_inspect import arch_mismatch, identify, inspect_iso, os_hint, qemu_devices
+
+
+@pytest.mark.parametrize("label, expected", [
+    ("Debian 12.9.0 amd64 n", ("debian", "12.9.0", "x86_64")),
+    ("Ubuntu-Server 24.04.1 LTS amd64", ("ubuntu", "24.04.1", "x86_64")),
+    ("Rocky-9-3-x86_64-dvd", ("rocky", "9.3", "x86_64")),
+    ("Fedora-S-dvd-x86_64-40", ("fedora", "40", "x86_64")),
+    ("debian-12.5.0-arm64-netinst", ("debian", "12.5.0", "aarch64")),
+    ("CCCOMA_X64FRE_EN-US_DV9", ("windows", None, "x86_64")),
+    ("cidata", (None, None, None)),
+])
+def test_identify(label, expected):
+    """✅ Teste la reconnaissance de la distribution, de la version et de l'architecture depuis le label."""
+    assert identify(label) == expected
+
+
+@pytest.mark.parametrize("arch, target, expected", [
+    ("aarch64", "x86_64", True),
+    ("x86_64", "aarch64", True),
+    ("i386", "x86_64", False),
+    ("x86_64", "x86_64", False),
+    (None, "x86_64", False),
+    ("aarch64", None, False),
+])
+def test_arch_mismatch(arch, target, expected):
+    """✅ Teste la comparaison de l'architecture de l'ISO avec celle exécutée par l'hyperviseur."""
+    info = iso_inspect.IsoInfo("", "", "", "", "debian", "12", arch, True, ["efi"])
+    assert arch_mismatch(info, target) is expected
+
+
+def test_inspect_large_sparse_iso(tmp_path, make_iso):
+    """✅ Teste l'inspection d'une grande ISO sans la lire : label, plateformes de démarrage et périphériques."""
+    path = make_iso(tmp_path / "install.iso", "Debian 12.9.0 amd64 n", size=8 * 1024 ** 3)
+
+    info = inspect_iso(path)
+
+    assert info.label == "Debian 12.9.0 amd64 n"
+    assert (info.distro, info.release, info.arch) == ("debian", "12.9.0", "x86_64")
+    assert info.bootable and info.platforms == ["bios", "efi"]
+    assert os_hint(info) == "debian-12.9.0"
+    assert qemu_devices(info) == {"disk": "virtio", "nic": "virtio-net-pci"}
+
+
+def test_architecture_from_boot_catalog(tmp_path, make_iso):
+    """✅ Teste que la plateforme BIOS du catalogue sert d'architecture quand le label n'en donne pas."""
+    info = inspect_iso(make_iso(tmp_path / "win.iso", "CCCOMA_FRE_EN-US_DV9", platforms=(0x00,)))
+
+    assert (info.distro, info.arch) == ("windows", "x86_64")
+    assert qemu_devices(info) == {"disk": "ide", "nic": "e1000"}
+
+
+def test_cloud_init_seed_and_non_iso(tmp_path):
+    """✅ Teste un seed cloud-init (système inconnu, non démarrable) et un fichier qui n'est pas une ISO."""
+    seed = tmp_path / "seed.iso"
+    seed.write_bytes(build_iso({"user-data": b"#cloud-config\n", "meta-data": b"{}"}))
+    (tmp_path / "disk.qcow2").write_bytes(b"QFI\xfb" + b"\x00" * 100)
+
+    info = inspect_iso(str(seed))
+
+    assert info.label == "cidata" and info.distro is None and not info.bootable
+    assert os_hint(info) is None and qemu_devices(info) is None
+    assert inspect_iso(str(tmp_path / "disk.qcow2")) is None
+    assert inspect_iso(str(tmp_path / "missing.iso")) is None
+
+
+def test_results_are_cached(tmp_path, mocker, make_iso):
+    """✅ Teste le cache : ISO inchangée jamais rouverte, ISO modifiée relue mais non réanalysée."""
+    path = make_iso(tmp_path / "rocky.iso", "Rocky-9-3-x86_64-dvd")
+    first = inspect_iso(path)
+    read = mocker.spy(iso_inspect, "read_boot_sectors")
+    parse = mocker.spy(iso_inspect, "parse_descriptors")
+
+    assert inspect_iso(path) == first
+    read.assert_not_called()
+
+    os.utime(path, ns=(0, 0))  # même contenu, autre signature
+    assert inspect_iso(path) == first
+    assert read.call_count == 1
+    parse.assert_not_called()
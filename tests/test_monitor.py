@@ -0,0 +1,101 @@
+import os
+import subprocess
+import sys
+import urllib.request
+
+import pytest
+
+from monitor import ResourceMonitor, pid_file, read_cgroup, track_container
+
+
+@pytest.fixture
+def fake_qemu(tmp_path):
+    """Processus factice nommé comme QEMU, enregistré dans un fichier PID."""
+    binary = tmp_path / "qemu-system-x86_64"
+    binary.symlink_to(sys.executable)
+    process = subprocess.Popen(
+        [str(binary), "-c", "import time; time.sleep(30)", "-netdev", "tap,id=net0,ifname=tap7"]
+    )
+    with open(pid_file("vm1"), "w") as file:
+        file.write(f"{process.pid}\n")
+    yield process
+    process.kill()
+    process.wait()
+
+
+def test_discover_and_sample_qemu(fake_qemu):
+    """✅ Teste la découverte d'une VM QEMU par son fichier PID et la mesure de ses ressources."""
+    monitor = ResourceMonitor(interval=0.01)
+
+    samples = monitor.sample_once()
+
+    assert monitor.targets["vm1"]["tap"] == "tap7"
+    assert [sample.name for sample in samples] == ["vm1"]
+    assert samples[0].pid == fake_qemu.pid
+    assert samples[0].rss_bytes > 0
+    assert monitor.self_cpu_seconds > 0
+
+
+def test_stale_pid_file_is_ignored(fake_qemu):
+    """✅ Teste qu'un PID réutilisé par un autre programme n'est pas suivi."""
+    with open(pid_file("vm2"), "w") as file:
+        file.write(str(os.getpid()))
+
+    assert set(ResourceMonitor().discover()) == {"vm1"}
+
+
+def test_ring_buffer_and_prometheus_export(fake_qemu, tmp_path):
+    """✅ Teste le tampon circulaire borné et l'export Prometheus (fichier et HTTP)."""
+    monitor = ResourceMonitor(interval=0.01, capacity=3)
+    output = tmp_path / "metrics.prom"
+
+    monitor.run(duration=0.05, output=str(output))
+    for _ in range(5):
+        monitor.sample_once()
+
+    assert len(monitor.samples["vm1"]) == 3
+    text = output.read_text()
+    assert '# TYPE vm_create_cpu_seconds_total counter' in text
+    assert 'vm_create_memory_rss_bytes{name="vm1",kind="qemu"}' in text
+    assert 'vm_create_monitor_cpu_seconds_total' in text
+
+    server = monitor.serve(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            body = response.read().decode()
+    finally:
+        server.shutdown()
+    assert 'vm_create_monitor_targets 1' in body
+
+
+def test_history_kept_per_machine_and_labels_escaped(mocker):
+    """✅ Teste un tampon circulaire par machine et l'échappement des étiquettes Prometheus."""
+    monitor = ResourceMonitor(capacity=2)
+    monitor._ticks = 1  # pas de redécouverte pendant le test
+    monitor.targets = {name: {"kind": "container", "pid": 1, "tap": None, "cgroup": None}
+                       for name in ("a", 'we"ird\\\n')}
+    mocker.patch.object(monitor, "_measure", return_value=(1.0, 2, 3, 4))
+
+    for _ in range(3):
+        monitor.sample_once()
+
+    assert {name: len(ring) for name, ring in monitor.samples.items()} == {"a": 2, 'we"ird\\\n': 2}
+    assert 'vm_create_memory_rss_bytes{name="we\\"ird\\\\\\n",kind="container"} 2' in monitor.render_prometheus()
+
+
+def test_container_discovery_without_docker(mocker):
+    """✅ Teste qu'un conteneur suivi est ignoré, sans erreur, quand Docker est introuvable."""
+    track_container("web")
+    mocker.patch("executor.run", side_effect=FileNotFoundError("docker"))
+
+    assert ResourceMonitor().discover() == {}
+
+
+def test_read_cgroup(tmp_path):
+    """✅ Teste la lecture des compteurs d'un cgroup v2."""
+    (tmp_path / "cpu.stat").write_text("usage_usec 2500000\nuser_usec 2000000\nsystem_usec 500000\n")
+    (tmp_path / "memory.current").write_text("1048576\n")
+    (tmp_path / "io.stat").write_text("8:0 rbytes=100 wbytes=200 rios=1 wios=2\n8:16 rbytes=1 wbytes=2\n")
+
+    assert read_cgroup(str(tmp_path)) == (2.5, 1048576, 101, 202)
@@ -0,0 +1,289 @@
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+
+import pytest
+
+import qmp
+from artifacts import find_orphans, live_state, load_registry
+from async_engine import AsyncExecutor
+from checkpoint import StepJournal, rollback
+from monitor import pid_file
+from qmp import QMPClient, QMPError, build_restore_command, get_state, launch_from_state, qmp_socket_path, save_state
+from readiness import qga_socket_path
+from settings import state_path
+
+
+@pytest.fixture
+def short_state(monkeypatch):
+    """Dossier d'état court : les sockets Unix sont limités à ~100 caractères."""
+    path = tempfile.mkdtemp(prefix="qmp-", dir="/tmp")
+    monkeypatch.setenv("VM_CREATE_HOME", path)
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+class StubQMP:
+    """Faux moniteur QMP : répond aux commandes via `handlers` et les enregistre."""
+
+    def __init__(self, path, handlers):
+        self.handlers = handlers
+        self.commands = []
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                return
+            with connection, connection.makefile("rwb") as stream:
+                self._send(stream, {"QMP": {"version": {"qemu": {"major": 9}}, "capabilities": []}})
+                for line in stream:
+                    message = json.loads(line)
+                    self.commands.append((message["execute"], message.get("arguments", {})))
+                    handler = self.handlers.get(message["execute"])
+                    reply = handler(message.get("arguments", {})) if callable(handler) else handler
+                    if isinstance(reply, dict) and "error" in reply:
+                        self._send(stream, reply)
+                    else:
+                        self._send(stream, {"event": "STOP", "data": {}})
+                        self._send(stream, {"return": reply if reply is not None else {}})
+
+    @staticmethod
+    def _send(stream, message):
+        stream.write(json.dumps(message).encode() + b"\r\n")
+        stream.flush()
+
+    def names(self):
+        return [command for command, _ in self.commands]
+
+    def close(self):
+        self.server.close()
+
+
+def sequence(*replies):
+    """Réponses successives d'une commande (la dernière est répétée)."""
+    remaining = list(replies)
+    return lambda arguments: remaining.pop(0) if len(remaining) > 1 else remaining[0]
+
+
+@pytest.fixture
+def running_vm(short_state, tmp_path):
+    """Processus se faisant passer pour la VM QEMU 'vm' (ligne de commande et fichier PID), démonisé dans `/`."""
+    (tmp_path / "vm.qcow2").write_bytes(b"QFI\xfb")
+    cmd = [sys.executable, "-c", "import time; time.sleep(60)", "-m", "1024",
+           "-drive", f"file={tmp_path / 'vm.qcow2'},format=qcow2,if=virtio",
+           "-cdrom", str(tmp_path / "isos/debian.iso"), "-pidfile", pid_file("vm"),
+           "-chardev", f"socket,path={qga_socket_path('vm')},server=on,wait=off,id=qga0",
+           "-qmp", f"unix:{qmp_socket_path('vm')},server=on,wait=off"]
+    process = subprocess.Popen(cmd, cwd="/")
+    with open(pid_file("vm"), "w") as file:
+        file.write(str(process.pid))
+    yield process
+    process.kill()
+    process.wait()
+
+
+def migrate_to_file(arguments):
+    with open(arguments["uri"].removeprefix("file:"), "wb") as file:
+        file.write(b"\x00" * 4096)
+
+
+def test_client_skips_events_and_reports_errors(short_state):
+    """✅ Teste le client QMP : négociation, événements mis de côté, erreurs QEMU levées."""
+    stub = StubQMP(qmp_socket_path("vm"), {
+        "query-status": {"status": "running"},
+        "bogus": {"error": {"class": "CommandNotFound", "desc": "The command bogus has not been found"}},
+    })
+    try:
+        with QMPClient(qmp_socket_path("vm"), timeout=5) as client:
+            assert client.execute("query-status") == {"status": "running"}
+            with pytest.raises(QMPError, match="bogus has not been found"):
+                client.execute("bogus")
+            assert client.events and client.events[0]["event"] == "STOP"
+    finally:
+        stub.close()
+
+    assert stub.names() == ["qmp_capabilities", "query-status", "bogus"]
+    with pytest.raises(QMPError, match="Connexion QMP impossible"):
+        QMPClient(qmp_socket_path("absent"), timeout=1).connect()
+
+
+def test_save_state_freezes_disk_and_keeps_vm_running(running_vm, tmp_path, monkeypatch):
+    """✅ Teste la capture : pause, disque figé sous un overlay, migration vers fichier puis reprise."""
+    monkeypatch.setattr(qmp, "POLL_INTERVAL", 0.01)
+    stub = StubQMP(qmp_socket_path("vm"), {
+        "query-block": [{"device": "virtio0", "inserted": {"file": str(tmp_path / "vm.qcow2")}}],
+        "migrate": migrate_to_file,
+        "query-migrate": sequence({"status": "active"}, {"status": "completed"}),
+    })
+    try:
+        manifest = save_state("vm", "gold", timeout=5)
+    finally:
+        stub.close()
+
+    assert stub.names() == ["qmp_capabilities", "stop", "query-block", "blockdev-snapshot-sync", "migrate",
+                            "query-migrate", "query-migrate", "cont"]
+    snapshot_args = dict(stub.commands)["blockdev-snapshot-sync"]
+    assert snapshot_args == {"device": "virtio0", "snapshot-file": str(tmp_path / "vm-gold-run.qcow2"),
+                             "format": "qcow2"}
+    assert dict(stub.commands)["migrate"]["uri"] == f"file:{manifest['state']}"
+    assert manifest["base"] == str(tmp_path / "vm.qcow2") and manifest["size"] == 4096
+    assert get_state("gold")["cmdline"] == running_vm.args
+
+
+def test_second_capture_freezes_active_overlay(running_vm, tmp_path, monkeypatch):
+    """✅ Teste deux captures successives : la seconde fige l'overlay actif ; rollback et gc gardent les disques figés."""
+    monkeypatch.setattr(qmp, "POLL_INTERVAL", 0.01)
+    disk = str(tmp_path / "vm.qcow2")
+    journal = StepJournal("QEMU", "vm")
+    journal.reset()
+    journal.complete("disk", disk, artifacts=[disk])
+    journal.finish()
+    chain = [disk]
+
+    def query_block(arguments):
+        image = None
+        for path in chain:
+            image = {"filename": path, **({"backing-image": image} if image else {})}
+        return [{"device": "virtio0", "inserted": {"file": chain[-1], "image": image}}]
+
+    def snapshot(arguments):
+        with open(arguments["snapshot-file"], "wb") as file:
+            file.write(b"QFI\xfb")
+        chain.append(arguments["snapshot-file"])
+
+    stub = StubQMP(qmp_socket_path("vm"), {
+        "query-block": query_block,
+        "blockdev-snapshot-sync": snapshot,
+        "migrate": migrate_to_file,
+        "query-migrate": {"status": "completed"},
+    })
+    try:
+        gold = save_state("vm", "gold", timeout=5)
+        silver = save_state("vm", "silver", timeout=5)
+    finally:
+        stub.close()
+
+    assert gold["base"] == disk
+    assert silver["base"] == str(tmp_path / "vm-gold-run.qcow2") and silver["device"] == "virtio0"
+    assert chain[-1] == str(tmp_path / "vm-silver-run.qcow2")
+    assert StepJournal("QEMU", "vm").artifacts() == [chain[-1]]
+
+    running_vm.kill()
+    running_vm.wait()
+    live = asyncio.run(live_state({}, AsyncExecutor(on_output=None)))
+    orphans, _ = find_orphans(load_registry(), live, min_age=0)
+    assert not orphans
+    assert rollback("QEMU", "vm", {})
+    kept = [gold["base"], silver["base"], gold["state"], silver["state"]]
+    assert all(os.path.exists(path) for path in kept) and not os.path.exists(chain[-1])
+
+
+def test_failed_migration_resumes_vm(running_vm, tmp_path, monkeypatch):
+    """❌ Teste qu'une migration en échec relance la VM et lève QMPError."""
+    monkeypatch.setattr(qmp, "POLL_INTERVAL", 0.01)
+    stub = StubQMP(qmp_socket_path("vm"), {
+        "query-block": [{"device": "virtio0", "inserted": {"file": str(tmp_path / "vm.qcow2")}}],
+        "query-migrate": {"status": "failed", "error-desc": "No space left on device"},
+    })
+    try:
+        with pytest.raises(QMPError, match="No space left"):
+            save_state("vm", keep_running=False, timeout=5)
+    finally:
+        stub.close()
+
+    assert stub.names()[-1] == "cont"
+    assert "quit" not in stub.names()
+    with pytest.raises(KeyError):
+        get_state("vm")
+
+
+def test_relative_disk_of_daemonized_vm_is_refused(short_state, monkeypatch):
+    """❌ Teste qu'un disque relatif d'une VM démonisée (dossier courant `/`) est refusé avant toute pause."""
+    monkeypatch.setattr(qmp, "read_cmdline", lambda name: (["qemu-system-x86_64", "-hda", "vm.qcow2"], "/"))
+
+    with pytest.raises(QMPError, match="introuvable : /vm.qcow2"):
+        save_state("vm", "gold")
+
+
+def test_restore_command_rewrites_instance_paths():
+    """✅ Teste la ligne de commande restaurée : même matériel, disque/sockets/PID/TAP propres à la nouvelle VM."""
+    manifest = {
+        "source": "vm", "disk": "vm.qcow2", "cwd": "/srv/vms", "state": "/srv/state/gold.state",
+        "cmdline": ["qemu-system-x86_64", "-m", "2048", "-drive", "file=vm.qcow2,format=qcow2,if=virtio",
+                    "-cdrom", "isos/debian.iso", "-pidfile", pid_file("vm"),
+                    "-qmp", f"unix:{qmp_socket_path('vm')},server=on,wait=off",
+                    "-netdev", "tap,id=net0,ifname=tap0,script=no,downscript=no", "-daemonize"],
+    }
+
+    cmd = build_restore_command(manifest, "clone", "/srv/vms/clone.qcow2", tap="tap1")
+
+    assert cmd[:3] == ["qemu-system-x86_64", "-m", "2048"]
+    assert "file=/srv/vms/clone.qcow2,format=qcow2,if=virtio" in cmd
+    assert cmd[cmd.index("-cdrom") + 1] == "/srv/vms/isos/debian.iso"
+    assert cmd[cmd.index("-pidfile") + 1] == pid_file("clone")
+    assert cmd[cmd.index("-qmp") + 1] == f"unix:{qmp_socket_path('clone')},server=on,wait=off"
+    assert "tap,id=net0,ifname=tap1,script=no,downscript=no" in cmd
+    assert cmd.count("-daemonize") == 1
+    assert cmd[-2:] == ["-incoming", "file:/srv/state/gold.state"]
+
+
+def test_launch_from_state(short_state, tmp_path, mocker, monkeypatch):
+    """✅ Teste le démarrage depuis un état : overlay, lancement avec -incoming puis `cont` une fois l'état chargé."""
+    monkeypatch.setattr(qmp, "POLL_INTERVAL", 0.01)
+    monkeypatch.chdir(tmp_path)
+    manifest = {"source": "vm", "disk": "vm.qcow2", "base": str(tmp_path / "vm.qcow2"), "cwd": str(tmp_path),
+                "state": str(tmp_path / "gold.state"),
+                "cmdline": ["qemu-system-x86_64", "-hda", "vm.qcow2", "-pidfile", pid_file("vm")]}
+    with open(state_path("vmstates", "gold.json"), "w") as file:
+        json.dump(manifest, file)
+
+    def overlay(base, name):
+        (tmp_path / f"{name}.qcow2").write_bytes(b"QFI\xfb")
+        return f"{name}.qcow2"
+
+    mock_overlay = mocker.patch("qmp.create_overlay_disk", side_effect=overlay)
+    mock_run = mocker.patch("executor.run")
+    stub = StubQMP(qmp_socket_path("clone"), {
+        "query-status": sequence({"status": "inmigrate"}, {"status": "paused"}),
+    })
+    try:
+        assert launch_from_state("gold", "clone", timeout=5) == "clone"
+    finally:
+        stub.close()
+
+    mock_overlay.assert_called_once_with(str(tmp_path / "vm.qcow2"), "clone")
+    cmd = mock_run.call_args.args[0]
+    assert cmd[cmd.index("-hda") + 1] == str(tmp_path / "clone.qcow2")
+    assert cmd[-2:] == ["-incoming", f"file:{tmp_path / 'gold.state'}"]
+    assert stub.names() == ["qmp_capabilities", "query-status", "query-status", "cont"]
+    assert launch_from_state("missing", "other") is None
+
+
+def test_launch_from_state_refuses_existing_disk(short_state, tmp_path, mocker, monkeypatch):
+    """❌ Teste le refus de démarrer sur le nom d'une VM existante : ni journal ni disque ne sont touchés."""
+    monkeypatch.chdir(tmp_path)
+    with open(state_path("vmstates", "gold.json"), "w") as file:
+        json.dump({"base": str(tmp_path / "vm.qcow2"), "cmdline": ["qemu-system-x86_64"]}, file)
+    (tmp_path / "clone.qcow2").write_bytes(b"disque existant")
+    journal = StepJournal("QEMU", "clone")
+    journal.complete("disk", artifacts=["clone.qcow2"])
+    mock_overlay = mocker.patch("qmp.create_overlay_disk")
+
+    assert launch_from_state("gold", "clone") is None
+
+    mock_overlay.assert_not_called()
+    assert (tmp_path / "clone.qcow2").read_bytes() == b"disque existant"
+    assert StepJournal("QEMU", "clone").should_run("disk") is False
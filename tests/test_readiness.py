@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+
+from readiness import build_target, percentiles, wait_all, wait_ready
+
+
+@pytest.fixture
+def socket_dir():
+    """Dossier court pour les sockets Unix (limite de longueur du chemin)."""
+    path = tempfile.mkdtemp(prefix="rdy-", dir="/tmp")
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+async def start_ssh_server(delay=0.0):
+    """Faux serveur SSH qui n'accepte les connexions qu'après `delay` secondes."""
+    async def handle(reader, writer):
+        writer.write(b"SSH-2.0-OpenSSH_9.6\r\n")
+        await writer.drain()
+        writer.close()
+
+    probe = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = probe.sockets[0].getsockname()[1]
+    probe.close()
+    await probe.wait_closed()
+
+    async def open_later():
+        await asyncio.sleep(delay)
+        return await asyncio.start_server(handle, "127.0.0.1", port)
+
+    return port, asyncio.ensure_future(open_later())
+
+
+def test_wait_ready_ssh_with_backoff():
+    """✅ Teste la sonde SSH : la machine n'est prête qu'après plusieurs essais."""
+    async def scenario():
+        port, server = await start_ssh_server(delay=0.3)
+        target = {"name": "vm1", "probe": "ssh", "port": port, "launched_at": time.monotonic(), "timeout": 5}
+        result = await wait_ready(target, initial_delay=0.05, max_delay=0.1)
+        (await server).close()
+        return result
+
+    result = asyncio.run(scenario())
+
+    assert result.ready
+    assert result.attempts > 1
+    assert result.seconds >= 0.3
+
+
+def test_wait_ready_timeout():
+    """❌ Teste l'expiration du délai quand rien n'écoute."""
+    target = {"name": "vm1", "probe": "tcp", "port": 1, "timeout": 0.3}
+
+    result = asyncio.run(wait_ready(target, initial_delay=0.05))
+
+    assert not result.ready
+    assert result.error
+
+
+def test_wait_all_qga(socket_dir):
+    """✅ Teste la sonde de l'agent invité QEMU sur plusieurs VMs en parallèle."""
+    async def handle(reader, writer):
+        request = json.loads(await reader.readline())
+        writer.write(b'{"return": {}}\n')  # réponse parasite ignorée
+        writer.write(json.dumps({"return": request["arguments"]["id"]}).encode() + b"\n")
+        await writer.drain()
+        writer.close()
+
+    async def scenario():
+        servers = []
+        targets = []
+        for index in range(3):
+            socket_path = os.path.join(socket_dir, f"vm{index}.sock")
+            servers.append(await asyncio.start_unix_server(handle, socket_path))
+            targets.append({"name": f"vm{index}", "probe": "qga", "socket": socket_path})
+        results = await wait_all(targets, initial_delay=0.05)
+        for server in servers:
+            server.close()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert [result.name for result in results] == ["vm0", "vm1", "vm2"]
+    assert all(result.ready and result.attempts == 1 for result in results)
+
+
+def test_build_target_defaults():
+    """✅ Teste le choix de la sonde : implicite pour QEMU et Docker, à configurer ailleurs."""
+    assert build_target("vm", "QEMU")["probe"] == "qga"
+    assert build_target("web", "docker")["probe"] == "docker"
+    assert build_target("vm", "VirtualBox") is None
+    assert build_target("vm", "VirtualBox", {"probe": "ssh", "port": 2222})["port"] == 2222
+
+
+def test_percentiles():
+    """✅ Teste le calcul des percentiles (rang le plus proche)."""
+    values = list(range(1, 101))
+
+    assert percentiles(values) == {50: 50, 90: 90, 99: 99}
+    assert percentiles([4.0]) == {50: 4.0, 90: 4.0, 99: 4.0}
+    assert percentiles([]) == {}
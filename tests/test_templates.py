@@ -0,0 +1,91 @@
+import subprocess
+import pytest
+
+import templates
+from templates import build_clone_commands, get_template, register_template
+from vm_manager import create_vm
+
+PATHS = {"VirtualBox": "VBoxManage", "VMware": "vmrun"}
+
+
+def test_register_template_takes_snapshot(mocker):
+    """✅ Teste l'enregistrement d'un modèle VirtualBox avec prise d'instantané."""
+    mock_run = mocker.patch("executor.run", return_value=subprocess.CompletedProcess([], 0, "", ""))
+
+    register_template("VirtualBox", "debian-base", PATHS)
+
+    mock_run.assert_any_call(["VBoxManage", "snapshot", "debian-base", "take", "template-base"], check=True)
+    assert get_template("debian-base") == {
+        "hypervisor": "VirtualBox", "source": "debian-base", "snapshot": "template-base",
+        "ts": mocker.ANY,
+    }
+
+
+def test_register_template_reuses_existing_snapshot(mocker):
+    """✅ Teste qu'un instantané VMware déjà présent n'est pas repris."""
+    mock_run = mocker.patch("executor.run", return_value=subprocess.CompletedProcess([], 0, "Total snapshots: 1\nbase\n", ""))
+
+    register_template("VMware", "ubuntu", PATHS, name="ubuntu-tpl", snapshot="base")
+
+    assert mock_run.call_count == 1
+    assert get_template("ubuntu-tpl")["source"] == "ubuntu.vmx"
+
+
+def test_build_clone_commands():
+    """✅ Teste les commandes de clone lié pour VirtualBox et VMware."""
+    vbox = build_clone_commands("VirtualBox", {"hypervisor": "VirtualBox", "source": "tpl", "snapshot": "base"},
+                                "web-1", 1024, PATHS)
+    assert vbox[0] == ["VBoxManage", "clonevm", "tpl", "--snapshot", "base", "--options", "link",
+                       "--name", "web-1", "--register"]
+    assert ["VBoxManage", "modifyvm", "web-1", "--memory", "1024"] in vbox
+
+    vmware = build_clone_commands("VMware", {"hypervisor": "VMware", "source": "tpl.vmx", "snapshot": "base"},
+                                  "web-1", 1024, PATHS)
+    assert vmware[0] == ["vmrun", "-T", "ws", "clone", "tpl.vmx", "web-1.vmx", "linked",
+                         "-snapshot=base", "-cloneName=web-1"]
+
+    with pytest.raises(ValueError):
+        build_clone_commands("VMware", {"hypervisor": "VirtualBox", "source": "tpl", "snapshot": "base"},
+                             "web-1", 1024, PATHS)
+
+
+def test_create_vm_from_template_skips_disk(mocker):
+    """✅ Teste qu'une VM créée depuis un modèle ne crée ni ne convertit de disque."""
+    templates._save_templates({"tpl": {"hypervisor": "VirtualBox", "source": "tpl", "snapshot": "base"}})
+    mocker.patch("vm_manager.vm_exists", return_value=False)
+    mock_disk = mocker.patch("vm_manager.create_qcow2_disk")
+    mock_convert = mocker.patch("vm_manager.convert_disk_format")
+    mock_run = mocker.patch("executor.run")
+
+    create_vm("VirtualBox", "web-1", "x86_64", 1024, "unused.iso", PATHS, template="tpl")
+
+    mock_disk.assert_not_called()
+    mock_convert.assert_not_called()
+    assert mock_run.call_args_list[0].args[0][1] == "clonevm"
+
+
+def test_benchmark_clone(mocker):
+    """✅ Teste que le benchmark mesure les deux modes et nettoie les VMs créées."""
+    mock_create = mocker.patch("vm_manager.create_vm")
+    mock_rollback = mocker.patch("checkpoint.rollback")
+
+    timings = templates.benchmark_clone("VirtualBox", "tpl", PATHS, "debian.iso", runs=2)
+
+    assert len(timings["scratch"]) == 2 and len(timings["clone"]) == 2
+    assert mock_create.call_count == 4
+    assert mock_create.call_args_list[1].kwargs["template"] == "tpl"
+    assert mock_rollback.call_count == 4
+    assert timings["failed"] == {"scratch": 0, "clone": 0}
+
+
+def test_benchmark_clone_reports_failures_separately(mocker):
+    """❌ Teste qu'une création en échec (None ou commande en erreur) n'est pas chronométrée mais comptée à part."""
+    mocker.patch("vm_manager.create_vm", side_effect=[None, "bench-clone-0", "bench-scratch-1",
+                                                      subprocess.CalledProcessError(1, "VBoxManage")])
+    mock_rollback = mocker.patch("checkpoint.rollback")
+
+    timings = templates.benchmark_clone("VirtualBox", "tpl", PATHS, "debian.iso", runs=2)
+
+    assert len(timings["scratch"]) == 1 and len(timings["clone"]) == 1
+    assert timings["failed"] == {"scratch": 1, "clone": 1}
+    assert mock_rollback.call_count == 4
@@ -47,6 +47,17 @@ def test_create_qcow2_disk_success(mocker):
     mock_run.assert_called_once_with(["qemu-img", "create", "-f", "qcow2", "test_vm.qcow2", "10G"], check=True)
 
 
+def test_create_qcow2_disk_with_profile(mocker):
+    """Test que create_qcow2_disk() transmet les options du profil de disque à qemu-img."""
+    mock_run = mocker.patch("subprocess.run", return_value=MagicMock(returncode=0))
+    utils.create_qcow2_disk("test_vm", "20G", profile="performance")
+    mock_run.assert_called_once_with(
+        ["qemu-img", "create", "-f", "qcow2", "-o",
+         "cluster_size=131072,preallocation=falloc,lazy_refcounts=on,extended_l2=on", "test_vm.qcow2", "20G"],
+        check=True,
+    )
+
+
 # ✅ Test de convert_disk_format()
 def test_convert_disk_format_success(mocker):
     """Test que convert_disk_format() appelle la bonne commande."""
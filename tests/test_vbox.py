@@ -0,0 +1,68 @@
+import pytest
+
+from vbox import build_vbox_commands, guess_ostype
+
+
+def options(cmd_vm):
+    """Options `modifyvm`/`storagectl` regroupées : {option: valeur}."""
+    merged = {}
+    for cmd in cmd_vm:
+        args = cmd[3:] if cmd[1] == "modifyvm" else cmd[2:]
+        for index in range(len(args) - 1):
+            if args[index].startswith("--"):
+                merged[args[index]] = args[index + 1]
+    return merged
+
+
+def test_compat_profile_keeps_previous_commands():
+    """✅ Teste que le profil par défaut produit les commandes historiques."""
+    cmd_vm = build_vbox_commands("VBoxManage", "vm", 2048, "vm.vdi", "debian.iso")
+
+    assert cmd_vm[0] == ["VBoxManage", "createvm", "--name", "vm", "--register"]
+    assert ["VBoxManage", "modifyvm", "vm", "--ioapic", "off"] in cmd_vm
+    assert cmd_vm[-1] == ["VBoxManage", "modifyvm", "vm", "--nic1", "nat"]
+    assert len(cmd_vm) == 10
+    assert "--cpus" not in options(cmd_vm)
+
+
+def test_compat_profile_with_several_cpus_enables_ioapic():
+    """✅ Teste que l'I/O APIC est activé dès qu'il y a plus d'une vCPU."""
+    cmd_vm = build_vbox_commands("VBoxManage", "vm", 2048, "vm.vdi", "debian.iso", cpus=2)
+
+    assert options(cmd_vm)["--ioapic"] == "on"
+    assert options(cmd_vm)["--cpus"] == "2"
+
+
+def test_performance_profile():
+    """✅ Teste le profil performance : SMP, paravirtualisation, virtio et cache d'E/S."""
+    cmd_vm = build_vbox_commands("VBoxManage", "vm", 4096, "vm.vdi", "isos/debian-12.iso", "eth0",
+                                 profile="performance", cpus=4)
+    merged = options(cmd_vm)
+
+    assert cmd_vm[0] == ["VBoxManage", "createvm", "--name", "vm", "--ostype", "Debian_64", "--register"]
+    assert merged["--ioapic"] == "on" and merged["--cpus"] == "4"
+    assert merged["--paravirtprovider"] == "kvm"
+    assert merged["--nestedpaging"] == "on" and merged["--largepages"] == "on"
+    assert merged["--hostiocache"] == "off"
+    assert cmd_vm[-1] == ["VBoxManage", "modifyvm", "vm", "--nic1", "bridged", "--bridgeadapter1", "eth0",
+                          "--nictype1", "virtio"]
+    # Réglages système en un seul appel à VBoxManage
+    assert sum(1 for cmd in cmd_vm if "--memory" in cmd) == 1
+    assert len(cmd_vm) < len(build_vbox_commands("VBoxManage", "vm", 4096, "vm.vdi", "a.iso", "eth0"))
+
+
+def test_unknown_profile():
+    """❌ Teste le refus d'un profil inconnu."""
+    with pytest.raises(ValueError, match="Profil VirtualBox inconnu"):
+        build_vbox_commands("VBoxManage", "vm", 1024, "vm.vdi", "a.iso", profile="turbo")
+
+
+@pytest.mark.parametrize("image, ostype", [
+    ("isos/debian-12.9.0-amd64-netinst.iso", "Debian_64"),
+    ("isos/ubuntu-24.04.1-live-server-amd64.iso", "Ubuntu_64"),
+    ("images/Rocky-9.3-x86_64-minimal.iso", "RedHat_64"),
+    ("isos/custom.iso", "Linux_64"),
+])
+def test_guess_ostype(image, ostype):
+    """✅ Teste la déduction du --ostype depuis le nom de l'image."""
+    assert guess_ostype(image) == ostype
@@ -1,7 +1,9 @@
+import asyncio
 import pytest
 import subprocess
 import logging
-from vm_manager import create_vm
+from async_engine import AsyncExecutor
+from vm_manager import create_vm, create_vm_async
 from utils import vm_exists, create_qcow2_disk, convert_disk_format
 
 @pytest.fixture
@@ -20,7 +22,78 @@ def test_create_vm_normal(mocker, mock_paths):
     mocker.patch("utils.convert_disk_format", return_value="test.vdi")
     mock_run = mocker.patch("subprocess.run")
 
-    create_vm("VirtualBox", "TestVM", "x86_64", 2048, "/fake/path/debian.iso", mock_paths, dry_run=False)
+    assert create_vm("VirtualBox", "TestVM", "x86_64", 2048, "/fake/path/debian.iso", mock_paths, dry_run=False) == "TestVM"
 
     mock_run.assert_called()
     assert mock_run.call_count > 2  # Vérifie qu'au moins 2 commandes ont été exécutées
+
+
+def test_create_vm_async_virtualbox(mocker, mock_paths):
+    """✅ Teste la variante asynchrone : conversion du disque puis commandes VBoxManage."""
+    mocker.patch("vm_manager.vm_exists", return_value=False)
+    mocker.patch("vm_manager.create_qcow2_disk", return_value="TestVM.qcow2")
+    mock_convert = mocker.patch("vm_manager.convert_disk_format", return_value="TestVM.vdi")
+    engine = AsyncExecutor()
+    executed = []
+
+    async def fake_run(cmd, resources=(), check=False, label=None):
+        executed.append((cmd, resources))
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    mocker.patch.object(engine, "run", side_effect=fake_run)
+
+    name = asyncio.run(create_vm_async("VirtualBox", "TestVM", "x86_64", 2048, "debian.iso", mock_paths,
+                                       engine=engine, interactive=False))
+
+    assert name == "TestVM"
+    mock_convert.assert_called_once_with("TestVM.qcow2", "TestVM.vdi", "vdi")
+    assert executed[0][0][:2] == ["/fake/path/VBoxManage", "createvm"]
+    assert all(resources == ["VBoxManage"] for _, resources in executed)
+
+
+def test_guest_os_and_devices_follow_iso_contents(tmp_path, monkeypatch, mock_paths, make_iso):
+    """✅ Teste que le système lu dans l'ISO choisit le guestOS VMware, l'ostype VirtualBox et les périphériques QEMU."""
+    from vm_manager import build_vm_commands
+
+    monkeypatch.chdir(tmp_path)
+    iso_path = make_iso(tmp_path / "install.iso", "Debian 12.9.0 amd64 n")
+
+    qemu_cmd = build_vm_commands("QEMU", "vm", 1024, iso_path, mock_paths, "vm.qcow2")[0]
+    assert qemu_cmd[qemu_cmd.index("-drive") + 1] == f"file={tmp_path / 'vm.qcow2'},format=qcow2,if=virtio"
+    assert "virtio-net-pci,netdev=net0" in qemu_cmd and "-hda" not in qemu_cmd
+
+    vbox_cmds = build_vm_commands("VirtualBox", "vm", 1024, iso_path, mock_paths, "vm.qcow2", "vm.vdi")
+    assert vbox_cmds[0] == ["/fake/path/VBoxManage", "createvm", "--name", "vm", "--ostype", "Debian_64", "--register"]
+
+    build_vm_commands("VMware", "vm", 1024, iso_path, mock_paths, "vm.qcow2", "vm.vmdk")
+    assert 'guestOS = "debian12-64"' in (tmp_path / "vm.vmx").read_text()
+
+
+def test_iso_for_another_architecture_is_reported(tmp_path, mock_paths, make_iso, caplog):
+    """⚠️ Teste l'avertissement quand l'ISO vise une autre architecture que celle émulée par QEMU."""
+    from vm_manager import build_vm_commands
+
+    iso_path = make_iso(tmp_path / "arm.iso", "debian-12.5.0-arm64-netinst")
+
+    build_vm_commands("QEMU", "vm", 1024, iso_path, mock_paths, "vm.qcow2")
+    assert "prévue pour aarch64, QEMU exécute du x86_64" in caplog.text
+
+    caplog.clear()
+    build_vm_commands("QEMU", "vm", 1024, iso_path, {"QEMU": "/usr/bin/qemu-system-aarch64"}, "vm.qcow2")
+    assert "prévue pour" not in caplog.text
+
+
+def test_qemu_disk_drive_and_l2_cache(tmp_path, monkeypatch, mock_paths):
+    """✅ Teste le disque QEMU (`-drive` au format explicite, chemins absolus, cache L2 avec un profil) et `cpus`."""
+    from vm_manager import build_vm_commands
+
+    monkeypatch.chdir(tmp_path)
+    default = build_vm_commands("QEMU", "vm", 1024, "isos/a.iso", mock_paths, "vm.qcow2")[0]
+    assert default[default.index("-drive") + 1] == f"file={tmp_path / 'vm.qcow2'},format=qcow2,if=ide"
+    assert default[default.index("-cdrom") + 1] == str(tmp_path / "isos/a.iso")
+    assert default[default.index("-smp") + 1] == "2"
+
+    tuned = build_vm_commands("QEMU", "vm", 1024, "a.iso", mock_paths, "vm.qcow2", cpus=6, disk_profile="thin")[0]
+    assert tuned[tuned.index("-smp") + 1] == "6"
+    # 10 Gio en clusters de 64 Kio : 163840 entrées L2 de 8 octets
+    assert tuned[tuned.index("-drive") + 1] == f"file={tmp_path / 'vm.qcow2'},format=qcow2,if=ide,l2-cache-size=1310720"
@@ -0,0 +1,80 @@
+import pytest
+
+from vmx import build_vmx, guess_guest_os, render_vmx, write_vmx
+
+
+def parse(text):
+    settings = {}
+    for line in text.splitlines():
+        key, value = line.split(" = ", 1)
+        settings[key] = value.strip('"')
+    return settings
+
+
+def test_compat_profile_matches_previous_vmx(tmp_path):
+    """✅ Teste que le profil par défaut garde le matériel générique (SATA, carte réseau par défaut)."""
+    path = write_vmx(str(tmp_path / "vm.vmx"), build_vmx("vm", 2048, "vm.vmdk", "isos/ubuntu-24.04.iso", cpus=2))
+    settings = parse(open(path).read())
+
+    assert settings["guestOS"] == "ubuntu-64"
+    assert settings["numvcpus"] == "2" and settings["memsize"] == "2048"
+    assert settings["scsi0.virtualDev"] == "lsilogic"
+    assert settings["sata0:0.fileName"] == "vm.vmdk"
+    assert settings["ide1:0.fileName"] == "isos/ubuntu-24.04.iso"
+    assert settings["bios.bootOrder"] == "cdrom,hdd"
+    assert settings["ethernet0.connectionType"] == "nat"
+    assert "ethernet0.virtualDev" not in settings
+    assert "mainMem.useNamedFile" not in settings
+
+
+def test_performance_profile():
+    """✅ Teste le profil performance : pvscsi, vmxnet3 et réglages mémoire."""
+    settings = parse(render_vmx(build_vmx(
+        "web", 8192, "web.vmdk", "seed.iso", "bridged", boot_disk=True, profile="performance", cpus=4,
+        guest_os="debian12-64",
+    )))
+
+    assert settings["scsi0.virtualDev"] == "pvscsi"
+    assert settings["scsi0:0.fileName"] == "web.vmdk"
+    assert not any(key.startswith("sata0") for key in settings)
+    assert settings["ethernet0.virtualDev"] == "vmxnet3"
+    assert settings["ethernet0.connectionType"] == "bridged"
+    assert settings["numvcpus"] == "4" and settings["cpuid.coresPerSocket"] == "4"
+    assert settings["mainMem.useNamedFile"] == "FALSE"
+    assert settings["sched.mem.pshare.enable"] == "FALSE"
+    assert settings["MemTrimRate"] == "0"
+    assert settings["bios.bootOrder"] == "hdd,cdrom"
+    assert settings["guestOS"] == "debian12-64"
+    assert "prefvmx.useRecommendedLockedMemSize" not in settings
+
+
+def test_performance_profile_windows_guest_keeps_installer_devices():
+    """✅ Teste qu'un invité Windows garde le disque SATA et reçoit une carte e1000e (pas de pilotes paravirtuels)."""
+    settings = parse(render_vmx(build_vmx(
+        "win", 8192, "win.vmdk", "isos/Win11_23H2_French_x64.iso", profile="performance",
+    )))
+
+    assert settings["guestOS"] == "windows11-64"
+    assert settings["sata0:0.fileName"] == "win.vmdk"
+    assert settings["scsi0.virtualDev"] == "lsilogic"
+    assert settings["ethernet0.virtualDev"] == "e1000e"
+    assert settings["mainMem.useNamedFile"] == "FALSE"
+
+
+def test_unknown_profile():
+    """❌ Teste le refus d'un profil inconnu."""
+    with pytest.raises(ValueError, match="Profil VMware inconnu"):
+        build_vmx("vm", 1024, "vm.vmdk", "a.iso", profile="turbo")
+
+
+@pytest.mark.parametrize("image, guest_os", [
+    ("isos/debian-12.9.0-amd64-netinst.iso", "debian12-64"),
+    ("isos/debian-11.7.0-amd64-DVD-1.iso", "debian11-64"),
+    ("isos/ubuntu-24.04.1-live-server-amd64.iso", "ubuntu-64"),
+    ("images/Rocky-9.3-x86_64-minimal.iso", "rhel9-64"),
+    ("isos/Fedora-Server-dvd-x86_64-40.iso", "fedora-64"),
+    ("isos/custom.iso", "otherlinux-64"),
+])
+def test_guess_guest_os(image, guest_os):
+    """✅ Teste la déduction du guestOS depuis le nom de l'image."""
+    assert guess_guest_os(image) == guest_os